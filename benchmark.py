@@ -0,0 +1,247 @@
+"""Headless performance benchmarks.
+
+Measures engine throughput, simulation and intro frame times, metric
+table and plot rendering, and launcher import/startup time with the SDL
+dummy video driver, so it runs on a build server without a display:
+
+    python benchmark.py --out bench.json
+    python benchmark.py --baseline bench.json   # exits 1 on a regression
+
+Each result is (value, unit, higher_is_better). A result is a regression
+when it is worse than the baseline by more than --tolerance (default 10%).
+"""
+import os
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+import pygame
+
+import render_cache
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def _frame_stats(name, durations):
+    durations = sorted(durations)
+    p95 = durations[min(len(durations) - 1, int(len(durations) * 0.95))]
+    return {
+        f'{name}_frame_ms': (statistics.mean(durations) * 1000, 'ms', False),
+        f'{name}_frame_p95_ms': (p95 * 1000, 'ms', False),
+    }
+
+
+def _best_of(repeats, run, number=1):
+    """Fastest of `repeats` timings of `number` calls, per call (least disturbed by noise)"""
+    best = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        for _ in range(number):
+            run()
+        elapsed = (time.perf_counter() - started) / number
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def bench_engine(parts=100_000, repeats=3):
+    """Events per second of the headless engine"""
+    import flow_engine
+    events = flow_engine.run_headless(parts).event_count
+    elapsed = _best_of(repeats, lambda: flow_engine.run_headless(parts))
+    return {'engine_events_per_s': (events / elapsed, 'events/s', True)}
+
+
+def bench_simulation_frames(frames=600, dirty=False):
+    """Time per frame of the simulation loop body (engine step, sprites, present)"""
+    import one_piece_flow as opf
+    import scenes
+    opf.screen = scenes.set_mode(opf.SCREEN_SIZE, opf.CAPTION)
+    opf.load_fonts()
+    opf.reset_line()
+    engine = opf.make_engine()
+    renderer = opf.new_renderer() if dirty else None
+    durations = []
+    sim_time = 0.0
+    for _ in range(frames):
+        started = time.perf_counter()
+        opf.present(opf.screen, renderer, opf.factory_layer(opf.screen), opf.factory_items('10x'))
+        engine.run(until=sim_time)
+        for idx, slot in enumerate(opf.machine_slots):
+            slot['timer'] = engine.remaining(idx)
+        opf.materials.update(sim_time)
+        pygame.event.pump()
+        durations.append(time.perf_counter() - started)
+        sim_time += 10 / 60
+    return _frame_stats('simulation_dirty' if dirty else 'simulation', durations)
+
+
+def bench_intro_frames():
+    """Time per frame of the intro scenarios, without their animation waits"""
+    import one_piece_flow as opf
+    import scenes
+    opf.screen = scenes.set_mode(opf.SCREEN_SIZE, opf.CAPTION)
+    opf.load_fonts()
+    durations = []
+    present, wait = opf.present, pygame.time.wait
+
+    def timed_present(*args):
+        started = time.perf_counter()
+        present(*args)
+        durations.append(time.perf_counter() - started)
+
+    opf.present = timed_present
+    pygame.time.wait = lambda ms: 0
+    try:
+        opf.scenario_people_load_truck()
+        opf.scenario_truck_moving_highway()
+        opf.scenario_unload_truck_to_raw()
+    finally:
+        opf.present, pygame.time.wait = present, wait
+    return _frame_stats('intro', durations)
+
+
+def bench_metric_table(repeats=5, number=20):
+    """Uncached render of the metric table and the cached per-frame blit"""
+    import metric_table
+    import scenes
+    from metrics_pipeline import metric_rows
+    screen = scenes.set_mode((600, 220), "benchmark")
+    rows = metric_rows()
+    title_font = render_cache.font('Segoe UI', 16, bold=True)
+    cell_font = render_cache.font('Segoe UI', 12)
+
+    render = _best_of(repeats, lambda: metric_table.render_table(
+        rows, screen.get_size(), "Metrics", title_font, cell_font), number)
+    blit = _best_of(repeats, lambda: screen.blit(metric_table.table_surface(
+        rows, screen.get_size(), "Metrics", title_font, cell_font), (0, 0)), number)
+    return {
+        'table_render_ms': (render * 1000, 'ms', False),
+        'table_cached_ms': (blit * 1000, 'ms', False),
+    }
+
+
+def bench_plots():
+    """Plot import, first off-screen render and memoized re-render"""
+    started = time.perf_counter()
+    import plot_examples
+    imported = time.perf_counter() - started
+    plot_examples._rendered.clear()
+    started = time.perf_counter()
+    plot_examples.render_plots()
+    cold = time.perf_counter() - started
+    started = time.perf_counter()
+    plot_examples.render_plots()
+    warm = time.perf_counter() - started
+    return {
+        'plots_import_ms': (imported * 1000, 'ms', False),
+        'plots_render_ms': (cold * 1000, 'ms', False),
+        'plots_cached_ms': (warm * 1000, 'ms', False),
+    }
+
+
+def bench_startup():
+    """gui import time and launcher time to first frame, each in a fresh interpreter"""
+    env = dict(os.environ, SIM_PRELOAD_PLOTS='0')
+    code = "import time; t = time.perf_counter(); import gui; print((time.perf_counter() - t) * 1000)"
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, cwd=HERE, env=env, check=True)
+    import_ms = float(result.stdout.strip().splitlines()[-1])
+
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, os.path.join(HERE, 'gui.py'), '--startup-child'],
+                            capture_output=True, text=True, cwd=HERE, env=env, check=True)
+    total_ms = (time.perf_counter() - started) * 1000
+    first_frame_ms = None
+    for line in result.stdout.splitlines():
+        if line.startswith('Launcher first frame:'):
+            first_frame_ms = float(line.split(':')[1].split()[0])
+    results = {
+        'gui_import_ms': (import_ms, 'ms', False),
+        'gui_startup_probe_total_ms': (total_ms, 'ms', False),
+    }
+    if first_frame_ms is not None:
+        results['gui_first_frame_ms'] = (first_frame_ms, 'ms', False)
+    return results
+
+
+BENCHMARKS = {
+    'engine': bench_engine,
+    'simulation': bench_simulation_frames,
+    'simulation_dirty': lambda: bench_simulation_frames(dirty=True),
+    'intro': bench_intro_frames,
+    'table': bench_metric_table,
+    'plots': bench_plots,
+    'startup': bench_startup,
+}
+
+
+def run_benchmarks(names=None):
+    pygame.init()
+    results = {}
+    try:
+        for name in names or BENCHMARKS:
+            results.update(BENCHMARKS[name]())
+    finally:
+        render_cache.reset()
+        pygame.quit()
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'pygame': pygame.version.ver,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': {name: {'value': value, 'unit': unit, 'higher_is_better': higher}
+                    for name, (value, unit, higher) in results.items()},
+    }
+
+
+def compare(current, baseline, tolerance=0.10):
+    """Rows of (name, baseline, current, change, regressed) for results present in both"""
+    rows = []
+    for name, result in current['results'].items():
+        base = baseline['results'].get(name)
+        if base is None or base['value'] == 0:
+            continue
+        change = (result['value'] - base['value']) / base['value']
+        worse = -change if result['higher_is_better'] else change
+        rows.append((name, base['value'], result['value'], change, worse > tolerance))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless performance benchmarks")
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), help="run only these benchmarks")
+    parser.add_argument('--out', help="write the results to this JSON file")
+    parser.add_argument('--baseline', help="compare against a previous results file")
+    parser.add_argument('--tolerance', type=float, default=0.10, help="allowed slowdown before failing (0.10 = 10%%)")
+    args = parser.parse_args()
+
+    current = run_benchmarks(args.only)
+    for name, result in current['results'].items():
+        print(f"  {name:30s} {result['value']:14,.2f} {result['unit']}")
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(current, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        rows = compare(current, baseline, args.tolerance)
+        print(f"Against {args.baseline}:")
+        for name, base, value, change, regressed in rows:
+            flag = "  REGRESSION" if regressed else ""
+            print(f"  {name:30s} {base:14,.2f} -> {value:14,.2f} ({change:+.1%}){flag}")
+        if any(row[4] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""Scrollable, virtualized table for large CSV files.
+
+The file is memory-mapped and indexed once by row start offset (a NumPy
+scan for newlines outside quotes), so opening it costs one pass over the
+bytes and no parsing. Rows are parsed only when they scroll into view,
+column widths come from a sample of rows, and text is drawn from a cache
+of pre-rendered glyphs. Only the visible rows are drawn, and only when the
+view changes:
+
+    python process_metric_viewer.py --csv "metrics export.csv"
+"""
+import csv
+import io
+import os
+
+import numpy as np
+import pygame
+
+from metric_table import BG_COLOR, HEADER_COLOR, LINE_COLOR, ROW_HEIGHT, START_Y, TEXT_COLOR, TITLE_COLOR
+
+NEWLINE = ord('\n')
+QUOTE = ord('"')
+INDEX_CHUNK = 1 << 24  # bytes scanned per step while indexing
+ROW_CACHE_LIMIT = 1024
+SAMPLE_ROWS = 200  # rows measured for the column widths
+MAX_COLUMN_WIDTH = 320
+SCROLLBAR_WIDTH = 10
+STATUS_COLOR = (90, 90, 90)
+
+
+def row_offsets(data, chunk=INDEX_CHUNK):
+    """Start offset of every CSV row in `data` (uint8 array), plus the end offset.
+
+    Newlines inside quoted fields do not start a row: a newline is a row
+    break only when an even number of quotes precedes it.
+    """
+    starts = [np.zeros(1, dtype=np.int64)]
+    quotes_before = 0
+    for begin in range(0, len(data), chunk):
+        block = data[begin:begin + chunk]
+        newlines = np.flatnonzero(block == NEWLINE)
+        quotes = np.flatnonzero(block == QUOTE)
+        if len(quotes):
+            inside = (quotes_before + np.searchsorted(quotes, newlines)) % 2 == 1
+            newlines = newlines[~inside]
+            quotes_before += len(quotes)
+        starts.append(newlines.astype(np.int64) + begin + 1)
+    offsets = np.concatenate(starts)
+    if offsets[-1] < len(data):
+        # Last row without a trailing newline
+        offsets = np.append(offsets, len(data))
+    return offsets
+
+
+class CsvRows:
+    """Random access to the rows of a CSV file without reading it into memory"""
+
+    def __init__(self, path, encoding='utf-8'):
+        self.path = path
+        self.encoding = encoding
+        if os.path.getsize(path):
+            self._data = np.memmap(path, dtype=np.uint8, mode='r')
+        else:
+            self._data = np.empty(0, dtype=np.uint8)
+        self.offsets = row_offsets(self._data)
+        self._cache = {}
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def row(self, index):
+        """Fields of row `index` (0 is the header), parsed on first access"""
+        fields = self._cache.get(index)
+        if fields is None:
+            if len(self._cache) >= ROW_CACHE_LIMIT:
+                self._cache.clear()
+            start, end = int(self.offsets[index]), int(self.offsets[index + 1])
+            text = self._data[start:end].tobytes().decode(self.encoding, 'replace')
+            fields = next(csv.reader(io.StringIO(text)), [])
+            self._cache[index] = fields
+        return fields
+
+    def sample(self, count=SAMPLE_ROWS):
+        """The first rows plus rows spread evenly over the rest of the file"""
+        total = len(self)
+        head = list(range(min(total, count // 2)))
+        spread = np.linspace(len(head), total - 1, count - len(head), dtype=np.int64) if total > len(head) else []
+        return [self.row(i) for i in sorted(set(head) | {int(i) for i in spread})]
+
+
+class GlyphCache:
+    """Draws text from individually rendered characters, each rendered once"""
+
+    def __init__(self, font, color):
+        self.font = font
+        self.color = color
+        self._glyphs = {}
+
+    def glyph(self, char):
+        surface = self._glyphs.get(char)
+        if surface is None:
+            surface = self._glyphs[char] = self.font.render(char, True, self.color)
+        return surface
+
+    def width(self, text):
+        return sum(self.glyph(char).get_width() for char in text)
+
+    def draw(self, surface, text, x, y, max_width):
+        """Blit `text` at (x, y) in one Surface.blits call, cut off at max_width"""
+        sequence = []
+        for char in text.replace('\n', ' '):
+            glyph = self.glyph(char)
+            if x + glyph.get_width() > max_width:
+                break
+            sequence.append((glyph, (x, y)))
+            x += glyph.get_width()
+        surface.blits(sequence, doreturn=False)
+
+
+class VirtualTable:
+    """Scroll state and drawing of a CsvRows table; draws only visible rows"""
+
+    def __init__(self, rows, title, title_font, cell_font):
+        self.rows = rows
+        self.title = title
+        self.title_font = title_font
+        self.glyphs = GlyphCache(cell_font, TEXT_COLOR)
+        self.top = 1  # first data row on screen
+        self.left = 0  # horizontal scroll in pixels
+        sample = rows.sample() if len(rows) else []
+        count = max((len(row) for row in sample), default=0)
+        self.col_widths = [
+            min(MAX_COLUMN_WIDTH, max((self.glyphs.width(row[i]) for row in sample if i < len(row)), default=0) + 12)
+            for i in range(count)
+        ]
+
+    def visible_rows(self, height):
+        """Data rows that fit below the header and above the status line"""
+        return max(1, (height - START_Y - ROW_HEIGHT * 2) // ROW_HEIGHT)
+
+    def scroll(self, rows=0, pixels=0, size=None):
+        """Move the view; returns True when it changed"""
+        width, height = size
+        last_top = max(1, len(self.rows) - self.visible_rows(height))
+        top = min(max(1, self.top + rows), last_top)
+        max_left = max(0, sum(self.col_widths) - (width - SCROLLBAR_WIDTH - 10))
+        left = min(max(0, self.left + pixels), max_left)
+        changed = (top, left) != (self.top, self.left)
+        self.top, self.left = top, left
+        return changed
+
+    def _draw_row(self, surface, fields, y, color, right):
+        x = 5 - self.left
+        for width, cell in zip(self.col_widths, fields):
+            if x + width > 0:
+                rect = pygame.Rect(x, y, width, ROW_HEIGHT)
+                pygame.draw.rect(surface, color, rect)
+                pygame.draw.rect(surface, LINE_COLOR, rect, 1)
+                text_y = y + (ROW_HEIGHT - self.glyphs.font.get_height()) // 2
+                self.glyphs.draw(surface, cell, x + 4, text_y, min(x + width - 4, right))
+            x += width
+            if x >= right:
+                break
+
+    def draw(self, surface):
+        width, height = surface.get_size()
+        right = width - SCROLLBAR_WIDTH
+        surface.fill(BG_COLOR)
+        title_text = self.title_font.render(self.title, True, TITLE_COLOR)
+        surface.blit(title_text, (width // 2 - title_text.get_width() // 2, 8))
+        if not len(self.rows):
+            return
+
+        surface.set_clip(pygame.Rect(0, 0, right, height))
+        self._draw_row(surface, self.rows.row(0), START_Y, HEADER_COLOR, right)
+        count = self.visible_rows(height)
+        end = min(len(self.rows), self.top + count)
+        y = START_Y + ROW_HEIGHT
+        for index in range(self.top, end):
+            self._draw_row(surface, self.rows.row(index), y, BG_COLOR, right)
+            y += ROW_HEIGHT
+        surface.set_clip(None)
+
+        data_rows = len(self.rows) - 1
+        status = f"rows {self.top:,}-{end - 1:,} of {data_rows:,}"
+        self.glyphs.draw(surface, status, 8, height - ROW_HEIGHT + 4, right)
+        # Scrollbar thumb sized and placed by the visible fraction of the rows
+        track = pygame.Rect(right, START_Y, SCROLLBAR_WIDTH, height - START_Y - ROW_HEIGHT)
+        pygame.draw.rect(surface, LINE_COLOR, track, 1)
+        if data_rows > count:
+            thumb_height = max(12, track.height * count // data_rows)
+            thumb_y = track.y + (track.height - thumb_height) * (self.top - 1) // max(1, data_rows - count)
+            pygame.draw.rect(surface, STATUS_COLOR, (track.x + 2, thumb_y, SCROLLBAR_WIDTH - 4, thumb_height))
+
+
+_KEY_ROWS = {pygame.K_UP: -1, pygame.K_DOWN: 1}
+_KEY_PIXELS = {pygame.K_LEFT: -40, pygame.K_RIGHT: 40}
+
+
+def _key_scroll(table, key, size):
+    page = table.visible_rows(size[1])
+    if key in _KEY_ROWS:
+        return table.scroll(rows=_KEY_ROWS[key], size=size)
+    if key in _KEY_PIXELS:
+        return table.scroll(pixels=_KEY_PIXELS[key], size=size)
+    if key == pygame.K_PAGEUP:
+        return table.scroll(rows=-page, size=size)
+    if key == pygame.K_PAGEDOWN:
+        return table.scroll(rows=page, size=size)
+    if key == pygame.K_HOME:
+        return table.scroll(rows=-len(table.rows), size=size)
+    if key == pygame.K_END:
+        return table.scroll(rows=len(table.rows), size=size)
+    return False
+
+
+def show(screen, path, title, title_font, cell_font):
+    """Display the CSV at `path` until it is closed (or Esc).
+
+    Scrolls with the mouse wheel, the arrow keys, Page Up/Down and Home/End.
+    """
+    table = VirtualTable(CsvRows(path), title, title_font, cell_font)
+
+    def redraw():
+        table.draw(screen)
+        pygame.display.flip()
+
+    redraw()
+    while True:
+        # Like metric_table.show: sleep on the event queue and redraw only on change
+        event = pygame.event.wait()
+        if event.type == pygame.QUIT:
+            return
+        if event.type == pygame.KEYDOWN:
+            if event.key == pygame.K_ESCAPE:
+                return
+            if _key_scroll(table, event.key, screen.get_size()):
+                redraw()
+        elif event.type == pygame.MOUSEWHEEL:
+            if table.scroll(rows=-event.y * 3, pixels=event.x * 40, size=screen.get_size()):
+                redraw()
+        elif event.type in (pygame.WINDOWEXPOSED, pygame.VIDEOEXPOSE, pygame.WINDOWSIZECHANGED):
+            redraw()
+
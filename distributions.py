@@ -0,0 +1,125 @@
+"""Process-time distributions for the flow engine.
+
+Each distribution draws from a `random.Random` passed in by the engine, so
+a seeded engine always produces the same run. `mean` and `variance` are
+exposed for analysis code that does not want to sample.
+"""
+import csv
+import math
+
+
+class Constant:
+    def __init__(self, value):
+        self.value = float(value)
+        self.mean = self.value
+        self.variance = 0.0
+
+    def sample(self, rng):
+        return self.value
+
+    def __repr__(self):
+        return f"Constant({self.value:g})"
+
+
+class Exponential:
+    def __init__(self, mean):
+        if mean <= 0:
+            raise ValueError("exponential mean must be positive")
+        self.mean = float(mean)
+        self.variance = self.mean ** 2
+
+    def sample(self, rng):
+        return rng.expovariate(1.0 / self.mean)
+
+    def __repr__(self):
+        return f"Exponential({self.mean:g})"
+
+
+class LogNormal:
+    """Lognormal process time given by its own mean and standard deviation"""
+
+    def __init__(self, mean, std):
+        if mean <= 0 or std < 0:
+            raise ValueError("lognormal needs a positive mean and non-negative std")
+        self.mean = float(mean)
+        self.variance = float(std) ** 2
+        sigma2 = math.log(1 + self.variance / self.mean ** 2)
+        self.mu = math.log(self.mean) - sigma2 / 2
+        self.sigma = math.sqrt(sigma2)
+
+    def sample(self, rng):
+        return rng.lognormvariate(self.mu, self.sigma)
+
+    def __repr__(self):
+        return f"LogNormal({self.mean:g}, {math.sqrt(self.variance):g})"
+
+
+class Empirical:
+    """Resamples observed process times (e.g. a column exported from the floor)"""
+
+    def __init__(self, values):
+        self.values = [float(v) for v in values]
+        if not self.values:
+            raise ValueError("empirical distribution needs at least one value")
+        n = len(self.values)
+        self.mean = sum(self.values) / n
+        self.variance = sum((v - self.mean) ** 2 for v in self.values) / n
+
+    @classmethod
+    def from_csv(cls, path, column=0):
+        """Read one numeric column (index or header name); non-numeric cells are skipped"""
+        values = []
+        with open(path, newline='', encoding='utf-8') as csvfile:
+            reader = csv.reader(csvfile)
+            for line, row in enumerate(reader):
+                if isinstance(column, str):
+                    if line == 0:
+                        column = row.index(column)
+                        continue
+                if column >= len(row):
+                    continue
+                try:
+                    values.append(float(row[column]))
+                except ValueError:
+                    continue
+        return cls(values)
+
+    def sample(self, rng):
+        return self.values[int(rng.random() * len(self.values))]
+
+    def __repr__(self):
+        return f"Empirical(n={len(self.values)}, mean={self.mean:g})"
+
+
+def parse_distribution(spec):
+    """Build a distribution from a short spec.
+
+    "15" or "const:15", "exp:15", "lognormal:15,4", "empirical:times.csv"
+    or "empirical:times.csv,Cycle Time".
+    """
+    kind, _, args = spec.partition(':')
+    if not args:
+        return Constant(float(kind))
+    kind = kind.lower()
+    if kind in ('const', 'constant'):
+        return Constant(float(args))
+    if kind in ('exp', 'exponential'):
+        return Exponential(float(args))
+    if kind in ('lognormal', 'lognorm'):
+        mean, std = (float(v) for v in args.split(','))
+        return LogNormal(mean, std)
+    if kind == 'empirical':
+        path, _, column = args.partition(',')
+        if not column:
+            return Empirical.from_csv(path)
+        return Empirical.from_csv(path, int(column) if column.isdigit() else column)
+    raise ValueError(f"unknown distribution: {spec}")
+
+
+def mean_of(value):
+    """Mean of a distribution or a plain number"""
+    return getattr(value, 'mean', value)
+
+
+def variance_of(value):
+    return getattr(value, 'variance', 0.0)
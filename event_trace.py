@@ -0,0 +1,245 @@
+"""Compact binary event traces of flow_engine runs.
+
+A trace is a 32-byte header followed by fixed-width records (time, part,
+station, kind), appended as the run goes. The record block can be opened
+with numpy.memmap as a structured array, so a long run computed once on a
+server can be replayed and scrubbed on another machine without
+re-simulating:
+
+    python event_trace.py record line.trace --parts 100000
+    python one_piece_flow.py --replay line.trace
+"""
+import argparse
+import os
+import struct
+
+import numpy as np
+
+import flow_engine
+
+MAGIC = b'OPFTRACE'
+VERSION = 2  # 2: entry machine count (version 1 traces are serial lines)
+# magic, version, machines, raw_count (-1 = endless), transfer_time,
+# entry machines (machines 0..n-1 form the first station), padding
+HEADER = struct.Struct('<8sHHqdH2x')
+HEADER_SIZE = HEADER.size  # 32 bytes
+
+RECORD_DTYPE = np.dtype([
+    ('time', '<f8'),
+    ('part', '<i4'),
+    ('station', '<i2'),
+    ('kind', 'u1'),
+])
+
+_FLUSH_RECORDS = 65536
+
+
+class TraceWriter:
+    """Engine listener that appends every event to a trace file"""
+
+    def __init__(self, path, engine):
+        self.path = path
+        self._file = open(path, 'wb')
+        raw_count = -1 if engine.raw_count is None else engine.raw_count
+        routing = getattr(engine, 'routing', None)
+        entry_machines = 1 if routing is None else routing.station_count[0]
+        self._file.write(HEADER.pack(MAGIC, VERSION, engine.num_machines, raw_count,
+                                     float(engine.transfer_time), entry_machines))
+        self._buffer = np.empty(_FLUSH_RECORDS, dtype=RECORD_DTYPE)
+        self._count = 0
+        self.written = 0
+
+    def __call__(self, now, kind, part, station):
+        self._buffer[self._count] = (now, part, station, kind)
+        self._count += 1
+        if self._count == _FLUSH_RECORDS:
+            self.flush()
+
+    def flush(self):
+        if self._count:
+            self._file.write(self._buffer[:self._count].tobytes())
+            self.written += self._count
+            self._count = 0
+        self._file.flush()
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+
+def record(path, engine):
+    """Run `engine` to completion while writing its trace to `path`"""
+    writer = TraceWriter(path, engine)
+    engine.add_listener(writer)
+    try:
+        engine.run()
+    finally:
+        engine.remove_listener(writer)
+        writer.close()
+    return writer.written
+
+
+def read_header(path):
+    with open(path, 'rb') as f:
+        data = f.read(HEADER_SIZE)
+    if len(data) < HEADER_SIZE:
+        raise ValueError(f"{path}: not an event trace")
+    magic, version, num_machines, raw_count, transfer_time, entry_machines = HEADER.unpack(data)
+    if magic != MAGIC or version not in (1, VERSION):
+        raise ValueError(f"{path}: not an event trace (versions 1 to {VERSION})")
+    return {
+        'num_machines': num_machines,
+        'raw_count': None if raw_count < 0 else raw_count,
+        'transfer_time': transfer_time,
+        'entry_machines': entry_machines if version > 1 else 1,
+    }
+
+
+def load(path):
+    """(header, records) with records memory-mapped as a RECORD_DTYPE array"""
+    header = read_header(path)
+    # A trace still being written may end in a partial record; ignore it
+    count = (os.path.getsize(path) - HEADER_SIZE) // RECORD_DTYPE.itemsize
+    if count == 0:
+        return header, np.empty(0, dtype=RECORD_DTYPE)
+    return header, np.memmap(path, dtype=RECORD_DTYPE, mode='r', offset=HEADER_SIZE, shape=(count,))
+
+
+class TraceReplay:
+    """Plays a recorded trace through the same listener API as FlowEngine.
+
+    The view can drive it exactly like a live engine (run(until), peek(),
+    remaining()) and additionally seek() to any time. Seeking finds the
+    record by binary search on the time column and re-emits only the events
+    of parts still on the line at that time.
+    """
+
+    def __init__(self, path):
+        header, self.records = load(path)
+        self.num_machines = header['num_machines']
+        self.raw_count = header['raw_count']
+        self.transfer_time = header['transfer_time']
+        self.entry_machines = header['entry_machines']
+        self.times = self.records['time']
+        self.now = 0.0
+        self._pos = 0
+        self._busy_until = [None] * self.num_machines
+        self._listeners = []
+
+    @property
+    def duration(self):
+        return float(self.times[-1]) if len(self.records) else 0.0
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self._listeners.remove(listener)
+
+    def peek(self):
+        return float(self.times[self._pos]) if self._pos < len(self.records) else None
+
+    def is_done(self):
+        return self._pos >= len(self.records)
+
+    def remaining(self, station):
+        finish_at = self._busy_until[station]
+        return 0 if finish_at is None else max(0.0, finish_at - self.now)
+
+    def run(self, until=None):
+        """Emit every recorded event up to `until` (or the end of the trace)"""
+        end = len(self.records) if until is None else int(np.searchsorted(self.times, until, side='right'))
+        if end > self._pos:
+            self._emit_records(self.records[self._pos:end], self._pos)
+            self._pos = end
+        if until is not None and until > self.now:
+            self.now = until
+        return self.now
+
+    def seek(self, time):
+        """Jump to `time`; returns (released, finished) part counts at that time.
+
+        Listeners should clear their state first: only the events of parts
+        released but not yet finished are re-emitted. A part is released by
+        its first transfer into a machine of the first station; on a routed
+        line it may be transferred there again for rework.
+        """
+        end = int(np.searchsorted(self.times, time, side='right'))
+        prefix = self.records[:end]
+        kinds = prefix['kind']
+        released_mask = (kinds == flow_engine.TRANSFER) & (prefix['station'] < self.entry_machines)
+        exited = prefix['part'][kinds == flow_engine.EXIT]
+        released = np.unique(prefix['part'][released_mask])
+        on_line = np.setdiff1d(released, exited)
+
+        self._busy_until = [None] * self.num_machines
+        if len(on_line):
+            # Every event of a part on the line comes after that part's release
+            first = int(np.flatnonzero(released_mask & np.isin(prefix['part'], on_line))[0])
+            window = prefix[first:]
+            keep = np.isin(window['part'], on_line) & (window['kind'] != flow_engine.ARRIVAL)
+            indexes = np.flatnonzero(keep)
+            self._emit_records(window[indexes], None, first + indexes)
+        self._pos = end
+        self.now = time
+        return len(released), len(exited)
+
+    def _finish_time(self, index, station):
+        """Time of the FINISH that ends the START recorded at `index`"""
+        start = index + 1
+        size = 64
+        while start < len(self.records):
+            chunk = self.records[start:start + size]
+            hits = np.flatnonzero((chunk['kind'] == flow_engine.FINISH) & (chunk['station'] == station))
+            if len(hits):
+                return float(chunk['time'][hits[0]])
+            start += size
+            size *= 2
+        return None
+
+    def _emit_records(self, records, offset, indexes=None):
+        for i, (at, part, station, kind) in enumerate(records.tolist()):
+            self.now = at
+            if kind == flow_engine.START:
+                index = offset + i if indexes is None else int(indexes[i])
+                self._busy_until[station] = self._finish_time(index, station)
+            elif kind == flow_engine.FINISH:
+                self._busy_until[station] = None
+            for listener in self._listeners:
+                listener(at, kind, part, station)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record or inspect one-piece-flow event traces")
+    commands = parser.add_subparsers(dest='command', required=True)
+    rec = commands.add_parser('record', help="run the line headless and write its trace")
+    rec.add_argument('path')
+    rec.add_argument('--machines', type=int, default=flow_engine.NUM_MACHINES)
+    rec.add_argument('--parts', type=int, default=flow_engine.RAW_COUNT)
+    rec.add_argument('--process', type=float, default=flow_engine.PROCESS_TIME)
+    rec.add_argument('--transfer', type=float, default=0.4)
+    rec.add_argument('--line', help="line definition file (see line_def.py) instead of a serial line")
+    info = commands.add_parser('info', help="summarize a trace")
+    info.add_argument('path')
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        if args.line:
+            import line_def
+            engine = line_def.load(args.line).make_engine(args.parts)
+        else:
+            engine = flow_engine.FlowEngine(args.machines, args.process, args.parts, transfer_time=args.transfer)
+        written = record(args.path, engine)
+        print(f"{written} events, {engine.now:.1f} s simulated -> {args.path}")
+    else:
+        header, records = load(args.path)
+        print(f"{len(records)} events ({RECORD_DTYPE.itemsize} bytes each), "
+              f"{header['num_machines']} machines, {header['raw_count']} parts")
+        if len(records):
+            print(f"Simulated time: {float(records['time'][-1]):.1f} s")
+            for kind, name in flow_engine.EVENT_NAMES.items():
+                print(f"  {name:9s} {int(np.count_nonzero(records['kind'] == kind))}")
+
+
+if __name__ == "__main__":
+    main()
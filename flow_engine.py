@@ -0,0 +1,444 @@
+"""Headless discrete-event engine for the one-piece-flow line.
+
+Runs the same stations and machine slot rules as one_piece_flow.main(), but
+jumps straight from one event to the next instead of waiting on a frame
+clock. The pygame view is just one listener of the events it emits.
+"""
+import heapq
+import itertools
+import random
+import sys
+import time
+from collections import deque
+
+NUM_MACHINES = 3
+RAW_COUNT = 5
+PROCESS_TIME = 15  # seconds
+
+# Event kinds (small ints so they can be stored compactly)
+ARRIVAL = 0   # part enters the raw material area
+TRANSFER = 1  # part leaves for a station
+START = 2     # machine starts processing a part
+FINISH = 3    # machine finished a part
+EXIT = 4      # part reaches finished goods
+
+EVENT_NAMES = {
+    ARRIVAL: 'arrival',
+    TRANSFER: 'transfer',
+    START: 'start',
+    FINISH: 'finish',
+    EXIT: 'exit',
+}
+
+# Heap-only kinds: a transferred part reaches the station it was sent to,
+# and a broken-down machine is back in service
+_REACH = 5
+_REPAIR = 6
+_DOWN = -1  # slot 'mat' of a machine that is out of service
+
+
+def per_station(value, num_machines):
+    """Expand a scalar setting to one value per station"""
+    if isinstance(value, (list, tuple)):
+        if len(value) != num_machines:
+            raise ValueError(f"expected {num_machines} values, got {len(value)}")
+        return list(value)
+    return [value] * num_machines
+
+
+class FlowEngine:
+    """Serial line of machines fed from a raw material area.
+
+    Every machine has a single slot. A finished part stays at its machine
+    (blocking it) until the next station has room, exactly like the slot
+    hand-off in one_piece_flow.main(). `buffer_sizes` adds queue space in
+    front of a machine (None means unbounded) and `transfer_batch` makes
+    parts move on in batches instead of one piece at a time.
+
+    Process times and the arrival interval can be plain numbers or any
+    object with a `sample(rng)` method (see distributions.py); `seed`
+    makes stochastic runs repeatable. `arrival_times` (sorted) replaces
+    raw_count and the interval with explicit arrivals, e.g. the hand-offs
+    from an upstream line.
+
+    An engine pickles with its full state (event heap, RNG, slots and
+    queues) but without its listeners; see snapshot.py.
+    """
+
+    def __init__(self, num_machines=NUM_MACHINES, process_time=PROCESS_TIME,
+                 raw_count=RAW_COUNT, transfer_time=0.0, arrival_interval=0.0,
+                 buffer_sizes=0, transfer_batch=1, seed=None, arrival_times=None):
+        if arrival_times is not None:
+            raw_count = len(arrival_times)
+        if num_machines < 1:
+            raise ValueError("a line needs at least one machine")
+        if transfer_batch < 1:
+            raise ValueError("transfer_batch must be at least 1")
+        if raw_count is None and not hasattr(arrival_interval, 'sample') and arrival_interval <= 0:
+            raise ValueError("an endless run needs a positive arrival_interval")
+        self.num_machines = num_machines
+        self.process_times = per_station(process_time, num_machines)
+        self.buffer_sizes = per_station(buffer_sizes, num_machines)
+        for size in self.buffer_sizes:
+            if size is not None and size + 1 < transfer_batch:
+                raise ValueError("buffers must hold a full transfer batch")
+        self.raw_count = raw_count
+        self.transfer_time = transfer_time
+        self.arrival_interval = arrival_interval
+        self.arrival_times = arrival_times
+        self.transfer_batch = transfer_batch
+        self.rng = random.Random(seed)
+
+        self.now = 0.0
+        self.machine_slots = [
+            {'mat': None, 'timer': 0, 'busy': False, 'finish_at': 0.0, 'repair_at': 0.0}
+            for _ in range(num_machines)
+        ]
+        self.queues = [deque() for _ in range(num_machines)]  # parts waiting at a station
+        self.outbound = [[] for _ in range(num_machines)]   # finished, waiting to move on
+        self.incoming = [0] * num_machines                  # parts in transit to a station
+        self.done_count = [0] * num_machines
+        self.arrived = 0
+        self.released = 0   # parts that have left the raw area
+        self.completed = 0
+        self.event_count = 0
+
+        self._heap = []
+        self._seq = itertools.count()
+        self._listeners = []
+        if raw_count is None or raw_count > 0:
+            self.schedule(0.0 if arrival_times is None else arrival_times[0], ARRIVAL, 0, -1)
+
+    # --- public API ---
+
+    def add_listener(self, listener):
+        """Call listener(time, kind, part, station) for every event"""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self._listeners.remove(listener)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        next_seq = next(self._seq)
+        self._seq = itertools.count(next_seq)
+        state['_seq'] = next_seq
+        state['_listeners'] = []
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._seq = itertools.count(state['_seq'])
+
+    def schedule(self, at, kind, part, station):
+        heapq.heappush(self._heap, (at, next(self._seq), kind, part, station))
+
+    def peek(self):
+        """Time of the next pending event, or None when the run is over"""
+        return self._heap[0][0] if self._heap else None
+
+    def step(self):
+        """Process the next event; returns False when nothing is left"""
+        if not self._heap:
+            return False
+        at, _, kind, part, station = heapq.heappop(self._heap)
+        self.now = at
+        self.event_count += 1
+        if kind == FINISH:
+            self._on_finish(part, station)
+        elif kind == _REACH:
+            self._on_reach(part, station)
+        elif kind == ARRIVAL:
+            self._on_arrival(part)
+        elif kind == _REPAIR:
+            self._on_repair(station)
+        return True
+
+    def run(self, until=None):
+        """Run until the event heap is empty or the clock reaches `until`"""
+        heap = self._heap
+        step = self.step
+        if until is None:
+            while heap:
+                step()
+        else:
+            while heap and heap[0][0] <= until:
+                step()
+            if until > self.now:
+                self.now = until
+        return self.now
+
+    def is_done(self):
+        return not self._heap
+
+    def remaining(self, station):
+        """Seconds left on the part currently processed at `station`"""
+        slot = self.machine_slots[station]
+        if not slot['busy']:
+            return 0
+        return max(0.0, slot['finish_at'] - self.now)
+
+    def raw_waiting(self):
+        return self.arrived - self.released
+
+    def break_down(self, station, duration):
+        """Take the machine at `station` out of service for `duration` seconds from now.
+
+        A part in progress finishes that much later; an idle machine starts
+        nothing until it is repaired. Parts still queue in front of a down
+        machine, and its own place stays free for the part it starts next.
+        """
+        slot = self.machine_slots[station]
+        slot['repair_at'] = max(slot['repair_at'], self.now + duration)
+        if slot['busy']:
+            slot['finish_at'] += duration
+            heap = self._heap
+            heap[:] = [(at + duration, seq, kind, part, where) if kind == FINISH and where == station
+                       else (at, seq, kind, part, where) for at, seq, kind, part, where in heap]
+            heapq.heapify(heap)
+            return
+        if slot['mat'] is None:
+            slot['mat'] = _DOWN
+        self.schedule(self.now + duration, _REPAIR, -1, station)
+
+    # --- event handlers ---
+
+    def _emit(self, kind, part, station):
+        for listener in self._listeners:
+            listener(self.now, kind, part, station)
+
+    def _on_arrival(self, part):
+        self.arrived += 1
+        self._emit(ARRIVAL, part, -1)
+        if self.arrival_times is not None:
+            if part + 1 < self.raw_count:
+                self.schedule(self.arrival_times[part + 1], ARRIVAL, part + 1, -1)
+        elif self.raw_count is None or part + 1 < self.raw_count:
+            self.schedule(self.now + self._sample(self.arrival_interval), ARRIVAL, part + 1, -1)
+        self._advance(0)
+
+    def _on_reach(self, part, station):
+        self.incoming[station] -= 1
+        self.queues[station].append(part)
+        self._try_start(station)
+
+    def _on_repair(self, station):
+        slot = self.machine_slots[station]
+        if slot['mat'] != _DOWN or self.now < slot['repair_at']:
+            return  # a later repair is still pending
+        slot['mat'] = None
+        self._advance(station)
+
+    def _on_finish(self, part, station):
+        slot = self.machine_slots[station]
+        slot['mat'] = None
+        slot['busy'] = False
+        slot['timer'] = 0
+        self.done_count[station] += 1
+        self.outbound[station].append(part)
+        self._emit(FINISH, part, station)
+        self._try_move(station)
+        self._advance(station)
+
+    # --- line rules ---
+
+    def _sample(self, value):
+        if isinstance(value, (int, float)):
+            return value
+        return value.sample(self.rng)
+
+    def _process_time(self, station, part):
+        return self._sample(self.process_times[station])
+
+    def _free(self, station):
+        size = self.buffer_sizes[station]
+        if size is None:
+            return sys.maxsize
+        used = len(self.queues[station]) + self.incoming[station] + len(self.outbound[station])
+        if self.machine_slots[station]['mat'] not in (None, _DOWN):
+            used += 1
+        return size + 1 - used
+
+    def _dispatch(self, part, station):
+        self.incoming[station] += 1
+        self._emit(TRANSFER, part, station)
+        if self.transfer_time:
+            self.schedule(self.now + self.transfer_time, _REACH, part, station)
+        else:
+            self._on_reach(part, station)
+
+    def _try_start(self, station):
+        slot = self.machine_slots[station]
+        queue = self.queues[station]
+        if slot['mat'] is not None or not queue:
+            return
+        if len(self.outbound[station]) >= self.transfer_batch:
+            return  # blocked until finished parts move on
+        part = queue.popleft()
+        duration = self._process_time(station, part)
+        slot['mat'] = part
+        slot['busy'] = True
+        slot['timer'] = duration
+        slot['finish_at'] = self.now + duration
+        self._emit(START, part, station)
+        self.schedule(self.now + duration, FINISH, part, station)
+
+    def _try_move(self, station):
+        """Send finished parts at `station` onward; True if anything moved"""
+        pile = self.outbound[station]
+        if not pile:
+            return False
+        if station == self.num_machines - 1:
+            for part in pile:
+                self.completed += 1
+                self._emit(EXIT, part, station)
+            pile.clear()
+            return True
+        flush = self.raw_count is not None and self.done_count[station] == self.raw_count
+        if len(pile) < self.transfer_batch and not flush:
+            return False
+        if self._free(station + 1) < len(pile):
+            return False
+        for part in pile:
+            self._dispatch(part, station + 1)
+        pile.clear()
+        return True
+
+    def _advance(self, station):
+        """Start work at `station` and pull parts in from upstream"""
+        while True:
+            self._try_start(station)
+            if station == 0:
+                while self.raw_waiting() > 0 and self._free(0) > 0:
+                    self._dispatch(self.released, 0)
+                    self.released += 1
+                return
+            if not self._try_move(station - 1):
+                return
+            station -= 1
+
+
+class RoutedEngine(FlowEngine):
+    """Line with parallel machines and probabilistic routes (e.g. rework loops).
+
+    `routing` holds the flat tables of a compiled line definition (see
+    line_def.py): station_first/station_count (machines of each station,
+    contiguous), machine_station, succ_start/succ_station/succ_cum
+    (successors of each station with cumulative probabilities; -1 is
+    finished goods), buffer_sizes per station (None is unbounded) and
+    process_times per machine. Events name machines, so listeners see the
+    same (time, kind, part, machine) stream as from FlowEngine.
+
+    Parts enter at station 0. A station holds its machines plus its buffer;
+    a part sent there joins the machine in service with the fewest parts
+    (a down machine only when all of them are down). The route is drawn
+    when a part finishes, and a finished part blocks its machine until its
+    next station has room (blocked machines are served first come, first
+    served). Parts sent back to the same or an earlier station
+    (rework) never wait: they join it even when it is full, as on a rework
+    rack, so loops cannot deadlock the line. A serial line of single
+    machines gives exactly the events of FlowEngine.
+    """
+
+    def __init__(self, routing, raw_count=RAW_COUNT, transfer_time=0.0, arrival_interval=0.0,
+                 seed=None, arrival_times=None):
+        super().__init__(len(routing.machine_station), routing.process_times, raw_count, transfer_time,
+                         arrival_interval, seed=seed, arrival_times=arrival_times)
+        self.routing = routing
+        self.station_of = routing.machine_station
+        num_stations = len(routing.station_first)
+        self.occupancy = [0] * num_stations  # parts sent to a station and not yet moved on
+        self.load = [0] * self.num_machines  # the same per machine
+        self.target = [None] * self.num_machines  # next station of a finished part
+        self.blocked = [False] * self.num_machines
+        self.waiting = [deque() for _ in range(num_stations)]  # machines blocked on a station
+
+    def _free(self, station):
+        size = self.routing.buffer_sizes[station]
+        if size is None:
+            return sys.maxsize
+        return size + self.routing.station_count[station] - self.occupancy[station]
+
+    def _route(self, station):
+        routing = self.routing
+        start, end = routing.succ_start[station], routing.succ_start[station + 1]
+        if end - start == 1:
+            return routing.succ_station[start]
+        draw = self.rng.random()
+        for i in range(start, end - 1):
+            if draw < routing.succ_cum[i]:
+                return routing.succ_station[i]
+        return routing.succ_station[end - 1]
+
+    def _dispatch(self, part, station):
+        first = self.routing.station_first[station]
+        machines = range(first, first + self.routing.station_count[station])
+        if len(machines) == 1:
+            machine = first
+        else:
+            # Fewest parts among the machines in service, then among the down ones
+            slots, load, now = self.machine_slots, self.load, self.now
+            machine = min(machines, key=lambda m: (slots[m]['repair_at'] > now, load[m]))
+        self.load[machine] += 1
+        self.occupancy[station] += 1
+        super()._dispatch(part, machine)
+
+    def _try_move(self, machine):
+        pile = self.outbound[machine]
+        if not pile:
+            return False
+        target = self.target[machine]
+        if target is None:
+            target = self.target[machine] = self._route(self.station_of[machine])
+        if target > self.station_of[machine] and self._free(target) <= 0:
+            if not self.blocked[machine]:
+                self.blocked[machine] = True
+                self.waiting[target].append(machine)
+            return False
+        part = pile.pop()
+        self.target[machine] = None
+        self.load[machine] -= 1
+        self.occupancy[self.station_of[machine]] -= 1
+        if target < 0:
+            self.completed += 1
+            self._emit(EXIT, part, machine)
+        else:
+            self._dispatch(part, target)
+        return True
+
+    def _advance(self, machine):
+        """Start work at `machine` and pull parts into stations that have room"""
+        work = [machine]
+        while work:
+            machine = work.pop()
+            self._try_start(machine)
+            station = self.station_of[machine]
+            while self._free(station) > 0:
+                if self.waiting[station]:
+                    upstream = self.waiting[station].popleft()
+                    self.blocked[upstream] = False
+                    if self._try_move(upstream):
+                        work.append(upstream)
+                elif station == 0 and self.raw_waiting() > 0:
+                    self._dispatch(self.released, 0)
+                    self.released += 1
+                else:
+                    break
+
+
+def run_headless(raw_count=RAW_COUNT, **kwargs):
+    """Run a full line without any display and return the engine"""
+    engine = FlowEngine(raw_count=raw_count, **kwargs)
+    engine.run()
+    return engine
+
+
+if __name__ == "__main__":
+    parts = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    started = time.perf_counter()
+    engine = run_headless(parts)
+    elapsed = time.perf_counter() - started
+    print(f"{engine.completed} parts through {engine.num_machines} machines")
+    print(f"Simulated time: {engine.now:.1f} s")
+    print(f"{engine.event_count} events in {elapsed:.2f} s wall time "
+          f"({engine.event_count / elapsed:,.0f} events/s)")
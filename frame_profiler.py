@@ -0,0 +1,151 @@
+"""Per-phase frame timing for the pygame scenes.
+
+A scene loop calls start_frame() at the top of every frame and
+mark(phase) after each phase (background, draw, update, flip, ...). The
+last `window` samples of every phase are kept for the FPS / milliseconds
+overlay (F3) and for histograms. capture() records the next N frames with
+cProfile and writes them to disk (F4, or SIM_PROFILE_FRAMES=N at startup):
+
+    python -m pstats simulation.prof
+"""
+import cProfile
+import os
+import time
+from collections import deque
+
+import pygame
+
+HISTOGRAM_EDGES_MS = (1, 2, 4, 8, 16, 33)
+OVERLAY_REFRESH_FRAMES = 15  # refresh the numbers ~4x per second, readable
+CAPTURE_FRAMES = 300
+
+
+def histogram(samples_ms, edges=HISTOGRAM_EDGES_MS):
+    """Counts of samples below each edge, plus one bucket for the rest"""
+    counts = [0] * (len(edges) + 1)
+    for value in samples_ms:
+        for i, edge in enumerate(edges):
+            if value < edge:
+                counts[i] += 1
+                break
+        else:
+            counts[-1] += 1
+    return counts
+
+
+class FrameProfiler:
+    def __init__(self, name, window=120):
+        self.name = name
+        self.window = window
+        self.frames = deque(maxlen=window)
+        self.phases = {}
+        self.visible = False
+        self._frame_start = None
+        self._last = None
+        self._lines = []
+        self._overlay = None
+        self._frames_since_refresh = OVERLAY_REFRESH_FRAMES
+        self._profile = None
+        self._profile_left = 0
+        self._profile_path = None
+
+    @classmethod
+    def from_env(cls, name):
+        """Profiler for a scene; SIM_PROFILE_FRAMES=N captures its first N frames"""
+        profiler = cls(name)
+        frames = int(os.environ.get('SIM_PROFILE_FRAMES', '0') or 0)
+        if frames > 0:
+            profiler.capture(frames, os.environ.get('SIM_PROFILE_OUT'))
+        return profiler
+
+    def start_frame(self):
+        now = time.perf_counter()
+        if self._frame_start is not None:
+            self.frames.append(now - self._frame_start)
+            if self._profile is not None:
+                self._profile_left -= 1
+                if self._profile_left <= 0:
+                    self._finish_capture()
+        self._frame_start = self._last = now
+
+    def mark(self, phase):
+        """Charge the time since the previous mark to `phase`"""
+        now = time.perf_counter()
+        samples = self.phases.get(phase)
+        if samples is None:
+            samples = self.phases[phase] = deque(maxlen=self.window)
+        samples.append(now - self._last)
+        self._last = now
+
+    def fps(self):
+        total = sum(self.frames)
+        return len(self.frames) / total if total > 0 else 0.0
+
+    def stats(self):
+        """Mean, 95th percentile, max and histogram (ms) per phase over the window"""
+        result = {}
+        for phase, samples in self.phases.items():
+            values = sorted(s * 1000 for s in samples)
+            result[phase] = {
+                'mean_ms': sum(values) / len(values),
+                'p95_ms': values[min(len(values) - 1, int(len(values) * 0.95))],
+                'max_ms': values[-1],
+                'histogram': histogram(values),
+            }
+        return result
+
+    def toggle(self):
+        self.visible = not self.visible
+        self._frames_since_refresh = OVERLAY_REFRESH_FRAMES
+
+    def overlay_lines(self):
+        """FPS and per-phase milliseconds, refreshed every few frames"""
+        self._frames_since_refresh += 1
+        if self._frames_since_refresh >= OVERLAY_REFRESH_FRAMES:
+            self._frames_since_refresh = 0
+            frame_ms = sum(self.frames) / len(self.frames) * 1000 if self.frames else 0.0
+            self._lines = [f"{self.fps():5.1f} FPS  {frame_ms:5.2f} ms/frame"]
+            for phase, stat in self.stats().items():
+                self._lines.append(f"{phase:10s} {stat['mean_ms']:6.2f}  p95 {stat['p95_ms']:6.2f}")
+            if self._profile is not None:
+                self._lines.append(f"profiling: {self._profile_left} frames left")
+        return self._lines
+
+    def overlay(self, font):
+        """Cached overlay_surface() of the current lines"""
+        lines = self.overlay_lines()
+        if self._overlay is None or self._overlay[0] is not lines or self._overlay[1] is not font:
+            self._overlay = (lines, font, overlay_surface(lines, font))
+        return self._overlay[2]
+
+    def capture(self, frames=CAPTURE_FRAMES, path=None):
+        """cProfile the next `frames` frames and write the stats to `path`"""
+        if self._profile is not None:
+            return
+        self._profile_path = path or f"{self.name}.prof"
+        self._profile_left = frames
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+
+    def stop(self):
+        """Write out a capture still running when the scene ends"""
+        if self._profile is not None:
+            self._finish_capture()
+
+    def _finish_capture(self):
+        self._profile.disable()
+        self._profile.dump_stats(self._profile_path)
+        print(f"Frame profile written to {self._profile_path}")
+        self._profile = None
+
+
+def overlay_surface(lines, font, color=(255, 255, 255), background=(0, 0, 0, 170)):
+    """Translucent panel with one text line per row"""
+    rendered = [font.render(line, True, color) for line in lines]
+    width = max((text.get_width() for text in rendered), default=0) + 8
+    height = len(rendered) * font.get_linesize() + 6
+    surface = pygame.Surface((width, height), pygame.SRCALPHA)
+    surface.fill(background)
+    for i, text in enumerate(rendered):
+        surface.blit(text, (4, 3 + i * font.get_linesize()))
+    return surface
@@ -1,8 +1,32 @@
+import time
+_STARTED = time.perf_counter()
+
 import pygame
 import sys
 import subprocess
 import os
-from plot_examples import show_all_plots
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import line_estimate
+import metrics_pipeline
+import render_cache
+import scenes
+from frame_profiler import FrameProfiler
+
+# seaborn/pandas/matplotlib are only needed for "Open Plot"; they are imported
+# on first use (or preloaded in the background once the launcher is up)
+PRELOAD_PLOTS = os.environ.get('SIM_PRELOAD_PLOTS', '1') != '0'
+
+CAPTION = "Manufacturing Visualization & Simulation Launcher"
+
+PLOTS_CAPTION = "Process Improvement Plots"
+
+_startup_probe = False
+_plots_preloaded = False
+_plot_executor = None
+_plot_job = None
 
 def is_running_as_exe():
     """Check if the script is running as a compiled executable"""
@@ -25,23 +49,148 @@ def get_resource_path(relative_path):
 
 def run_simulation():
     """Run the one-piece flow simulation"""
-    import one_piece_flow
-    one_piece_flow.main()
+    scenes.run(scenes.SIMULATION)
 
 def run_metrics():
     """Run the process metric viewer"""
-    import process_metric_viewer
-    process_metric_viewer.main()
+    scenes.run(scenes.METRICS)
+
+def show_plots():
+    """Render the plots off-screen in a worker thread; returns a Future of render_plots()"""
+    global _plot_executor
+    if _plot_executor is None:
+        _plot_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='plot-render')
+
+    def render():
+        from plot_examples import render_plots
+        return render_plots()
+    return _plot_executor.submit(render)
+
+def plot_surface(image):
+    """pygame Surface for a render_plots() result, cached by its metric key"""
+    key, size, data = image
+    return render_cache.get_layer('plots', size, key,
+                                  lambda surface: surface.blit(pygame.image.frombuffer(data, size, 'RGBA'), (0, 0)))
+
+def plots_scene():
+    """Show the rendered plots until the window is closed (or Esc)"""
+    global _plot_job
+    job, _plot_job = _plot_job, None
+    try:
+        image = job.result() if job is not None else show_plots().result()
+        surface = plot_surface(image)
+    except Exception as exc:
+        # A failed render must not take the launcher and the other scenes down with it
+        traceback.print_exception(exc)
+        show_plot_error(exc)
+        return scenes.LAUNCHER
+    screen = scenes.set_mode(surface.get_size(), PLOTS_CAPTION)
+    screen.blit(surface, (0, 0))
+    pygame.display.flip()
+    while True:
+        event = pygame.event.wait()
+        if event.type == pygame.QUIT:
+            return scenes.back(scenes.PLOTS)
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+            return scenes.back(scenes.PLOTS)
+        if event.type in (pygame.WINDOWEXPOSED, pygame.VIDEOEXPOSE):
+            screen.blit(surface, (0, 0))
+            pygame.display.flip()
+
+def wrap_text(font, text, width):
+    """Split text into lines that fit `width` pixels"""
+    lines = []
+    for paragraph in text.splitlines() or ['']:
+        line = ''
+        for word in paragraph.split(' '):
+            candidate = f"{line} {word}" if line else word
+            if line and font.size(candidate)[0] > width:
+                lines.append(line)
+                line = word
+            else:
+                line = candidate
+        lines.append(line)
+    return lines
+
+def show_plot_error(exc):
+    """Tell the user the plots could not be rendered; wait for a key, click or close"""
+    screen = scenes.set_mode((500, 220), PLOTS_CAPTION)
+    title_font = render_cache.font('Segoe UI', 18, bold=True)
+    text_font = render_cache.font('Segoe UI', 13)
+    screen.fill((60, 40, 40))
+    screen.blit(title_font.render("The plots could not be rendered", True, (255, 210, 60)), (20, 16))
+    y = 52
+    for line in wrap_text(text_font, f"{type(exc).__name__}: {exc}", screen.get_width() - 40)[:8]:
+        screen.blit(text_font.render(line, True, (240, 240, 240)), (20, y))
+        y += text_font.get_linesize()
+    hint = text_font.render("Press any key to go back to the launcher", True, (200, 205, 215))
+    screen.blit(hint, (20, screen.get_height() - hint.get_height() - 12))
+    pygame.display.flip()
+    while True:
+        event = pygame.event.wait()
+        if event.type in (pygame.QUIT, pygame.KEYDOWN, pygame.MOUSEBUTTONDOWN):
+            return
+        if event.type in (pygame.WINDOWEXPOSED, pygame.VIDEOEXPOSE):
+            pygame.display.flip()
+
+def preload_plots():
+    """Import the plotting stack in a background thread so the first click is quick"""
+    def load():
+        try:
+            import plot_examples  # noqa: F401
+        except Exception:
+            pass  # the click will import it again and show the real error
+    thread = threading.Thread(target=load, name='plot-preload', daemon=True)
+    thread.start()
+    return thread
 
-def run_main_gui():
+def parse_importtime(stderr):
+    """Cumulative microseconds per top-level import from `python -X importtime` output"""
+    costs = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|', 2)
+        if name.startswith(' ') and not name.startswith('  '):
+            costs[name.strip()] = int(cumulative)
+    return costs
+
+def profile_startup():
+    """Report where launcher startup time goes (python gui.py --startup-profile)"""
+    if is_running_as_exe():
+        command = [get_executable_path(), '--startup-child']
+    else:
+        command = [sys.executable, '-X', 'importtime', os.path.abspath(__file__), '--startup-child']
+    result = subprocess.run(command, capture_output=True, text=True)
+    print(result.stdout, end='')
+    costs = parse_importtime(result.stderr)
+    if costs:
+        print("Import cost at startup (cumulative, top-level modules):")
+        for name, micros in sorted(costs.items(), key=lambda item: -item[1])[:25]:
+            print(f"  {micros / 1000:8.1f} ms  {name}")
+
+def launcher_estimate():
+    """One-line analytic estimate of the one-piece-flow line (no simulation)"""
+    config = metrics_pipeline.scenario_configs(metrics_pipeline.DEFAULT_CONFIG)['after']
+    result = line_estimate.estimate(config)
+    return (f"Estimate: {result['throughput_per_hour']:.0f} parts/h, WIP {result['wip']:.1f}, "
+            f"lead time {result['lead_time'] / 60:.1f} min")
+
+def run_main_gui(startup_probe=False):
     """Run the main GUI"""
-    pygame.init()
-    screen = pygame.display.set_mode((500, 320))
-    pygame.display.set_caption("Manufacturing Visualization & Simulation Launcher")
+    global _startup_probe
+    _startup_probe = startup_probe
+    scenes.run(scenes.LAUNCHER)
+
+def launcher_scene():
+    """Launcher menu; returns the scene picked by the user (None on quit)"""
+    global _plots_preloaded, _plot_job
+    screen = scenes.set_mode((500, 320), CAPTION)
 
-    font = pygame.font.SysFont('Segoe UI', 22, bold=True)
-    title_font = pygame.font.SysFont('Segoe UI', 32, bold=True)
-    button_font = pygame.font.SysFont('Segoe UI', 18, bold=True)
+    title_font = render_cache.font('Segoe UI', 32, bold=True)
+    button_font = render_cache.font('Segoe UI', 18, bold=True)
+    estimate_font = render_cache.font('Segoe UI', 13)
+    estimate = launcher_estimate()
 
     # Industrial/robotic theme colors
     background_top = (80, 90, 110)
@@ -67,79 +216,124 @@ def run_main_gui():
         pygame.draw.line(surface, (180,180,180), (x+8*scale, y+5*scale), (x+16*scale, y), int(3*scale))
         pygame.draw.circle(surface, (200,200,200), (int(x+16*scale), int(y)), int(3*scale))
 
-    running = True
-    while running:
-        # Redraw background each frame
-        for y in range(screen.get_height()):
-            ratio = y / screen.get_height()
-            r = int(background_top[0] * (1 - ratio) + background_bottom[0] * ratio)
-            g = int(background_top[1] * (1 - ratio) + background_bottom[1] * ratio)
-            b = int(background_top[2] * (1 - ratio) + background_bottom[2] * ratio)
-            pygame.draw.line(screen, (r, g, b), (0, y), (screen.get_width(), y))
+    def draw_launcher(surface, hovered, rendering):
+        """Whole launcher screen for one hover state; cached by render_cache"""
+        surface.blit(render_cache.gradient(surface.get_size(), background_top, background_bottom), (0, 0))
 
         # Draw title with accent underline
         title_text = title_font.render("Manufacturing Control Panel", True, accent_yellow)
-        screen.blit(title_text, (screen.get_width() // 2 - title_text.get_width() // 2, 20))
-        pygame.draw.line(screen, accent_orange, (screen.get_width()//2 - 120, 60), (screen.get_width()//2 + 120, 60), 3)
-
-        mouse_pos = pygame.mouse.get_pos()
-        plot_color = button_hover_color if button_rect.collidepoint(mouse_pos) else button_color
-        sim_color = button_hover_color if sim_button_rect.collidepoint(mouse_pos) else button_color
-        metric_color = button_hover_color if metric_button_rect.collidepoint(mouse_pos) else button_color
+        surface.blit(title_text, (surface.get_width() // 2 - title_text.get_width() // 2, 20))
+        pygame.draw.line(surface, accent_orange, (surface.get_width()//2 - 120, 60), (surface.get_width()//2 + 120, 60), 3)
 
         # Draw buttons with border and shadow
-        for rect, color, icon_color in [
-            (button_rect, plot_color, accent_yellow),
-            (sim_button_rect, sim_color, accent_orange),
-            (metric_button_rect, metric_color, (100, 200, 100))
+        for rect, icon_color in [
+            (button_rect, accent_yellow),
+            (sim_button_rect, accent_orange),
+            (metric_button_rect, (100, 200, 100))
         ]:
+            color = button_hover_color if rect == hovered else button_color
             shadow_rect = rect.move(3, 3)
-            pygame.draw.rect(screen, (30, 30, 30), shadow_rect, border_radius=10)
-            pygame.draw.rect(screen, color, rect, border_radius=10)
-            pygame.draw.rect(screen, button_border, rect, 2, border_radius=10)
+            pygame.draw.rect(surface, (30, 30, 30), shadow_rect, border_radius=10)
+            pygame.draw.rect(surface, color, rect, border_radius=10)
+            pygame.draw.rect(surface, button_border, rect, 2, border_radius=10)
 
         # Draw robot arm icons on buttons
-        draw_robot_arm(screen, button_rect.x + 10, button_rect.y + 6, 0.7, accent_yellow)
-        draw_robot_arm(screen, sim_button_rect.x + 10, sim_button_rect.y + 6, 0.7, accent_orange)
+        draw_robot_arm(surface, button_rect.x + 10, button_rect.y + 6, 0.7, accent_yellow)
+        draw_robot_arm(surface, sim_button_rect.x + 10, sim_button_rect.y + 6, 0.7, accent_orange)
         # Draw a simple chart icon for the metric button
         mx, my = metric_button_rect.x + 18, metric_button_rect.y + 12
-        pygame.draw.rect(screen, (100, 200, 100), (mx, my+16, 6, 14), border_radius=2)
-        pygame.draw.rect(screen, (100, 200, 100), (mx+10, my+8, 6, 22), border_radius=2)
-        pygame.draw.rect(screen, (100, 200, 100), (mx+20, my+4, 6, 26), border_radius=2)
+        pygame.draw.rect(surface, (100, 200, 100), (mx, my+16, 6, 14), border_radius=2)
+        pygame.draw.rect(surface, (100, 200, 100), (mx+10, my+8, 6, 22), border_radius=2)
+        pygame.draw.rect(surface, (100, 200, 100), (mx+20, my+4, 6, 26), border_radius=2)
 
         # Draw button text
-        button_text = button_font.render("Open Plot", True, text_color)
+        button_text = button_font.render("Rendering Plot..." if rendering else "Open Plot", True, text_color)
         sim_button_text = button_font.render("One-Piece-Flow Simulation", True, text_color)
         metric_button_text = button_font.render("Sample Process Improvement Metric", True, text_color)
-        screen.blit(button_text, (button_rect.x + 50, button_rect.y + (button_rect.height - button_text.get_height()) // 2))
-        screen.blit(sim_button_text, (sim_button_rect.x + 50, sim_button_rect.y + (sim_button_rect.height - sim_button_text.get_height()) // 2))
-        screen.blit(metric_button_text, (metric_button_rect.x + 50, metric_button_rect.y + (metric_button_rect.height - metric_button_text.get_height()) // 2))
-
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
-            elif event.type == pygame.MOUSEBUTTONDOWN:
-                if button_rect.collidepoint(event.pos):
-                    show_all_plots()
-                elif sim_button_rect.collidepoint(event.pos):
-                    if is_running_as_exe():
-                        subprocess.Popen([get_executable_path(), '--simulation'])
-                    else:
-                        subprocess.Popen([sys.executable, 'one_piece_flow.py'])
-                elif metric_button_rect.collidepoint(event.pos):
-                    if is_running_as_exe():
-                        subprocess.Popen([get_executable_path(), '--metrics'])
-                    else:
-                        subprocess.Popen([sys.executable, 'process_metric_viewer.py'])
-        pygame.display.flip()
-
-    pygame.quit()
+        surface.blit(button_text, (button_rect.x + 50, button_rect.y + (button_rect.height - button_text.get_height()) // 2))
+        surface.blit(sim_button_text, (sim_button_rect.x + 50, sim_button_rect.y + (sim_button_rect.height - sim_button_text.get_height()) // 2))
+        surface.blit(metric_button_text, (metric_button_rect.x + 50, metric_button_rect.y + (metric_button_rect.height - metric_button_text.get_height()) // 2))
+
+        # Instant closed-form answer for the default line (line_estimate)
+        estimate_text = estimate_font.render(estimate, True, (200, 205, 215))
+        surface.blit(estimate_text, (surface.get_width() // 2 - estimate_text.get_width() // 2, 290))
+
+    clock = pygame.time.Clock()
+    first_frame = True
+    profiler = FrameProfiler.from_env('launcher')
+    overlay_font = render_cache.font('Segoe UI', 13)
+    try:
+        while True:
+            profiler.start_frame()
+            # The launcher only changes with the hovered button, so each state is drawn once
+            mouse_pos = pygame.mouse.get_pos()
+            hovered = None
+            for rect in (button_rect, sim_button_rect, metric_button_rect):
+                if rect.collidepoint(mouse_pos):
+                    hovered = rect
+            hover_key = None if hovered is None else tuple(hovered)
+            rendering = _plot_job is not None
+            render_cache.blit_layer(screen, ('launcher', hover_key, rendering), None,
+                                    lambda surface: draw_launcher(surface, hovered, rendering))
+            profiler.mark('background')
+            if profiler.visible:
+                overlay = profiler.overlay(overlay_font)
+                screen.blit(overlay, (screen.get_width() - overlay.get_width() - 6, 6))
+                profiler.mark('overlay')
+
+            # The plots render in a worker thread; the menu stays responsive meanwhile
+            if rendering and _plot_job.done():
+                return scenes.PLOTS
+
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    return None
+                elif event.type == pygame.KEYDOWN:
+                    # F3: frame timing overlay, F4: cProfile capture of the next frames
+                    if event.key == pygame.K_F3:
+                        profiler.toggle()
+                    elif event.key == pygame.K_F4:
+                        profiler.capture()
+                elif event.type == pygame.MOUSEBUTTONDOWN:
+                    if button_rect.collidepoint(event.pos):
+                        if _plot_job is None:
+                            _plot_job = show_plots()
+                    elif sim_button_rect.collidepoint(event.pos):
+                        # Scenes share this window and the loaded modules; no new interpreter
+                        return scenes.SIMULATION
+                    elif metric_button_rect.collidepoint(event.pos):
+                        return scenes.METRICS
+            profiler.mark('events')
+            pygame.display.flip()
+            profiler.mark('flip')
+            clock.tick(60)
+            profiler.mark('wait')
+
+            if first_frame:
+                first_frame = False
+                if _startup_probe:
+                    print(f"Launcher first frame: {(time.perf_counter() - _STARTED) * 1000:.0f} ms after gui import")
+                    loaded = time.perf_counter()
+                    import plot_examples  # noqa: F401
+                    print(f"Plotting stack on demand: {(time.perf_counter() - loaded) * 1000:.0f} ms")
+                    return None
+                elif PRELOAD_PLOTS and not _plots_preloaded:
+                    _plots_preloaded = True
+                    preload_plots()
+    finally:
+        profiler.stop()
 
 if __name__ == "__main__":
+    # scenes imports 'gui'; let it find this module instead of loading a second copy
+    sys.modules.setdefault('gui', sys.modules[__name__])
     if len(sys.argv) > 1:
         if sys.argv[1] == '--simulation':
             run_simulation()
         elif sys.argv[1] == '--metrics':
             run_metrics()
+        elif sys.argv[1] == '--startup-profile':
+            profile_startup()
+        elif sys.argv[1] == '--startup-child':
+            run_main_gui(startup_probe=True)
     else:
         run_main_gui() 
\ No newline at end of file
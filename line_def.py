@@ -0,0 +1,308 @@
+"""Declarative line definitions compiled to flat routing tables.
+
+A line is described in TOML (or the same structure in JSON):
+
+    name = "Frame cell"
+    transfer_time = 0.4
+
+    [[stations]]
+    name = "Cut"
+    process = "15"             # distribution spec, see distributions.py
+
+    [[stations]]
+    name = "Weld"
+    process = "lognormal:28,6"
+    machines = 2               # parallel machines sharing the station
+    buffer = 1                 # extra places in front of them ("unbounded" or null for no limit)
+
+    [[stations]]
+    name = "Inspect"
+    process = "exp:12"
+    next = {exit = 0.9, Weld = 0.1}   # rework loop; default: the next station, or "exit"
+
+Parts enter at the first station. `next` is a station name, "exit" or a
+table of probabilities. The definition is validated and compiled once into
+flat tables (machine ranges per station, successors with cumulative
+probabilities, machine grid positions) that flow_engine.RoutedEngine runs
+and one_piece_flow draws. Compiled definitions are cached on disk by a
+hash of the file's bytes, so loading one again is a single JSON read:
+
+    python line_def.py line.toml --parts 500
+"""
+import argparse
+import hashlib
+import json
+import os
+
+import flow_engine
+import metrics_pipeline
+from distributions import mean_of, parse_distribution
+
+COMPILED_VERSION = 1
+CACHE_KIND = 'linedef'
+EXIT_NAME = 'exit'
+EXIT = -1  # successor id of finished goods
+
+
+class LineDefinition:
+    """A compiled line: flat tables plus the objects the engine needs"""
+
+    def __init__(self, compiled):
+        self.compiled = compiled
+        for key, value in compiled.items():
+            setattr(self, key, value)
+        self.num_stations = len(self.stations)
+        self.num_machines = len(self.machine_station)
+        self.distributions = [parse_distribution(spec) for spec in self.process]
+        self.process_times = [self.distributions[s] for s in self.machine_station]
+
+    def machine_label(self, machine):
+        station = self.machine_station[machine]
+        name = self.stations[station]
+        return name if self.station_count[station] == 1 else f"{name} {self.machine_row[machine] + 1}"
+
+    def mean_process_time(self, machine):
+        return mean_of(self.process_times[machine])
+
+    def make_engine(self, raw_count=flow_engine.RAW_COUNT, seed=None, **kwargs):
+        """RoutedEngine for this line (transfer_time defaults to the definition's)"""
+        kwargs.setdefault('transfer_time', self.transfer_time)
+        return flow_engine.RoutedEngine(self, raw_count, seed=seed, **kwargs)
+
+
+def _buffer(value, where):
+    if value is None or value == 'unbounded':
+        return None
+    if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+        raise ValueError(f"{where}: buffer must be a non-negative integer or \"unbounded\"")
+    return value
+
+
+def _successors(station, position, names, where):
+    """[(name, probability)] of a station's `next` entry"""
+    nxt = station.get('next')
+    if nxt is None:
+        return [(names[position + 1] if position + 1 < len(names) else EXIT_NAME, 1.0)]
+    if isinstance(nxt, str):
+        return [(nxt, 1.0)]
+    if not isinstance(nxt, dict) or not nxt:
+        raise ValueError(f"{where}: next must be a station name or a table of probabilities")
+    routes = []
+    for name, probability in nxt.items():
+        if isinstance(probability, bool) or not isinstance(probability, (int, float)) or probability <= 0:
+            raise ValueError(f"{where}: probability of {name!r} must be positive")
+        routes.append((name, float(probability)))
+    total = sum(p for _, p in routes)
+    if abs(total - 1.0) > 1e-6:
+        raise ValueError(f"{where}: next probabilities sum to {total:g}, not 1")
+    return routes
+
+
+def compile_definition(data, source='line definition'):
+    """Validate a parsed definition and build its flat tables (a JSON-able dict).
+
+    Raises ValueError naming the first problem found.
+    """
+    stations = data.get('stations')
+    if not isinstance(stations, list) or not stations:
+        raise ValueError(f"{source}: needs at least one [[stations]] entry")
+    names = []
+    for i, station in enumerate(stations):
+        name = station.get('name', f"Station {i + 1}") if isinstance(station, dict) else None
+        if not isinstance(name, str) or not name:
+            raise ValueError(f"{source}: station {i + 1} needs a name")
+        if name in names or name == EXIT_NAME:
+            raise ValueError(f"{source}: station name {name!r} is used twice or reserved")
+        names.append(name)
+    index = {name: i for i, name in enumerate(names)}
+    index[EXIT_NAME] = EXIT
+
+    compiled = {
+        'version': COMPILED_VERSION,
+        'name': str(data.get('name', source)),
+        'transfer_time': float(data.get('transfer_time', 0.0)),
+        'stations': names,
+        'process': [],
+        'buffer_sizes': [],
+        'station_first': [],
+        'station_count': [],
+        'machine_station': [],
+        'machine_column': [],
+        'machine_row': [],
+        'succ_start': [0],
+        'succ_station': [],
+        'succ_cum': [],
+        'rework': [],  # [from, to, probability] of routes back to the same or an earlier station
+    }
+    for position, station in enumerate(stations):
+        where = f"{source}: station {names[position]!r}"
+        process = str(station.get('process', flow_engine.PROCESS_TIME))
+        try:
+            parse_distribution(process)
+        except (ValueError, OSError) as exc:
+            raise ValueError(f"{where}: bad process time {process!r} ({exc})") from None
+        count = station.get('machines', 1)
+        if isinstance(count, bool) or not isinstance(count, int) or count < 1:
+            raise ValueError(f"{where}: machines must be a positive integer")
+        compiled['process'].append(process)
+        compiled['buffer_sizes'].append(_buffer(station.get('buffer', 0), where))
+        compiled['station_first'].append(len(compiled['machine_station']))
+        compiled['station_count'].append(count)
+        for row in range(count):
+            compiled['machine_station'].append(position)
+            compiled['machine_column'].append(position)
+            compiled['machine_row'].append(row)
+
+        cumulative = 0.0
+        for name, probability in _successors(station, position, names, where):
+            if name not in index:
+                raise ValueError(f"{where}: next station {name!r} does not exist")
+            cumulative += probability
+            compiled['succ_station'].append(index[name])
+            compiled['succ_cum'].append(cumulative)
+            if index[name] != EXIT and index[name] <= position:
+                compiled['rework'].append([position, index[name], probability])
+        compiled['succ_cum'][-1] = 1.0
+        compiled['succ_start'].append(len(compiled['succ_station']))
+
+    _check_reachable(compiled, source)
+    return compiled
+
+
+def _check_reachable(compiled, source):
+    """Every station must be reachable from the first one and lead to finished goods"""
+    names = compiled['stations']
+    start, succ = compiled['succ_start'], compiled['succ_station']
+    forward = [succ[start[s]:start[s + 1]] for s in range(len(names))]
+
+    seen, stack = {0}, [0]
+    while stack:
+        for nxt in forward[stack.pop()]:
+            if nxt != EXIT and nxt not in seen:
+                seen.add(nxt)
+                stack.append(nxt)
+    unreachable = [names[s] for s in range(len(names)) if s not in seen]
+    if unreachable:
+        raise ValueError(f"{source}: no route reaches {', '.join(unreachable)}")
+
+    exits = {s for s in range(len(names)) if EXIT in forward[s]}
+    stack = list(exits)
+    while stack:
+        target = stack.pop()
+        for s in range(len(names)):
+            if s not in exits and target in forward[s]:
+                exits.add(s)
+                stack.append(s)
+    trapped = [names[s] for s in range(len(names)) if s not in exits]
+    if trapped:
+        raise ValueError(f"{source}: parts at {', '.join(trapped)} can never reach finished goods")
+
+
+def _parse(data, path):
+    if os.path.splitext(path)[1].lower() == '.toml':
+        try:
+            import tomllib
+        except ImportError:  # Python < 3.11
+            raise ValueError(f"{path}: reading TOML needs Python 3.11 or newer; use JSON") from None
+        try:
+            return tomllib.loads(data.decode('utf-8'))
+        except (tomllib.TOMLDecodeError, UnicodeDecodeError) as exc:
+            raise ValueError(f"{path}: {exc}") from None
+    try:
+        return json.loads(data)
+    except ValueError as exc:
+        raise ValueError(f"{path}: {exc}") from None
+
+
+def load(path, use_cache=True):
+    """Compiled LineDefinition of the file at `path` (cached by content hash)"""
+    with open(path, 'rb') as f:
+        data = f.read()
+    key = hashlib.sha256(data + f"{COMPILED_VERSION}{os.path.splitext(path)[1]}".encode()).hexdigest()[:20]
+    compiled = metrics_pipeline.load_cached(key, CACHE_KIND) if use_cache else None
+    if compiled is None:
+        compiled = compile_definition(_parse(data, path), os.path.basename(path))
+        metrics_pipeline.store_cached(key, compiled, CACHE_KIND)
+    return LineDefinition(compiled)
+
+
+def serial_line(num_machines=flow_engine.NUM_MACHINES, process_time=flow_engine.PROCESS_TIME, transfer_time=0.0):
+    """The built-in one-piece-flow line: single machines in a row"""
+    stations = [{'name': f"Machine {i + 1}", 'process': str(process_time)} for i in range(num_machines)]
+    return LineDefinition(compile_definition({'name': "One-piece flow", 'transfer_time': transfer_time,
+                                              'stations': stations}))
+
+
+def check_wip(line, parts=500, seed=0, tolerance=1e-9):
+    """Check the WIP of LineMetrics and StreamingStats against a direct count.
+
+    Runs the line once with both listeners and integrates parts released
+    (first transfer into a machine of the first station) minus parts exited.
+    Returns (expected, line_metrics, streaming); raises ValueError when a
+    listener disagrees.
+    """
+    from line_metrics import LineMetrics, StreamingStats
+
+    first = line.station_first[0]
+    entry = range(first, first + line.station_count[0])
+    released, exited = {}, {}
+
+    def log(now, kind, part, machine):
+        if kind == flow_engine.TRANSFER and machine in entry:
+            released.setdefault(part, now)
+        elif kind == flow_engine.EXIT:
+            exited[part] = now
+
+    engine = line.make_engine(parts, seed=seed)
+    metrics, stats = LineMetrics(engine.num_machines), StreamingStats(engine.num_machines)
+    for listener in (log, metrics, stats):
+        engine.add_listener(listener)
+    engine.run()
+    now = engine.now
+    area = sum(exited.get(part, now) - start for part, start in released.items())
+    expected = area / now if now > 0 else 0.0
+    found = metrics.summary(now)['wip'], stats.snapshot(now)['wip']
+    for name, wip in zip(("LineMetrics", "StreamingStats"), found):
+        if abs(wip - expected) > tolerance * max(1.0, expected):
+            raise ValueError(f"{name} WIP {wip:.6f} != released minus exited {expected:.6f}")
+    return (expected,) + found
+
+
+def main():
+    from line_metrics import LineMetrics
+
+    parser = argparse.ArgumentParser(description="Validate a line definition and run it headless")
+    parser.add_argument('path', help="line definition (.toml or .json)")
+    parser.add_argument('--parts', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--no-cache', action='store_true')
+    parser.add_argument('--check', action='store_true', help="check the WIP metrics against a direct count")
+    args = parser.parse_args()
+
+    try:
+        line = load(args.path, use_cache=not args.no_cache)
+    except ValueError as exc:
+        raise SystemExit(str(exc))
+    print(f"{line.name}: {line.num_stations} stations, {line.num_machines} machines, "
+          f"{len(line.rework)} rework routes")
+    engine = line.make_engine(args.parts, seed=args.seed)
+    metrics = LineMetrics(engine.num_machines)
+    engine.add_listener(metrics)
+    engine.run()
+    summary = metrics.summary()
+    print(f"{summary['completed']} parts in {summary['elapsed']:.0f} s: {summary['throughput_per_hour']:.1f}/h, "
+          f"WIP {summary['wip']:.2f}, lead time {summary['lead_time']:.1f} s")
+    for station, name in enumerate(line.stations):
+        first = line.station_first[station]
+        busy = summary['station_utilization'][first:first + line.station_count[station]]
+        print(f"  {name:16s} utilization {sum(busy) / len(busy) * 100:5.1f}%")
+    if args.check:
+        try:
+            expected, _, _ = check_wip(line, args.parts, args.seed)
+        except ValueError as exc:
+            raise SystemExit(f"WIP check failed: {exc}")
+        print(f"WIP check passed: {expected:.4f} parts released and not exited")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+"""Closed-form estimates of line performance, without simulating.
+
+Takes the same line description as flow_engine.FlowEngine (number of
+machines, process times as numbers or distributions, buffer sizes,
+transfer time and batch, arrival interval, part count) and returns the
+metrics replications.run_replication reports, in microseconds:
+
+- Saturated lines (all parts waiting, or arrivals faster than the line):
+  throughput from a two-station blocking model (exponential closed form,
+  interpolated towards the deterministic line by the squared coefficient
+  of variation) applied station by station from the end of the line; WIP
+  from the same model's buffer occupancy; lead time from the exit schedule.
+  WIP counts parts from their release onto the line (as LineMetrics does),
+  so the first station's buffer and the transfer into it are included.
+- Open lines: Kingman's GI/G/1 waiting time at every station with the
+  departure-variability linking equation, and Little's law for WIP.
+
+Every estimate lists the reasons it may be off in 'warnings', and
+cross_check() compares it with seeded replications:
+
+    python line_estimate.py --machines 3 --process lognormal:15,6 --buffer 1 --parts 300 --check
+"""
+import argparse
+import math
+
+import flow_engine
+from distributions import mean_of, parse_distribution, variance_of
+
+CHECKED_METRICS = ('throughput_per_hour', 'wip', 'lead_time', 'utilization')
+HIGH_SCV = 1.5
+NEAR_CAPACITY = 0.9
+SHORT_RUN_PARTS_PER_STATION = 10
+LONG_LINE = 5
+
+
+def _scv(mean, variance):
+    return variance / mean ** 2 if mean > 0 else 0.0
+
+
+def pair_throughput(up_rate, down_rate, capacity, scv):
+    """Throughput of two stations, the downstream one holding `capacity` parts
+    (None = unlimited) and the upstream one blocking when it is full.
+
+    Exact for exponential times (scv 1) and deterministic ones (scv 0).
+    In between, the loss is interpolated by scv ** (1 - 1/(2 capacity)):
+    small buffers lose throughput to even mild variability (weight close to
+    the coefficient of variation), large ones only to strong variability.
+    """
+    bound = min(up_rate, down_rate)
+    if capacity is None:
+        return bound
+    states = capacity + 1
+    rho = up_rate / down_rate
+    if abs(rho - 1) < 1e-9:
+        exponential = down_rate * states / (states + 1)
+    elif rho < 1:
+        exponential = down_rate * (rho - rho ** (states + 1)) / (1 - rho ** (states + 1))
+    else:
+        r = 1 / rho
+        exponential = down_rate * (1 - r ** states) / (1 - r ** (states + 1))
+    weight = scv ** (1 - 1 / (2 * capacity)) if scv > 0 and capacity > 0 else scv
+    return max(bound - weight * (bound - exponential), exponential / 2)
+
+
+def pair_occupancy(up_rate, down_rate, capacity, scv, busy):
+    """Mean parts held by the downstream station of a pair (machine and buffer).
+
+    `busy` is its deterministic occupancy when it is not the slower side.
+    """
+    rho = up_rate / down_rate
+    if capacity is None:
+        # Unlimited buffers only stay bounded below saturation (M/M/1 mean)
+        return busy if rho >= 1 else busy + scv * max(0.0, rho / (1 - rho) - busy)
+    deterministic = capacity if rho > 1 + 1e-9 else busy
+    states = capacity + 1
+    weights = [rho ** n for n in range(states + 1)]
+    exponential = sum(min(n, capacity) * w for n, w in enumerate(weights)) / sum(weights)
+    return min(capacity, max(busy, deterministic + scv * (exponential - deterministic)))
+
+
+def _stations(config):
+    """Per-station mean, scv, buffer and effective slot time of a FlowEngine config"""
+    machines = config.get('num_machines', flow_engine.NUM_MACHINES)
+    times = flow_engine.per_station(config.get('process_time', flow_engine.PROCESS_TIME), machines)
+    buffers = flow_engine.per_station(config.get('buffer_sizes', 0), machines)
+    transfer = config.get('transfer_time', 0.0)
+    stations = []
+    for process, buffer in zip(times, buffers):
+        mean = mean_of(process)
+        # Without a buffer the station's slot is reserved while a part travels to it
+        slot = mean + transfer if buffer == 0 else mean
+        stations.append({
+            'mean': mean,
+            'scv': _scv(slot, variance_of(process)),
+            'buffer': buffer,
+            'slot': slot,
+        })
+    return stations
+
+
+def saturated_throughput(stations, batch=1):
+    """Parts per second of the line when it never waits for material.
+
+    Works back from the last station: each station's effective rate is the
+    pair throughput of its own rate against the (already blocked) rate of
+    the station after it.
+    """
+    rates = [1 / (batch * s['slot']) for s in stations]
+    scvs = [s['scv'] / batch for s in stations]
+    effective = [0.0] * len(stations)
+    effective[-1] = rates[-1]
+    for j in range(len(stations) - 2, -1, -1):
+        buffer = stations[j + 1]['buffer']
+        capacity = None if buffer is None else (buffer + 1) // batch
+        effective[j] = pair_throughput(rates[j], effective[j + 1], capacity, (scvs[j] + scvs[j + 1]) / 2)
+    return effective[0] * batch, [rate * batch for rate in effective]
+
+
+def saturated_wip(stations, throughput, effective, transfer, batch=1):
+    """Mean parts between release and exit of a saturated line"""
+    first = stations[0]
+    if first['buffer'] is None:
+        return math.inf  # every waiting part is released at once
+    # Raw material is always waiting, so the first station is kept full
+    wip = first['buffer'] + 1.0
+    upstream = 1 / first['slot']
+    for j in range(1, len(stations)):
+        station = stations[j]
+        buffer = station['buffer']
+        capacity = None if buffer is None else buffer + 1
+        scv = (stations[j - 1]['scv'] + station['scv']) / 2 / batch
+        wip += pair_occupancy(upstream, effective[j], capacity, scv, throughput * station['slot'])
+        upstream = min(upstream, 1 / station['slot'])
+    return wip
+
+
+def _open_line(stations, arrival_rate, arrival_scv):
+    """Per-station (wait, flow) times of an open line (Kingman + linking equations)"""
+    waits = []
+    scv_in = arrival_scv
+    for station in stations:
+        u = arrival_rate * station['slot']
+        scv_service = station['scv']
+        waits.append((scv_in + scv_service) / 2 * u / (1 - u) * station['slot'])
+        scv_in = u * u * scv_service + (1 - u * u) * scv_in
+    return waits
+
+
+def _released_wait(buffer, wait, arrival_rate):
+    """Part of the first station's queueing time spent released (in its buffer) rather than raw"""
+    if buffer is None:
+        return wait
+    queue = arrival_rate * wait
+    return wait * min(1.0, buffer / queue) if queue > 0 else 0.0
+
+
+def _release_delay_sum(parts, gap, start_gap, buffer, transfer):
+    """Sum over parts of release time minus arrival time on a saturated line
+    whose first machine is never blocked (it starts a part every start_gap)"""
+    if buffer is None:
+        return 0.0
+    # Part k > buffer is released when part k - buffer - 1 leaves the first
+    # station, i.e. at offset + (k - buffer) * start_gap
+    offset = transfer if buffer > 0 else 0.0
+    c, d = offset - buffer * start_gap, start_gap - gap
+    first = buffer + 1
+    if d > 0:
+        first = max(first, math.floor(-c / d) + 1)
+    elif c <= 0:
+        return 0.0
+    count = parts - first
+    if count <= 0:
+        return 0.0
+    return count * c + d * (first + parts - 1) * count / 2
+
+
+def estimate(config):
+    """Approximate replication metrics of a FlowEngine config, plus 'warnings'"""
+    stations = _stations(config)
+    machines = len(stations)
+    transfer = config.get('transfer_time', 0.0)
+    batch = config.get('transfer_batch', 1)
+    parts = config.get('raw_count', flow_engine.RAW_COUNT)
+    interval = config.get('arrival_interval', 0.0)
+    gap = mean_of(interval)
+    arrival_rate = 1 / gap if gap > 0 else math.inf
+
+    capacity, effective = saturated_throughput(stations, batch)
+    bottleneck = max(range(machines), key=lambda j: stations[j]['slot'])
+    warnings = []
+    if max(s['scv'] for s in stations) > HIGH_SCV:
+        warnings.append("process times more variable than exponential (scv > 1.5)")
+    if batch > 1 and any(s['buffer'] is not None for s in stations[1:]):
+        warnings.append("transfer batches with finite buffers are approximated")
+    if (machines >= LONG_LINE and any(s['buffer'] is not None and s['buffer'] <= 1 for s in stations[1:])
+            and sum(s['scv'] for s in stations) / machines >= 0.1):
+        warnings.append("long line with small buffers: throughput tends to be underestimated")
+    if parts is not None and parts < SHORT_RUN_PARTS_PER_STATION * machines * batch:
+        warnings.append("short run: start-up and drain dominate")
+    if parts is None and arrival_rate >= capacity:
+        warnings.append("endless run with arrivals at or above capacity: the raw queue grows without bound")
+
+    process_total = sum(s['mean'] for s in stations)
+    # The last station sends every part out as soon as it is done, batch or not
+    last = stations[-1]['mean']
+    first_exit = batch * (process_total - last) + last + machines * transfer
+    saturated = arrival_rate >= capacity
+    if not saturated:
+        if batch > 1:
+            warnings.append("open arrivals with transfer batches are approximated per part")
+        load = arrival_rate / capacity
+        if load > NEAR_CAPACITY:
+            warnings.append(f"arrivals at {load:.0%} of capacity: queueing estimates are sensitive")
+        if (load > 0.65 and any(s['scv'] > 0 for s in stations)
+                and any(s['buffer'] is not None and s['buffer'] < 2 for s in stations[1:])):
+            warnings.append("heavy load with small buffers: blocking is not in the open-line model")
+
+    if parts is None:
+        # Steady state of an endless run
+        throughput = min(arrival_rate, capacity)
+        if saturated:
+            wip = saturated_wip(stations, throughput, effective, transfer, batch)
+            lead = math.inf
+        else:
+            waits = _open_line(stations, arrival_rate, _scv(gap, variance_of(interval)))
+            line_time = first_exit + sum(waits[1:]) + _released_wait(stations[0]['buffer'], waits[0], arrival_rate)
+            wip = arrival_rate * line_time
+            lead = first_exit + sum(waits)
+        cycle = 1 / throughput
+        utilization = sum(throughput * s['mean'] for s in stations) / machines
+    elif saturated:
+        batches = math.ceil(parts / batch)
+        spacing = batch / capacity
+        full, rest = divmod(parts, batch)
+        batch_index_sum = batch * full * (full - 1) / 2 + rest * full
+        within_batch_sum = full * batch * (batch - 1) / 2 + rest * (rest - 1) / 2
+        last_batch_tail = last * ((rest or batch) - 1)
+        arrival_sum = gap * parts * (parts - 1) / 2
+        elapsed = max(first_exit + (batches - 1) * spacing + last_batch_tail, gap * (parts - 1) + first_exit)
+        exit_sum = parts * first_exit + spacing * batch_index_sum + last * within_batch_sum
+        lead = max(first_exit, (exit_sum - arrival_sum) / parts)
+        if stations[0]['buffer'] is None:
+            # Every part is released as it arrives
+            area = exit_sum - arrival_sum
+        elif stations[min(1, machines - 1)]['buffer'] is None or machines == 1:
+            # The first machine is never blocked: parts start as fast as it works
+            start_gap = max(gap, stations[0]['slot'])
+            delay = _release_delay_sum(parts, gap, start_gap, stations[0]['buffer'], transfer)
+            area = exit_sum - arrival_sum - delay
+        else:
+            line_time = saturated_wip(stations, capacity, effective, transfer, batch) / capacity
+            area = parts * max(line_time, first_exit)
+        throughput = parts / elapsed
+        wip = area / elapsed
+        cycle = elapsed / parts
+        utilization = parts * process_total / (elapsed * machines)
+    else:
+        waits = _open_line(stations, arrival_rate, _scv(gap, variance_of(interval)))
+        lead = first_exit + sum(waits)
+        line_time = lead - waits[0] + _released_wait(stations[0]['buffer'], waits[0], arrival_rate)
+        elapsed = gap * (parts - 1) + lead
+        throughput = parts / elapsed
+        wip = parts * line_time / elapsed
+        cycle = elapsed / parts
+        utilization = parts * process_total / (elapsed * machines)
+
+    return {
+        'throughput_per_hour': throughput * 3600,
+        'wip': wip,
+        'lead_time': lead,
+        'cycle_time': cycle,
+        'utilization': utilization,
+        'capacity_per_hour': capacity * 3600,
+        'bottleneck': bottleneck,
+        'saturated': saturated,
+        'warnings': warnings,
+    }
+
+
+def cross_check(config, replications=10, seed=0, tolerance=0.10, workers=1):
+    """Compare estimate() with seeded replications of the same config.
+
+    A metric agrees when the estimate is within `tolerance` (relative) of
+    the simulated mean or inside its confidence interval. The estimate is
+    trusted when every checked metric agrees and there are no warnings.
+    """
+    from replications import run_replications
+    estimated = estimate(config)
+    intervals = run_replications(config, replications, seed, workers)['intervals']
+    errors = {}
+    agree = True
+    for metric in CHECKED_METRICS:
+        simulated = intervals[metric]['mean']
+        error = (estimated[metric] - simulated) / simulated if simulated else 0.0
+        errors[metric] = error
+        if abs(estimated[metric] - simulated) > max(tolerance * abs(simulated), intervals[metric]['half_width']):
+            agree = False
+    return {
+        'estimate': estimated,
+        'simulated': {metric: intervals[metric]['mean'] for metric in CHECKED_METRICS},
+        'errors': errors,
+        'trusted': agree and not estimated['warnings'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analytic throughput, WIP and lead-time estimates")
+    parser.add_argument('--machines', type=int, default=flow_engine.NUM_MACHINES)
+    parser.add_argument('--parts', type=int, default=100, help="0 for an endless run (steady state)")
+    parser.add_argument('--process', nargs='+', default=[str(flow_engine.PROCESS_TIME)],
+                        help="one spec for all stations or one per station, e.g. exp:15 lognormal:15,4")
+    parser.add_argument('--buffer', type=int, default=0, help="-1 for unlimited")
+    parser.add_argument('--transfer', type=float, default=0.0)
+    parser.add_argument('--batch', type=int, default=1)
+    parser.add_argument('--arrival', default='0', help="arrival interval spec (0 = all parts waiting)")
+    parser.add_argument('--check', action='store_true', help="cross-check against replications")
+    parser.add_argument('--reps', type=int, default=10)
+    args = parser.parse_args()
+
+    dists = [parse_distribution(spec) for spec in args.process]
+    arrival = parse_distribution(args.arrival)
+    config = {
+        'num_machines': args.machines,
+        'process_time': dists if len(dists) > 1 else dists[0],
+        'raw_count': args.parts or None,
+        'buffer_sizes': None if args.buffer < 0 else args.buffer,
+        'transfer_time': args.transfer,
+        'transfer_batch': args.batch,
+        'arrival_interval': arrival if arrival.variance else arrival.mean,
+    }
+    result = estimate(config)
+    print(f"Capacity {result['capacity_per_hour']:.1f}/h, bottleneck station {result['bottleneck'] + 1}"
+          + (" (saturated)" if result['saturated'] else ""))
+    for metric in ('throughput_per_hour', 'wip', 'lead_time', 'cycle_time', 'utilization'):
+        print(f"  {metric:20s} {result[metric]:10.3f}")
+    for warning in result['warnings']:
+        print(f"  warning: {warning}")
+
+    if args.check:
+        if config['raw_count'] is None:
+            parser.error("--check needs a finite --parts")
+        check = cross_check(config, args.reps)
+        print(f"Against {args.reps} replications:")
+        for metric in CHECKED_METRICS:
+            print(f"  {metric:20s} {check['simulated'][metric]:10.3f}  ({check['errors'][metric]:+.1%})")
+        print("  trusted" if check['trusted'] else "  NOT trusted")
+
+
+if __name__ == "__main__":
+    main()
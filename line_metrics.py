@@ -0,0 +1,248 @@
+"""Line metrics derived from the flow engine's event stream.
+
+`LineMetrics` is an engine listener. It keeps running sums only, so it can
+sit on any run without holding per-part history beyond the parts that are
+currently on the line.
+
+`StreamingStats` is the live variant used by the view: constant-memory
+Welford moments and P-square quantile sketches on top of the same sums, so
+an arbitrarily long run can be watched and exported without keeping
+per-part history.
+"""
+import json
+
+import flow_engine
+
+
+class LineMetrics:
+    def __init__(self, num_machines):
+        self.num_machines = num_machines
+        self.arrived_at = {}      # parts in the system -> arrival time
+        self.on_line = set()      # parts released onto the line and not yet exited
+        self.busy_since = [None] * num_machines
+        self.busy_time = [0.0] * num_machines
+        self.completed = 0
+        self.lead_sum = 0.0
+        self.wip_area = 0.0       # integral of parts on the line over time
+        self.last_time = 0.0
+        self.last_exit = 0.0
+
+    def __call__(self, now, kind, part, station):
+        self.wip_area += len(self.on_line) * (now - self.last_time)
+        self.last_time = now
+        if kind == flow_engine.ARRIVAL:
+            self.arrived_at[part] = now
+            return
+        if kind != flow_engine.EXIT:
+            # A part is on the line from its release (its first transfer) until
+            # it exits, however often it is reworked; `station` is a machine index
+            self.on_line.add(part)
+        if kind == flow_engine.START:
+            self.busy_since[station] = now
+        elif kind == flow_engine.FINISH:
+            self.busy_time[station] += now - self.busy_since[station]
+            self.busy_since[station] = None
+        elif kind == flow_engine.EXIT:
+            self.completed += 1
+            self.lead_sum += now - self.arrived_at.pop(part)
+            self.on_line.discard(part)
+            self.last_exit = now
+
+    def summary(self, now=None):
+        """Cycle time, WIP, lead time, throughput and utilization up to `now`"""
+        if now is None:
+            now = self.last_exit
+        wip_area = self.wip_area + len(self.on_line) * max(0.0, now - self.last_time)
+        busy = [
+            total + (now - since if since is not None else 0.0)
+            for total, since in zip(self.busy_time, self.busy_since)
+        ]
+        utilization = [b / now if now > 0 else 0.0 for b in busy]
+        done = self.completed
+        return {
+            'completed': done,
+            'elapsed': now,
+            'cycle_time': now / done if done else 0.0,
+            'throughput_per_hour': done / now * 3600 if now > 0 else 0.0,
+            'lead_time': self.lead_sum / done if done else 0.0,
+            'wip': wip_area / now if now > 0 else 0.0,
+            'utilization': sum(utilization) / self.num_machines,
+            'station_utilization': utilization,
+        }
+
+
+class Welford:
+    """Running mean and variance in one pass (Welford's algorithm)"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, x):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (x - self.mean)
+
+    @property
+    def variance(self):
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self):
+        return self.variance ** 0.5
+
+
+class P2Quantile:
+    """Streaming estimate of one quantile with five markers (Jain & Chlamtac P-square)"""
+
+    def __init__(self, p):
+        self.p = p
+        self.count = 0
+        self._heights = []
+        self._positions = [1, 2, 3, 4, 5]
+        self._desired = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        self._steps = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, x):
+        self.count += 1
+        h = self._heights
+        if len(h) < 5:
+            h.append(x)
+            h.sort()
+            return
+        n = self._positions
+        if x < h[0]:
+            h[0] = x
+            k = 0
+        elif x >= h[4]:
+            h[4] = x
+            k = 3
+        else:
+            k = next(i for i in range(1, 5) if x < h[i]) - 1
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self._desired[i] += self._steps[i]
+        for i in range(1, 4):
+            d = self._desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                height = h[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (h[i + 1] - h[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - d) * (h[i] - h[i - 1]) / (n[i] - n[i - 1]))
+                if not h[i - 1] < height < h[i + 1]:
+                    height = h[i] + d * (h[i + d] - h[i]) / (n[i + d] - n[i])
+                h[i] = height
+                n[i] += d
+
+    def value(self):
+        h = self._heights
+        if not h:
+            return 0.0
+        if self.count <= 5:
+            return h[min(len(h) - 1, int(round(self.p * (len(h) - 1))))]
+        return h[2]
+
+
+class StreamingStats:
+    """Live line statistics in constant memory.
+
+    Time-weighted WIP (parts released but not exited), lead time mean and
+    variance (arrival to exit), per-station utilization and cycle time
+    percentiles (time between consecutive exits). Only the arrival times of
+    parts currently in the system are held.
+    """
+
+    QUANTILES = (0.5, 0.9, 0.99)
+
+    def __init__(self, num_machines, start=0.0):
+        self.num_machines = num_machines
+        self.reset(start)
+
+    def reset(self, start=0.0):
+        """Start measuring afresh at `start` (e.g. after seeking a replay)"""
+        self.start = start
+        self.last_time = start
+        self.arrived_at = {}
+        self.on_line = set()  # released and not yet exited (first sighting after a reset)
+        self.wip_area = 0.0
+        self.busy_since = [None] * self.num_machines
+        self.busy_time = [0.0] * self.num_machines
+        self.completed = 0
+        self.last_exit = None
+        self.lead_time = Welford()
+        self.cycle_time = Welford()
+        self.cycle_quantiles = [P2Quantile(p) for p in self.QUANTILES]
+
+    def __call__(self, now, kind, part, station):
+        # Events replayed from before a reset count as happening at the reset
+        now = max(now, self.last_time)
+        self.wip_area += len(self.on_line) * (now - self.last_time)
+        self.last_time = now
+        if kind == flow_engine.ARRIVAL:
+            self.arrived_at[part] = now
+            return
+        if kind != flow_engine.EXIT:
+            self.on_line.add(part)
+        if kind == flow_engine.START:
+            self.busy_since[station] = now
+        elif kind == flow_engine.FINISH:
+            if self.busy_since[station] is not None:
+                self.busy_time[station] += now - self.busy_since[station]
+            self.busy_since[station] = None
+        elif kind == flow_engine.EXIT:
+            self.completed += 1
+            self.on_line.discard(part)
+            arrived = self.arrived_at.pop(part, None)
+            if arrived is not None:
+                self.lead_time.add(now - arrived)
+            if self.last_exit is not None:
+                gap = now - self.last_exit
+                self.cycle_time.add(gap)
+                for sketch in self.cycle_quantiles:
+                    sketch.add(gap)
+            self.last_exit = now
+
+    def snapshot(self, now=None):
+        """Current statistics as a plain dict (JSON friendly)"""
+        now = self.last_time if now is None else max(now, self.last_time)
+        elapsed = now - self.start
+        wip_area = self.wip_area + len(self.on_line) * (now - self.last_time)
+        busy = [
+            total + (now - since if since is not None else 0.0)
+            for total, since in zip(self.busy_time, self.busy_since)
+        ]
+        utilization = [b / elapsed if elapsed > 0 else 0.0 for b in busy]
+        return {
+            'elapsed': elapsed,
+            'completed': self.completed,
+            'wip': wip_area / elapsed if elapsed > 0 else 0.0,
+            'wip_now': len(self.on_line),
+            'lead_time_mean': self.lead_time.mean,
+            'lead_time_std': self.lead_time.std,
+            'cycle_time_mean': self.cycle_time.mean,
+            'cycle_time_std': self.cycle_time.std,
+            'cycle_time_quantiles': {f"p{int(p * 100)}": sketch.value()
+                                     for p, sketch in zip(self.QUANTILES, self.cycle_quantiles)},
+            'utilization': sum(utilization) / self.num_machines,
+            'station_utilization': utilization,
+        }
+
+    def overlay_lines(self, now=None):
+        """Short text lines for the live overlay in the simulation view"""
+        snap = self.snapshot(now)
+        quantiles = snap['cycle_time_quantiles']
+        stations = " ".join(f"{u * 100:.0f}%" for u in snap['station_utilization'])
+        return [
+            f"WIP {snap['wip']:.2f} (now {snap['wip_now']})  Done {snap['completed']}",
+            f"Lead {snap['lead_time_mean']:.1f} +/- {snap['lead_time_std']:.1f} s",
+            f"Cycle p50/p90/p99 {quantiles['p50']:.1f}/{quantiles['p90']:.1f}/{quantiles['p99']:.1f} s",
+            f"Util {stations}",
+        ]
+
+    def export(self, path, now=None):
+        """Write the snapshot to `path` as JSON"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(now), f, indent=2)
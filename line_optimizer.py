@@ -0,0 +1,234 @@
+"""Parameter sweeps and line balancing over the headless engine.
+
+A candidate line is a plain JSON-able dict:
+
+    {'process_times': [14.0, 16.0, 15.0], 'buffer': 1, 'cv': 0.3,
+     'parts': 300, 'transfer_time': 0.0, 'reps': 3, 'seed': 0}
+
+`cv` > 0 makes every station lognormal with that coefficient of variation.
+Candidates are scored by throughput, subject to an optional cap on the
+time-weighted WIP. Every evaluated candidate is stored in the
+metrics_pipeline disk cache under its config hash, so repeated or
+overlapping sweeps never re-simulate a point:
+
+    python line_optimizer.py --work 45 --stations 2 3 4 --buffers 0 1 --cv 0.5 --wip-cap 4
+"""
+import argparse
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+import line_estimate
+import metrics_pipeline
+from distributions import LogNormal
+from replications import METRICS, replication_seeds, run_replication
+
+CACHE_KIND = 'sweep'
+MIN_STATION_TIME = 0.5  # seconds; rebalancing never empties a station
+
+DEFAULT_CANDIDATE = {
+    'buffer': 0,
+    'cv': 0.0,
+    'parts': 300,
+    'transfer_time': 0.0,
+    'reps': 3,
+    'seed': 0,
+}
+
+
+def make_candidate(process_times, **settings):
+    """Candidate dict with defaults filled in and times rounded for stable hashing"""
+    candidate = dict(DEFAULT_CANDIDATE, **settings)
+    candidate['process_times'] = [round(float(t), 6) for t in process_times]
+    return candidate
+
+
+def engine_config(candidate):
+    """FlowEngine keyword arguments for a candidate"""
+    cv = candidate['cv']
+    times = [LogNormal(t, t * cv) if cv > 0 else t for t in candidate['process_times']]
+    return {
+        'num_machines': len(times),
+        'process_time': times,
+        'raw_count': candidate['parts'],
+        'buffer_sizes': candidate['buffer'],
+        'transfer_time': candidate['transfer_time'],
+    }
+
+
+def evaluate(candidate):
+    """Mean of each replication metric over the candidate's seeded replications"""
+    config = engine_config(candidate)
+    runs = [run_replication(config, seed) for seed in replication_seeds(candidate['seed'], candidate['reps'])]
+    return {metric: sum(run[metric] for run in runs) / len(runs) for metric in METRICS}
+
+
+def evaluate_many(candidates, workers=None, counts=None):
+    """Results for every candidate, simulating only the ones not in the cache.
+
+    `counts`, if given, is a dict whose 'cached' and 'simulated' entries are
+    incremented.
+    """
+    keys = [metrics_pipeline.config_key(c) for c in candidates]
+    results = {}
+    pending = {}
+    for key, candidate in zip(keys, candidates):
+        if key in results or key in pending:
+            continue
+        cached = metrics_pipeline.load_cached(key, CACHE_KIND)
+        if cached is not None:
+            results[key] = cached
+        else:
+            pending[key] = candidate
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(pending) <= 1:
+        computed = [evaluate(c) for c in pending.values()]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            computed = list(pool.map(evaluate, pending.values()))
+    for key, result in zip(pending, computed):
+        metrics_pipeline.store_cached(key, result, CACHE_KIND)
+        results[key] = result
+
+    if counts is not None:
+        counts['cached'] = counts.get('cached', 0) + len(set(keys)) - len(pending)
+        counts['simulated'] = counts.get('simulated', 0) + len(pending)
+    return [results[key] for key in keys]
+
+
+def score(result, wip_cap=None):
+    """Throughput per hour; lines over the WIP cap rank below every feasible one"""
+    if wip_cap is not None and result['wip'] > wip_cap:
+        return -(result['wip'] - wip_cap)
+    return result['throughput_per_hour']
+
+
+def even_split(work_content, stations):
+    return [work_content / stations] * stations
+
+
+def grid_candidates(work_content, stations, buffers, **settings):
+    """Evenly balanced lines for every station count and buffer size"""
+    return [make_candidate(even_split(work_content, n), buffer=b, **settings)
+            for n in stations for b in buffers]
+
+
+def random_candidates(work_content, stations, buffers, count, draw_seed=0, **settings):
+    """Random station counts, buffers and splits of the work content"""
+    rng = random.Random(draw_seed)
+    candidates = []
+    for _ in range(count):
+        n = rng.choice(stations)
+        weights = [rng.gammavariate(2.0, 1.0) for _ in range(n)]
+        spare = work_content - MIN_STATION_TIME * n
+        times = [MIN_STATION_TIME + spare * w / sum(weights) for w in weights]
+        candidates.append(make_candidate([round(t, 1) for t in times], buffer=rng.choice(buffers), **settings))
+    return candidates
+
+
+def screen(candidates, keep, wip_cap=None):
+    """The `keep` candidates with the best analytic score (line_estimate, no simulation)"""
+    ranked = sorted(candidates, key=lambda c: score(line_estimate.estimate(engine_config(c)), wip_cap), reverse=True)
+    return ranked[:keep]
+
+
+def _neighbours(candidate, step):
+    """Candidates with `step` seconds of work moved from one station to another"""
+    times = candidate['process_times']
+    settings = {k: v for k, v in candidate.items() if k != 'process_times'}
+    result = []
+    for i in range(len(times)):
+        if times[i] - step < MIN_STATION_TIME:
+            continue
+        for j in range(len(times)):
+            if i != j:
+                moved = list(times)
+                moved[i] -= step
+                moved[j] += step
+                result.append(make_candidate(moved, **settings))
+    return result
+
+
+def rebalance(candidate, wip_cap=None, step=2.0, min_step=0.25, workers=None, counts=None):
+    """Hill-climb per-station times at constant work content.
+
+    Each round evaluates every one-step move of work between two stations
+    (in parallel) and takes the best improving one; when none improves the
+    step is halved, down to `min_step`. Returns (candidate, result).
+    """
+    best = candidate
+    best_result = evaluate_many([candidate], workers, counts)[0]
+    while step >= min_step:
+        neighbours = _neighbours(best, step)
+        results = evaluate_many(neighbours, workers, counts) if neighbours else []
+        scored = [(score(r, wip_cap), c, r) for c, r in zip(neighbours, results)]
+        top = max(scored, key=lambda item: item[0], default=None)
+        if top is not None and top[0] > score(best_result, wip_cap):
+            _, best, best_result = top
+        else:
+            step /= 2
+    return best, best_result
+
+
+def sweep(work_content, stations, buffers, wip_cap=None, random_count=0,
+          workers=None, counts=None, keep=None, **settings):
+    """Grid (plus optional random) sweep; [(score, candidate, result)] best first.
+
+    With `keep`, only the analytically best `keep` candidates are simulated.
+    """
+    candidates = grid_candidates(work_content, stations, buffers, **settings)
+    if random_count:
+        candidates += random_candidates(work_content, stations, buffers, random_count,
+                                        settings.get('seed', 0), **settings)
+    if keep:
+        candidates = screen(candidates, keep, wip_cap)
+    results = evaluate_many(candidates, workers, counts)
+    ranked = [(score(r, wip_cap), c, r) for c, r in zip(candidates, results)]
+    ranked.sort(key=lambda item: item[0], reverse=True)
+    return ranked
+
+
+def _describe(candidate, result):
+    times = "/".join(f"{t:g}" for t in candidate['process_times'])
+    return (f"{len(candidate['process_times'])} stations  times {times:24s} buffer {candidate['buffer']}  "
+            f"{result['throughput_per_hour']:8.1f}/h  WIP {result['wip']:5.2f}  "
+            f"lead {result['lead_time']:8.1f} s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep and balance one-piece-flow line configurations")
+    parser.add_argument('--work', type=float, default=45.0, help="total process seconds per part")
+    parser.add_argument('--stations', type=int, nargs='+', default=[2, 3, 4])
+    parser.add_argument('--buffers', type=int, nargs='+', default=[0, 1, 2])
+    parser.add_argument('--wip-cap', type=float, default=None)
+    parser.add_argument('--cv', type=float, default=0.0, help="coefficient of variation of process times")
+    parser.add_argument('--parts', type=int, default=DEFAULT_CANDIDATE['parts'])
+    parser.add_argument('--reps', type=int, default=DEFAULT_CANDIDATE['reps'])
+    parser.add_argument('--random', type=int, default=0, help="extra random candidates")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--screen', type=int, default=None,
+                        help="simulate only the N candidates the analytic estimate ranks best")
+    parser.add_argument('--no-rebalance', action='store_true')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--top', type=int, default=5)
+    args = parser.parse_args()
+
+    settings = {'cv': args.cv, 'parts': args.parts, 'reps': args.reps, 'seed': args.seed}
+    counts = {}
+    ranked = sweep(args.work, args.stations, args.buffers, args.wip_cap, args.random,
+                   args.workers, counts, args.screen, **settings)
+    print(f"Best of {len(ranked)} candidates" + (f" (WIP cap {args.wip_cap:g})" if args.wip_cap is not None else ""))
+    for value, candidate, result in ranked[:args.top]:
+        flag = "" if value >= 0 else "  over WIP cap"
+        print("  " + _describe(candidate, result) + flag)
+
+    if not args.no_rebalance and ranked:
+        candidate, result = rebalance(ranked[0][1], args.wip_cap, workers=args.workers, counts=counts)
+        print("Rebalanced:")
+        print("  " + _describe(candidate, result))
+    print(f"{counts.get('simulated', 0)} configurations simulated, {counts.get('cached', 0)} from cache")
+
+
+if __name__ == "__main__":
+    main()
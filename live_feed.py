@@ -0,0 +1,433 @@
+"""Live machine events for the one-piece-flow view (andon board mode).
+
+Stations report newline-delimited JSON events over a local TCP or UNIX
+socket, one object per line:
+
+    {"kind": "start", "part": "A-1017", "station": 0, "t": 1718000000.5, "duration": 15}
+
+`kind` is arrival, transfer, start, finish or exit (or the flow_engine
+numbers), `part` any JSON id, `station` 0-based; `t` (seconds, any epoch)
+and `duration` (expected process time, for the countdown) are optional.
+Producers that only send start and finish events work too: missing
+arrivals, transfers and exits are filled in.
+
+An asyncio server on its own thread parses and normalizes the events,
+keeps full-rate statistics and coalesces each burst into the few events
+that still matter to the view (a part's transfers, which move it between
+machine slots, its current start/finish and its exit; parts that came and
+went in one burst become counts). The render loop takes at most one pending batch per frame from a
+deque, which both threads use without locks. While a batch is waiting the
+server keeps coalescing into the next one, so a flood of events never
+grows the frame's work beyond the parts in flight, and a slow frame never
+blocks the socket.
+
+    python live_feed.py produce 127.0.0.1:7070 --speed 10   # stand-in line
+    python one_piece_flow.py --live 127.0.0.1:7070
+"""
+import argparse
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import deque
+
+import flow_engine
+from line_metrics import StreamingStats
+
+KIND_BY_NAME = {name: kind for kind, name in flow_engine.EVENT_NAMES.items()}
+READ_CHUNK = 1 << 16
+FLUSH_INTERVAL = 1 / 120  # seconds between hand-off attempts when the socket is quiet
+OVERLAY_INTERVAL = 0.25  # seconds between statistics overlay refreshes
+
+
+def parse_address(text):
+    """('unix', path) for "unix:/path", else ('tcp', host, port) for "host:port" or "tcp:host:port" """
+    if text.startswith('unix:'):
+        return ('unix', text[len('unix:'):])
+    if text.startswith('tcp:'):
+        text = text[len('tcp:'):]
+    host, _, port = text.rpartition(':')
+    return ('tcp', host or '127.0.0.1', int(port))
+
+
+class Coalescer:
+    """Normalizes one event stream and folds it into view batches.
+
+    Runs on the ingestion thread only. External part ids are mapped to the
+    consecutive integers the view's MaterialStore uses.
+    """
+
+    def __init__(self, num_machines):
+        self.num_machines = num_machines
+        self.ids = {}  # external id -> part number, for parts not yet exited
+        self.station = {}  # part number -> station it was last sent to
+        self.on_view = set()  # parts the view holds a row for (published transfers)
+        self.arrived = 0
+        self.released = 0
+        self.finished = 0
+        self.rejected = 0
+        self._kept = {}  # part -> [(seq, time, kind, station)] still relevant to the view
+        self._passed = 0
+        self._seq = 0
+
+    def normalize(self, now, kind, external, station, emit):
+        """Turn one reported event into engine events passed to emit(now, kind, part, station)"""
+        part = self.ids.get(external)
+        if kind == flow_engine.EXIT:
+            if part is not None:
+                self._exit(now, part, emit)
+                del self.ids[external]
+            return  # exits of unknown (or already finished) parts are ignored
+        if part is None:
+            part = self.ids[external] = self.arrived
+            self.arrived += 1
+            emit(now, flow_engine.ARRIVAL, part, -1)
+        if kind == flow_engine.ARRIVAL:
+            return
+        if not 0 <= station < self.num_machines:
+            self.rejected += 1
+            return
+        if kind == flow_engine.TRANSFER or self.station.get(part) != station:
+            self._transfer(now, part, station, emit)
+            if kind == flow_engine.TRANSFER:
+                return
+        emit(now, kind, part, station)
+        if kind == flow_engine.FINISH and station == self.num_machines - 1:
+            # The last station finishing a part is its exit
+            self._exit(now, part, emit)
+            del self.ids[external]
+
+    def _transfer(self, now, part, station, emit):
+        self.station[part] = station
+        self.released = max(self.released, part + 1)
+        emit(now, flow_engine.TRANSFER, part, station)
+
+    def _exit(self, now, part, emit):
+        emit(now, flow_engine.EXIT, part, self.station.pop(part, self.num_machines - 1))
+        self.finished += 1
+
+    def add(self, now, kind, part, station):
+        """Fold one engine event into the pending batch"""
+        self._seq += 1
+        event = (self._seq, now, kind, station)
+        kept = self._kept.get(part)
+        if kind == flow_engine.ARRIVAL:
+            return  # the view follows arrivals through the counts
+        if kind == flow_engine.TRANSFER:
+            # Every transfer frees the slot the part came from, so none is folded
+            # (at most one per station); the starts and finishes before it are
+            self._kept[part] = [e for e in kept or () if e[2] == flow_engine.TRANSFER] + [event]
+        elif kind == flow_engine.EXIT:
+            if part in self.on_view:
+                self._kept[part] = [e for e in kept or () if e[2] == flow_engine.TRANSFER] + [event]
+            else:
+                # Came and went within one batch: the view only needs the counts
+                self._kept.pop(part, None)
+                self._passed += 1
+        elif kept is None:
+            self._kept[part] = [event]
+        elif kind == flow_engine.FINISH and kept[-1][2] == flow_engine.START and kept[-1][3] == station:
+            kept[-1] = event  # a start and finish in one batch leave the machine idle
+        else:
+            kept.append(event)
+
+    def take(self):
+        """Pending view events in arrival order; clears the batch"""
+        events = sorted(e + (part,) for part, kept in self._kept.items() for e in kept)
+        for part, kept in self._kept.items():
+            if kept[-1][2] == flow_engine.EXIT:
+                self.on_view.discard(part)
+            elif kept[0][2] == flow_engine.TRANSFER:
+                self.on_view.add(part)
+        self._kept = {}
+        self._passed = 0
+        return [(now, kind, part, station) for _, now, kind, station, part in events]
+
+    def pending(self):
+        return bool(self._kept) or self._passed > 0
+
+
+class LiveFeed:
+    """Socket event source with the listener API of FlowEngine and TraceReplay.
+
+    The view drives it like an engine: run() applies the latest batch and
+    remaining(station) gives the machine countdowns. overlay_lines() and
+    export() stand in for a StreamingStats, which the feed keeps at full
+    event rate on its own thread.
+    """
+
+    def __init__(self, address, num_machines=flow_engine.NUM_MACHINES,
+                 process_time=flow_engine.PROCESS_TIME, transfer_time=0.0):
+        self.address = parse_address(address) if isinstance(address, str) else address
+        self.num_machines = num_machines
+        self.process_time = process_time
+        self.transfer_time = transfer_time  # only used to animate moves
+        self.raw_count = 0
+        self.released = 0
+        self.finished = 0
+        self.now = 0.0
+        self._busy_until = [None] * num_machines
+        self._listeners = []
+        self._lines = []
+        # Ingestion-thread state
+        self._coalescer = Coalescer(num_machines)
+        self._stats = StreamingStats(num_machines)
+        self._offset = None
+        self._last_time = 0.0
+        self._durations = {}  # (part, station) -> reported duration of a start
+        self._next_overlay = 0.0
+        # Lock-free hand-off: the server appends a batch only when the
+        # view has taken the previous one (taken == sent); deque append and
+        # popleft are atomic
+        self._outbox = deque()
+        self._sent = 0
+        self._taken = 0
+        self._started = time.perf_counter()
+        self._thread = None
+        self._loop = None
+        self._stopping = None
+        self._ready = threading.Event()
+        self._error = None
+        self._clients = {}  # handler task -> writer
+
+    # --- engine API (render thread) ---
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self._listeners.remove(listener)
+
+    def clock(self):
+        """Seconds since the feed started; event times are on this clock"""
+        return time.perf_counter() - self._started
+
+    def peek(self):
+        return None
+
+    def is_done(self):
+        return False
+
+    def remaining(self, station):
+        finish_at = self._busy_until[station]
+        return 0 if finish_at is None else max(0.0, finish_at - self.now)
+
+    def run(self, until=None):
+        """Apply the pending batch, if any, to the listeners"""
+        try:
+            seq, events, durations, counts, lines = self._outbox.popleft()
+        except IndexError:
+            seq = None
+        if seq is not None:
+            for now, kind, part, station in events:
+                self.now = max(self.now, now)
+                if kind == flow_engine.START:
+                    self._busy_until[station] = now + durations.get((part, station), self.process_time)
+                else:
+                    # Transfers in, finishes and exits all leave the machine without a countdown
+                    self._busy_until[station] = None
+                for listener in self._listeners:
+                    listener(now, kind, part, station)
+            self.raw_count, self.released, self.finished = counts
+            if lines is not None:
+                self._lines = lines
+            self._taken = seq
+        if until is not None and until > self.now:
+            self.now = until
+        return self.now
+
+    def overlay_lines(self, now=None):
+        return self._lines
+
+    def export(self, path, now=None):
+        """Write the full-rate statistics (call after stop())"""
+        self._stats.export(path, now)
+
+    # --- server thread ---
+
+    def start(self):
+        """Start listening; raises if the socket cannot be opened"""
+        self._thread = threading.Thread(target=lambda: asyncio.run(self._serve()), name='live-feed', daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            raise self._error
+        return self
+
+    def stop(self):
+        if self._thread is not None and self._thread.is_alive():
+            self._loop.call_soon_threadsafe(self._stopping.set)
+            self._thread.join(timeout=2)
+
+    async def _serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        try:
+            if self.address[0] == 'unix':
+                path = self.address[1]
+                if os.path.exists(path):
+                    os.remove(path)
+                server = await asyncio.start_unix_server(self._client, path)
+            else:
+                server = await asyncio.start_server(self._client, self.address[1], self.address[2])
+        except OSError as exc:
+            self._error = exc
+            self._ready.set()
+            return
+        self._ready.set()
+        flusher = asyncio.create_task(self._flush_loop())
+        async with server:
+            await self._stopping.wait()
+            # Closing the connections ends each handler's read loop normally
+            for writer in self._clients.values():
+                writer.close()
+            await asyncio.gather(*self._clients, return_exceptions=True)
+        flusher.cancel()
+        if self.address[0] == 'unix' and os.path.exists(self.address[1]):
+            os.remove(self.address[1])
+
+    async def _client(self, reader, writer):
+        task = asyncio.current_task()
+        self._clients[task] = writer
+        rest = b''
+        try:
+            while True:
+                chunk = await reader.read(READ_CHUNK)
+                if not chunk:
+                    break
+                lines = (rest + chunk).split(b'\n')
+                rest = lines.pop()
+                for line in lines:
+                    if line.strip():
+                        self._ingest(line)
+                self._publish()
+        except ConnectionError:
+            pass
+        finally:
+            del self._clients[task]
+            writer.close()
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            self._publish()
+
+    def _ingest(self, line):
+        coalescer = self._coalescer
+        try:
+            data = json.loads(line)
+            kind = data['kind']
+            kind = KIND_BY_NAME[kind.lower()] if isinstance(kind, str) else int(kind)
+            external = data['part']
+            station = int(data.get('station', -1))
+            reported = data.get('t')
+        except (ValueError, KeyError, TypeError, AttributeError):
+            coalescer.rejected += 1
+            return
+        now = self.clock()
+        if reported is not None:
+            # Producer clocks are mapped onto the feed clock at the first timed event
+            if self._offset is None:
+                self._offset = now - float(reported)
+            now = float(reported) + self._offset
+        now = self._last_time = max(now, self._last_time)
+
+        def emit(at, kind, part, station):
+            self._stats(at, kind, part, station)
+            coalescer.add(at, kind, part, station)
+            if kind == flow_engine.START and 'duration' in data:
+                self._durations[(part, station)] = float(data['duration'])
+        coalescer.normalize(now, kind, external, station, emit)
+
+    def _publish(self):
+        if self._taken != self._sent:
+            return  # the view has not taken the last batch; keep coalescing
+        coalescer = self._coalescer
+        now = self.clock()
+        lines = None
+        if now >= self._next_overlay:
+            lines = self._stats.overlay_lines(max(now, self._last_time))
+            if coalescer.rejected:
+                lines = lines + [f"Feed: {coalescer.rejected} events rejected"]
+            self._next_overlay = now + OVERLAY_INTERVAL
+        if not coalescer.pending() and lines is None:
+            return
+        events = coalescer.take()
+        # Starts folded away by the coalescer no longer need their durations
+        durations = {(part, station): self._durations[part, station] for _, kind, part, station in events
+                     if kind == flow_engine.START and (part, station) in self._durations}
+        self._durations.clear()
+        self._sent += 1
+        counts = (coalescer.arrived, coalescer.released, coalescer.finished)
+        self._outbox.append((self._sent, events, durations, counts, lines))
+
+
+async def produce(address, machines=flow_engine.NUM_MACHINES, process_time=flow_engine.PROCESS_TIME,
+                  parts=None, speed=1.0, flood=False, seed=0):
+    """Stand-in line: run the engine and stream its events to `address` as NDJSON.
+
+    Events are sent in (scaled) real time with producer timestamps, or with
+    `flood` as fast as the socket takes them, without timestamps.
+    """
+    kind, *where = parse_address(address) if isinstance(address, str) else address
+    if kind == 'unix':
+        reader, writer = await asyncio.open_unix_connection(where[0])
+    else:
+        reader, writer = await asyncio.open_connection(*where)
+    from distributions import LogNormal
+    engine = flow_engine.FlowEngine(machines, LogNormal(process_time, process_time * 0.2), parts,
+                                    arrival_interval=process_time, seed=seed)
+    pending = []
+
+    def on_event(now, kind, part, station):
+        event = {'kind': flow_engine.EVENT_NAMES[kind], 'part': f"P{part}", 'station': station}
+        if not flood:
+            event['t'] = now / speed
+        if kind == flow_engine.START:
+            event['duration'] = engine.remaining(station) / speed
+        pending.append(json.dumps(event))
+    engine.add_listener(on_event)
+
+    sent = 0
+    started = time.perf_counter()
+    try:
+        while not engine.is_done():
+            if flood:
+                engine.run(until=engine.now + 100 * process_time)
+            else:
+                await asyncio.sleep(1 / 60)
+                engine.run(until=(time.perf_counter() - started) * speed)
+            if pending:
+                writer.write(('\n'.join(pending) + '\n').encode('utf-8'))
+                sent += len(pending)
+                pending.clear()
+                await writer.drain()
+    finally:
+        writer.close()
+        await writer.wait_closed()  # flush what drain() left buffered
+    return sent
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in producer of live machine events")
+    commands = parser.add_subparsers(dest='command', required=True)
+    prod = commands.add_parser('produce', help="stream a simulated line to a running view")
+    prod.add_argument('address', help="host:port or unix:/path of the view's --live socket")
+    prod.add_argument('--machines', type=int, default=flow_engine.NUM_MACHINES)
+    prod.add_argument('--process', type=float, default=flow_engine.PROCESS_TIME)
+    prod.add_argument('--parts', type=int, default=None, help="stop after this many parts (default: endless)")
+    prod.add_argument('--speed', type=float, default=1.0, help="simulated seconds per real second")
+    prod.add_argument('--flood', action='store_true', help="send as fast as possible, untimed")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    try:
+        sent = asyncio.run(produce(args.address, args.machines, args.process, args.parts, args.speed, args.flood))
+    except KeyboardInterrupt:
+        return
+    print(f"{sent} events in {time.perf_counter() - started:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
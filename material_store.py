@@ -0,0 +1,122 @@
+"""Compact part store for the one-piece-flow view.
+
+Only parts on the line (released but not finished) get a row. Rows live in
+array-backed columns and are recycled through a free list, so memory is
+bounded by the parts in flight, not by raw_count. Raw parts are the range
+next_raw..raw_count and finished parts are a counter, since the engine
+releases raw material in order and nothing is drawn per finished part
+beyond the visible stack.
+
+Per-stage index dicts (part -> row) and the `moving` dict make "next raw
+part", "parts at stage s" and "parts in transit" O(1) lookups instead of
+scans over every part.
+"""
+from array import array
+
+RAW = 0
+
+
+class MaterialStore:
+    def __init__(self, raw_count, num_stages, home):
+        self.raw_count = raw_count
+        self.num_stages = num_stages
+        self.home = home  # home(part) -> (x, y) of the part in the raw area
+        self.reset()
+
+    def reset(self):
+        self.next_raw = 0
+        self.finished_count = 0
+        self.rows = {}  # part -> row
+        self.at_stage = [{} for _ in range(self.num_stages + 1)]
+        self.moving = {}
+        self._free = []
+        self.part = array('l')
+        self.stage = array('h')
+        self.x = array('d')
+        self.y = array('d')
+        self.from_x = array('d')
+        self.from_y = array('d')
+        self.to_x = array('d')
+        self.to_y = array('d')
+        self.move_start = array('d')
+        self.move_duration = array('d')
+        self.timer = array('d')
+        self.processing = array('b')
+
+    def _new_row(self):
+        if self._free:
+            return self._free.pop()
+        for column in (self.part, self.stage, self.processing):
+            column.append(0)
+        for column in (self.x, self.y, self.from_x, self.from_y, self.to_x, self.to_y,
+                       self.move_start, self.move_duration, self.timer):
+            column.append(0.0)
+        return len(self.part) - 1
+
+    def raw_parts(self):
+        """Parts still waiting in the raw area, in release order"""
+        return range(self.next_raw, self.raw_count)
+
+    def release(self, part):
+        """Take a part out of the raw area and give it a row at its home position"""
+        row = self._new_row()
+        x, y = self.home(part)
+        self.part[row] = part
+        self.stage[row] = RAW
+        self.x[row] = self.from_x[row] = self.to_x[row] = x
+        self.y[row] = self.from_y[row] = self.to_y[row] = y
+        self.move_duration[row] = 0.0
+        self.timer[row] = 0.0
+        self.processing[row] = False
+        self.rows[part] = row
+        self.next_raw = max(self.next_raw, part + 1)
+        return row
+
+    def row_of(self, part):
+        row = self.rows.get(part)
+        return self.release(part) if row is None else row
+
+    def set_stage(self, part, stage):
+        row = self.row_of(part)
+        self.at_stage[self.stage[row]].pop(part, None)
+        self.stage[row] = stage
+        self.at_stage[stage][part] = row
+        return row
+
+    def move_to(self, part, x, y, start=0.0, duration=0.0):
+        """Travel to (x, y) over `duration` simulated seconds from `start`"""
+        row = self.row_of(part)
+        self.from_x[row], self.from_y[row] = self.to_x[row], self.to_y[row]
+        self.to_x[row], self.to_y[row] = x, y
+        self.move_start[row] = start
+        self.move_duration[row] = duration
+        self.processing[row] = False
+        self.moving[part] = row
+
+    def finish(self, part):
+        """Count the part as finished and recycle its row"""
+        row = self.rows.pop(part)
+        self.at_stage[self.stage[row]].pop(part, None)
+        self.moving.pop(part, None)
+        self._free.append(row)
+        self.finished_count += 1
+
+    def update(self, sim_time):
+        """Place every moving part where it is at `sim_time`"""
+        arrived = []
+        for part, row in self.moving.items():
+            progress = 1.0
+            duration = self.move_duration[row]
+            if duration > 0:
+                progress = min(1.0, max(0.0, (sim_time - self.move_start[row]) / duration))
+            self.x[row] = self.from_x[row] + (self.to_x[row] - self.from_x[row]) * progress
+            self.y[row] = self.from_y[row] + (self.to_y[row] - self.from_y[row]) * progress
+            if progress >= 1.0:
+                arrived.append(part)
+        for part in arrived:
+            del self.moving[part]
+
+    def on_line(self):
+        """(part, row) for every part between the raw area and finished goods"""
+        for stage in range(1, self.num_stages + 1):
+            yield from self.at_stage[stage].items()
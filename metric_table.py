@@ -0,0 +1,79 @@
+"""Pre-rendered metric table shared by the metric viewers.
+
+The title and every cell are rendered once to a Surface; the viewers just
+blit it. The Surface is only re-rendered when the rows, size or fonts
+change.
+"""
+import pygame
+
+BG_COLOR = (245, 245, 245)
+HEADER_COLOR = (200, 220, 255)
+LINE_COLOR = (180, 180, 180)
+TEXT_COLOR = (30, 30, 30)
+TITLE_COLOR = (40, 60, 120)
+
+START_Y = 40
+ROW_HEIGHT = 22
+
+_cached_key = None
+_cached_surface = None
+
+
+def column_widths(rows, cell_font):
+    return [max(cell_font.size(str(cell))[0] for cell in col) + 12 for col in zip(*rows)]
+
+
+def render_table(rows, size, title, title_font, cell_font):
+    """Draw the title and table onto a new Surface of `size`"""
+    width, height = size
+    surface = pygame.Surface(size)
+    if pygame.display.get_surface() is not None:
+        surface = surface.convert()
+    surface.fill(BG_COLOR)
+    title_text = title_font.render(title, True, TITLE_COLOR)
+    surface.blit(title_text, (width//2 - title_text.get_width()//2, 8))
+
+    col_widths = column_widths(rows, cell_font)
+    table_width = sum(col_widths)
+    start_x = (width - table_width) // 2 if table_width < width else 5
+    y = START_Y
+    for i, row in enumerate(rows):
+        x = start_x
+        for j, cell in enumerate(row):
+            rect = pygame.Rect(x, y, col_widths[j], ROW_HEIGHT)
+            color = HEADER_COLOR if i == 0 else BG_COLOR
+            pygame.draw.rect(surface, color, rect)
+            pygame.draw.rect(surface, LINE_COLOR, rect, 1)
+            text = cell_font.render(str(cell), True, TEXT_COLOR)
+            surface.blit(text, (x + 4, y + (ROW_HEIGHT - text.get_height()) // 2))
+            x += col_widths[j]
+        y += ROW_HEIGHT
+    return surface
+
+
+def table_surface(rows, size, title, title_font, cell_font):
+    """Cached render_table(); re-renders only when the data or layout changes"""
+    global _cached_key, _cached_surface
+    key = (tuple(tuple(str(cell) for cell in row) for row in rows), tuple(size), title, title_font, cell_font)
+    if key != _cached_key:
+        _cached_surface = render_table(rows, size, title, title_font, cell_font)
+        _cached_key = key
+    return _cached_surface
+
+
+def show(screen, rows, title, title_font, cell_font):
+    """Display the table and sleep on the event queue until it is closed (or Esc)"""
+    def redraw():
+        screen.blit(table_surface(rows, screen.get_size(), title, title_font, cell_font), (0, 0))
+        pygame.display.flip()
+
+    redraw()
+    while True:
+        # Block instead of spinning: an idle table window costs no CPU
+        event = pygame.event.wait()
+        if event.type == pygame.QUIT:
+            return
+        if event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+            return
+        if event.type in (pygame.WINDOWEXPOSED, pygame.VIDEOEXPOSE, pygame.WINDOWSIZECHANGED):
+            redraw()
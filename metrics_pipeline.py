@@ -0,0 +1,166 @@
+"""Process improvement metrics computed from simulation runs.
+
+Runs a batch-and-queue baseline ("Before") and the one-piece-flow line
+("After") through flow_engine, derives cycle time, WIP, lead time and
+utilization from the event stream, and caches the result on disk keyed by
+a hash of the config. Both metric viewers and the plots read from here, so
+showing the table is a cache lookup rather than a rerun.
+"""
+import hashlib
+import json
+import os
+
+import flow_engine
+from line_metrics import LineMetrics
+
+CACHE_VERSION = 2  # 2: WIP counts parts from release, not first start
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.sim_cache')
+
+DEFAULT_CONFIG = {
+    'num_machines': flow_engine.NUM_MACHINES,
+    'process_time': flow_engine.PROCESS_TIME,
+    'raw_count': flow_engine.RAW_COUNT,
+    'transfer_time': 0.0,
+    'seed': 0,
+}
+
+# Not produced by the simulator; reference values from the improvement sheet
+REFERENCE_METRICS = {
+    'Quality Rate': (92, 98),
+    'Space Utilization': (1000, 400),
+}
+
+# Metric name, unit, table label, whether higher is better
+METRIC_LAYOUT = [
+    ('Cycle Time', 'seconds', 'Cycle Time (sec)', False),
+    ('WIP Inventory', 'units', 'WIP Inventory', False),
+    ('Lead Time', 'minutes', 'Lead Time (min)', False),
+    ('Quality Rate', '%', 'Quality Rate', True),
+    ('Machine Utilization', '%', 'Machine Utilization', True),
+    ('Space Utilization', 'sq ft', 'Space Utilization', False),
+]
+
+_memo = {}
+
+
+def config_key(config):
+    """Stable hash of a config (distributions hash by their repr)"""
+    payload = json.dumps({'version': CACHE_VERSION, 'config': config}, sort_keys=True, default=repr)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:20]
+
+
+def scenario_configs(config):
+    """Engine settings for the batch-and-queue baseline and the one-piece-flow line"""
+    before = dict(config, buffer_sizes=None, transfer_batch=config['raw_count'])
+    after = dict(config, buffer_sizes=0, transfer_batch=1)
+    return {'before': before, 'after': after}
+
+
+def simulate(config):
+    """Run one scenario to completion and summarize its event stream"""
+    engine = flow_engine.FlowEngine(**config)
+    metrics = LineMetrics(engine.num_machines)
+    engine.add_listener(metrics)
+    engine.run()
+    return metrics.summary()
+
+
+def cache_path(key, kind='metrics'):
+    return os.path.join(CACHE_DIR, f"{kind}-{key}.json")
+
+
+def load_cached(key, kind='metrics'):
+    """Cached JSON result for `key`, or None"""
+    try:
+        with open(cache_path(key, kind), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def store_cached(key, result, kind='metrics'):
+    """Write a JSON result atomically (parallel writers never see half a file)"""
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp_path = f"{cache_path(key, kind)}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(result, f)
+        os.replace(tmp_path, cache_path(key, kind))
+    except OSError:
+        pass  # a read-only install just recomputes next time
+
+
+def compute_metrics(config=None, use_cache=True):
+    """{'before': summary, 'after': summary} for the given line config"""
+    config = dict(DEFAULT_CONFIG, **(config or {}))
+    key = config_key(config)
+    if use_cache:
+        if key in _memo:
+            return _memo[key]
+        cached = load_cached(key)
+        if cached is not None:
+            _memo[key] = cached
+            return cached
+    result = {name: simulate(cfg) for name, cfg in scenario_configs(config).items()}
+    store_cached(key, result)
+    _memo[key] = result
+    return result
+
+
+def metric_records(config=None):
+    """One dict per metric with Metric, Before, After and Unit (plot friendly)"""
+    result = compute_metrics(config)
+    before, after = result['before'], result['after']
+    simulated = {
+        'Cycle Time': (before['cycle_time'], after['cycle_time']),
+        'WIP Inventory': (before['wip'], after['wip']),
+        'Lead Time': (before['lead_time'] / 60, after['lead_time'] / 60),
+        'Machine Utilization': (before['utilization'] * 100, after['utilization'] * 100),
+    }
+    records = []
+    for name, unit, label, higher_is_better in METRIC_LAYOUT:
+        b, a = simulated.get(name) or REFERENCE_METRICS[name]
+        records.append({
+            'Metric': name,
+            'Before': round(b, 2),
+            'After': round(a, 2),
+            'Unit': unit,
+            'Label': label,
+            'HigherIsBetter': higher_is_better,
+        })
+    return records
+
+
+def _format_value(value, unit):
+    text = f"{value:g}"
+    if unit == '%':
+        return text + '%'
+    if unit == 'sq ft':
+        return text + ' sq ft'
+    return text
+
+
+def improvement(before, after, higher_is_better):
+    if before == 0:
+        return 0.0
+    change = (after - before) if higher_is_better else (before - after)
+    return change / before * 100
+
+
+def metric_rows(config=None):
+    """Table rows (header first) in the layout of the process metric viewer"""
+    rows = [["Metric", "Before", "After", "Improvement"]]
+    for rec in metric_records(config):
+        gain = improvement(rec['Before'], rec['After'], rec['HigherIsBetter'])
+        rows.append([
+            rec['Label'],
+            _format_value(rec['Before'], rec['Unit']),
+            _format_value(rec['After'], rec['Unit']),
+            f"{gain:.1f}%",
+        ])
+    return rows
+
+
+if __name__ == "__main__":
+    for row in metric_rows():
+        print(" | ".join(row))
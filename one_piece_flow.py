@@ -1,18 +1,33 @@
 import pygame
 import time
 import math
-import subprocess
 import sys
 import os
-import csv
+
+import event_trace
+import flow_engine
+import line_def
+import live_feed
+import render_cache
+import scenes
+import snapshot
+from frame_profiler import FrameProfiler
+from line_metrics import StreamingStats
+from material_store import MaterialStore
+from sim_clock import SimClock, TIME_SCALES
 
 pygame.init()
-screen = pygame.display.set_mode((700, 320))
-pygame.display.set_caption("One-Piece-Flow Simulation")
+SCREEN_SIZE = (700, 320)
+CAPTION = "One-Piece-Flow Simulation"
+screen = None  # the shared display, set when the simulation scene starts
+
+def load_fonts():
+    global font, small_font, label_font
+    font = render_cache.font('Segoe UI', 18, bold=True)
+    small_font = render_cache.font('Segoe UI', 14)
+    label_font = render_cache.font('Segoe UI', 13, italic=True)
 
-font = pygame.font.SysFont('Segoe UI', 18, bold=True)
-small_font = pygame.font.SysFont('Segoe UI', 14)
-label_font = pygame.font.SysFont('Segoe UI', 13, italic=True)
+load_fonts()
 
 BG_TOP = (60, 80, 160)
 BG_BOTTOM = (30, 30, 60)
@@ -24,6 +39,7 @@ FG_COLOR = (180, 220, 120)
 FG_SHADOW = (120, 160, 80)
 TEXT_COLOR = (255, 255, 255)
 BORDER_COLOR = (40, 40, 60)
+REWORK_COLOR = (240, 160, 100)
 
 raw_width = 28
 raw_height = 18
@@ -32,86 +48,81 @@ raw_count = 5
 machine_width = 52
 machine_height = 38
 machine_gap = 38
-num_machines = 3
+machine_row_gap = 40  # between parallel machines, room for the label and timer
 fg_width = 28
 fg_height = 18
 fg_gap = 6
 
-# Calculate total width for centering
 raw_area_width = 50
 fg_area_width = 50
-machines_width = num_machines * machine_width + (num_machines - 1) * machine_gap
 # Reduce the gap between last machine and finished goods
 side_gap = 30
-layout_width = raw_area_width + side_gap + machines_width + side_gap + fg_area_width
-start_x = (screen.get_width() - layout_width) // 2
-
-raw_start_x = start_x
 raw_start_y = 60
-
-machines = []
-for i in range(num_machines):
-    x = raw_start_x + raw_area_width + side_gap + i * (machine_width + machine_gap)
-    y = 110
-    machines.append((x, y))
-
-fg_start_x = machines[-1][0] + machine_width + side_gap
 fg_start_y = 60
 
 PROCESS_TIME = 15  # seconds
-
-class Material:
-    def __init__(self, idx):
-        self.idx = idx
-        self.stage = 0  # 0=raw, 1=machine1, 2=machine2, 3=machine3, 4=finished
-        self.x = raw_start_x
-        self.y = raw_start_y + idx * (raw_height + raw_gap)
-        self.target_pos = (self.x, self.y)
-        self.processing = False
-        self.timer = 0
-
-    def move_to(self, x, y):
-        self.target_pos = (x, y)
-        self.processing = False
-
-    def update(self):
-        dx = self.target_pos[0] - self.x
-        dy = self.target_pos[1] - self.y
-        speed = 4
-        if abs(dx) > speed:
-            self.x += speed if dx > 0 else -speed
-        else:
-            self.x = self.target_pos[0]
-        if abs(dy) > speed:
-            self.y += speed if dy > 0 else -speed
-        else:
-            self.y = self.target_pos[1]
-        if (self.x, self.y) == self.target_pos and self.processing:
-            self.timer -= 1/60
-            if self.timer < 0:
-                self.processing = False
-                return True
-        return False
-
-materials = [Material(i) for i in range(raw_count)]
-
-machine_slots = [
-    {'mat': None, 'timer': 0, 'busy': False},
-    {'mat': None, 'timer': 0, 'busy': False},
-    {'mat': None, 'timer': 0, 'busy': False},
-]
-finished_materials = []
-
-clock = pygame.time.Clock()
-running = True
+TRANSFER_TIME = 0.4  # seconds a part spends moving between stations
+
+# Push only changed screen areas instead of full frames (remote desktop / kiosk)
+DIRTY_RECTS = os.environ.get('SIM_DIRTY_RECTS') == '1'
+
+# Event trace to replay instead of running the engine (see event_trace.py)
+REPLAY_PATH = None
+# Where to write the live statistics when the simulation scene ends
+STATS_PATH = None
+# Socket address of real machine events to show instead of the engine (see live_feed.py)
+LIVE_ADDRESS = None
+
+def raw_home(part):
+    """Raw area position of a waiting part; the stack starts at the next part to release
+    (parts past the visible stack start at its last row)"""
+    row = min(max(0, part - materials.next_raw), STACK_ROWS - 1)
+    return raw_start_x, raw_start_y + row * (raw_height + raw_gap)
+
+def apply_layout(line):
+    """Lay out the floor for a compiled line definition (line_def.py).
+
+    Stations are columns between the raw and finished goods areas, and
+    parallel machines of a station are stacked in its column. The engine
+    runs the same definition, so machine indices match its events.
+    """
+    global LINE, SCREEN_SIZE, STACK_ROWS, num_machines, machines, machine_slots, materials
+    global raw_start_x, fg_start_x
+    LINE = line
+    num_machines = line.num_machines
+    machines_width = line.num_stations * machine_width + (line.num_stations - 1) * machine_gap
+    layout_width = raw_area_width + side_gap + machines_width + side_gap + fg_area_width
+    row_pitch = machine_height + machine_row_gap
+    half_rows = (max(line.station_count) - 1) / 2 * row_pitch
+    center_y = max(110, raw_start_y - 10 + half_rows)
+    SCREEN_SIZE = (max(700, layout_width + 40), max(320, int(center_y + half_rows) + machine_height + 80))
+    # Rows of the raw and finished goods stacks that fit in the window
+    STACK_ROWS = (SCREEN_SIZE[1] - raw_start_y - raw_height) // (raw_height + raw_gap) + 1
+
+    raw_start_x = (SCREEN_SIZE[0] - layout_width) // 2
+    machines = []
+    for column, row, station in zip(line.machine_column, line.machine_row, line.machine_station):
+        x = raw_start_x + raw_area_width + side_gap + column * (machine_width + machine_gap)
+        y = center_y + (row - (line.station_count[station] - 1) / 2) * row_pitch
+        machines.append((x, round(y)))
+    fg_start_x = raw_start_x + raw_area_width + side_gap + machines_width + side_gap
+
+    # Only parts on the line are stored; raw parts are a range and finished parts a count
+    materials = MaterialStore(raw_count, num_machines, raw_home)
+    machine_slots = [{'mat': None, 'timer': 0, 'busy': False} for _ in range(num_machines)]
+
+# The built-in line; --line FILE replaces it with a definition file
+apply_layout(line_def.serial_line(3, PROCESS_TIME, TRANSFER_TIME))
+
+def reset_line():
+    """Put every part back in the raw area so the scene can run again"""
+    materials.raw_count = raw_count
+    materials.reset()
+    for slot in machine_slots:
+        slot.update({'mat': None, 'timer': 0, 'busy': False})
 
 def draw_gradient_background(surface, top, bottom):
-    for y in range(surface.get_height()):
-        ratio = y / surface.get_height()
-        r = int(top[0] * (1 - ratio) + bottom[0] * ratio)
-        g = int(top[1] * (1 - ratio) + bottom[1] * ratio)
-        b = int(top[2] * (1 - ratio) + bottom[2] * ratio)
-        pygame.draw.line(surface, (r, g, b), (0, y), (surface.get_width(), y))
+    surface.blit(render_cache.gradient(surface.get_size(), top, bottom), (0, 0))
 
 def draw_shadowed_rect(surface, color, shadow, rect, border_radius=0, shadow_offset=2):
     shadow_rect = rect.move(shadow_offset, shadow_offset)
@@ -119,8 +130,7 @@ def draw_shadowed_rect(surface, color, shadow, rect, border_radius=0, shadow_off
     pygame.draw.rect(surface, color, rect, border_radius=border_radius)
     pygame.draw.rect(surface, BORDER_COLOR, rect, 1, border_radius=border_radius)
 
-def draw_machine_icon(surface, center):
-    x, y = center
+def paint_machine_icon(surface, x, y):
     pygame.draw.circle(surface, (200, 220, 255), (x, y), 10)
     for i in range(8):
         angle = i * math.pi / 4
@@ -130,7 +140,7 @@ def draw_machine_icon(surface, center):
     pygame.draw.circle(surface, (120, 180, 220), (x, y), 6)
     pygame.draw.circle(surface, (80, 120, 180), (x, y), 3)
 
-def draw_material(surface, x, y, stage):
+def paint_material(surface, x, y, stage):
     # Draw base body
     pygame.draw.rect(surface, MATERIAL_COLOR, (x, y, raw_width, raw_height), border_radius=6)
     pygame.draw.rect(surface, (100, 90, 40), (x, y, raw_width, raw_height), 1, border_radius=6)
@@ -149,7 +159,7 @@ def draw_material(surface, x, y, stage):
         # Right leg
         pygame.draw.line(surface, (180, 160, 80), (cx+6, y+raw_height), (cx+10, y+raw_height+12), 3)
 
-def draw_person(surface, x, y):
+def paint_person(surface, x, y):
     pygame.draw.circle(surface, (220, 200, 180), (x, y), 10)
     pygame.draw.rect(surface, (120, 120, 120), (x-7, y+10, 14, 18), border_radius=4)
     pygame.draw.line(surface, (120, 120, 120), (x-7, y+20), (x-18, y+30), 4)
@@ -157,13 +167,190 @@ def draw_person(surface, x, y):
     pygame.draw.line(surface, (120, 120, 120), (x-2, y+28), (x-2, y+38), 3)
     pygame.draw.line(surface, (120, 120, 120), (x+2, y+28), (x+2, y+38), 3)
 
-def draw_truck(surface, x, y, load_count):
+def paint_truck(surface, x, y):
     pygame.draw.rect(surface, (80, 80, 80), (x, y, 80, 32), border_radius=6)
     pygame.draw.rect(surface, (120, 120, 120), (x+60, y+8, 20, 16), border_radius=4)
     pygame.draw.circle(surface, (40, 40, 40), (x+18, y+32), 8)
     pygame.draw.circle(surface, (40, 40, 40), (x+62, y+32), 8)
-    for i in range(load_count):
-        draw_material(surface, x+8+i*15, y+6, 0)
+
+def paint_stocked_material(surface, x, y, color, shadow, stage):
+    draw_shadowed_rect(surface, color, shadow, pygame.Rect(x, y, raw_width, raw_height), border_radius=4)
+    paint_material(surface, x, y, stage)
+
+# Sprites are painted once per variant into the render_cache atlas (size and
+# anchor inside the sprite match the *_bounds boxes below) and blitted from it
+MATERIAL_SPRITE = ((raw_width + 20, raw_height + 20), (10, 4))
+
+def material_variant(stage):
+    """Parts look the same from one arm/leg step to the next"""
+    return 4 if stage >= 4 else 2 if stage >= 2 else 0
+
+def sprite_blit(sprite, x, y):
+    """(sheet, pos, area) blitting an atlas sprite anchored at (x, y)"""
+    sheet, area, (ox, oy) = sprite
+    return sheet, (x - ox, y - oy), area
+
+def material_sprite(stage):
+    stage = material_variant(stage)
+    return render_cache.sprite(('material', stage), *MATERIAL_SPRITE, paint_material, stage)
+
+def stocked_material_sprite(color, shadow, stage):
+    stage = material_variant(stage)
+    return render_cache.sprite(('stocked', color, shadow, stage), *MATERIAL_SPRITE,
+                               paint_stocked_material, color, shadow, stage)
+
+def draw_machine_icon(surface, center):
+    surface.blit(*sprite_blit(render_cache.sprite('machine_icon', (36, 36), (18, 18), paint_machine_icon), *center))
+
+def draw_material(surface, x, y, stage):
+    surface.blit(*sprite_blit(material_sprite(stage), x, y))
+
+def draw_stocked_material(surface, x, y, color, shadow, stage):
+    surface.blit(*sprite_blit(stocked_material_sprite(color, shadow, stage), x, y))
+
+def draw_person(surface, x, y):
+    surface.blit(*sprite_blit(render_cache.sprite('person', (40, 52), (20, 12), paint_person), x, y))
+
+def draw_truck(surface, x, y, load_count):
+    """Truck body and its load in one Surface.blits call"""
+    body = sprite_blit(render_cache.sprite('truck', (84, 44), (2, 2), paint_truck), x, y)
+    load = material_sprite(0)
+    surface.blits([body] + [sprite_blit(load, x+8+i*15, y+6) for i in range(load_count)], doreturn=False)
+
+def layout_key():
+    """Changes whenever the factory layout moves, so cached layers get redrawn"""
+    return (raw_start_x, raw_start_y, fg_start_x, fg_start_y, tuple(machines),
+            tuple(LINE.stations), tuple(tuple(route) for route in LINE.rework))
+
+def draw_factory_areas(surface):
+    """Background with the raw material and finished goods panels"""
+    draw_gradient_background(surface, BG_TOP, BG_BOTTOM)
+    area_rect = pygame.Rect(raw_start_x - 10, raw_start_y - 30, raw_area_width, 160)
+    pygame.draw.rect(surface, (70, 60, 30), area_rect, border_radius=10)
+    pygame.draw.rect(surface, (120, 100, 60), area_rect, 1, border_radius=10)
+    raw_label = font.render("Raw Materials", True, TEXT_COLOR)
+    surface.blit(raw_label, (raw_start_x + (raw_area_width - raw_label.get_width()) // 2, raw_start_y - 25))
+    fg_area_rect = pygame.Rect(fg_start_x - 10, fg_start_y - 30, fg_area_width, 160)
+    pygame.draw.rect(surface, (40, 70, 30), fg_area_rect, border_radius=10)
+    pygame.draw.rect(surface, (80, 120, 60), fg_area_rect, 1, border_radius=10)
+    fg_label = font.render("Finished Goods", True, TEXT_COLOR)
+    surface.blit(fg_label, (fg_start_x + (fg_area_width - fg_label.get_width()) // 2, fg_start_y - 25))
+
+def draw_factory_scene(surface):
+    """Everything on the factory floor that does not move: panels, machines and labels"""
+    draw_factory_areas(surface)
+    for idx, (mx, my) in enumerate(machines):
+        table_rect = pygame.Rect(mx, my, machine_width, machine_height)
+        draw_shadowed_rect(surface, MACHINE_COLOR, MACHINE_SHADOW, table_rect, border_radius=8)
+        pygame.draw.rect(surface, MACHINE_SHADOW, (mx+6, my+machine_height, 6, 10), border_radius=2)
+        pygame.draw.rect(surface, MACHINE_SHADOW, (mx+machine_width-12, my+machine_height, 6, 10), border_radius=2)
+        draw_machine_icon(surface, (mx + machine_width//2, my + machine_height//2))
+        label = font.render(LINE.machine_label(idx), True, TEXT_COLOR)
+        surface.blit(label, (mx + (machine_width - label.get_width()) // 2, my - 18))
+    draw_rework_routes(surface)
+
+def draw_rework_routes(surface):
+    """Arcs over the machines from each station that sends parts back, to where they go"""
+    if not LINE.rework:
+        return
+    arc_y = min(my for _, my in machines) - 28
+    for source, target, probability in LINE.rework:
+        sx = machines[LINE.station_first[source]][0] + machine_width // 2 + 6
+        tx = machines[LINE.station_first[target]][0] + machine_width // 2 - 6
+        pygame.draw.lines(surface, REWORK_COLOR, False, [(sx, arc_y + 8), (sx, arc_y), (tx, arc_y), (tx, arc_y + 8)], 2)
+        pygame.draw.polygon(surface, REWORK_COLOR, [(tx - 4, arc_y + 6), (tx + 4, arc_y + 6), (tx, arc_y + 11)])
+        label = render_cache.text(label_font, f"rework {probability:.0%}", REWORK_COLOR)
+        surface.blit(label, ((sx + tx - label.get_width()) // 2, arc_y - label.get_height()))
+
+def factory_layer(surface, with_machines=True):
+    """Cached static factory layer (drawn once per layout and window size)"""
+    if with_machines:
+        return render_cache.get_layer('factory', surface.get_size(), layout_key(), draw_factory_scene)
+    return render_cache.get_layer('factory_areas', surface.get_size(), layout_key(), draw_factory_areas)
+
+def blit_factory(surface, with_machines=True):
+    surface.blit(factory_layer(surface, with_machines), (0, 0))
+
+def highway_layer(surface, caption):
+    return render_cache.get_layer(('highway', caption), surface.get_size(), None,
+                                  lambda layer: draw_highway_scene(layer, caption))
+
+# Bounding boxes of the dynamic sprites, used for dirty-rect updates
+def material_bounds(x, y):
+    return pygame.Rect(x - 10, y - 4, raw_width + 20, raw_height + 20)
+
+def person_bounds(x, y):
+    return pygame.Rect(x - 20, y - 12, 40, 52)
+
+def truck_bounds(x, y, load_count):
+    return pygame.Rect(x - 2, y - 2, max(84, 8 + load_count * 15 + raw_width), 44)
+
+blit_at = render_cache.blit  # present() batches these into one Surface.blits call
+
+def present(surface, renderer, background, items, profiler=None):
+    """Draw background plus (key, rect, state, draw, args) items and push the frame.
+
+    Without a renderer the whole frame is drawn and flipped; with a
+    render_cache.DirtyRenderer only the changed areas are redrawn and passed
+    to pygame.display.update(). A FrameProfiler gets background, draw and
+    flip marks.
+    """
+    if renderer is None:
+        surface.blit(background, (0, 0))
+        if profiler is not None:
+            profiler.mark('background')
+        render_cache.draw_items(surface, items)
+        if profiler is not None:
+            profiler.mark('draw')
+        pygame.display.flip()
+    else:
+        rects = renderer.render(surface, background, items)
+        if profiler is not None:
+            profiler.mark('draw')
+        if rects:
+            pygame.display.update(rects)
+    if profiler is not None:
+        profiler.mark('flip')
+
+def new_renderer():
+    return render_cache.DirtyRenderer() if DIRTY_RECTS else None
+
+def draw_load_truck_scene(surface):
+    people_xs = [80 + i*50 for i in range(raw_count)]
+    surface.fill((200, 220, 255))
+    label = font.render("People bring products to the truck (Customer Demand)", True, (40, 40, 40))
+    surface.blit(label, (surface.get_width()//2 - label.get_width()//2, 30))
+    for j in range(raw_count):
+        draw_person(surface, people_xs[j], 180)
+
+def draw_highway_scene(surface, caption):
+    road_y = 180
+    plant_x = 540
+    plant_y = road_y - 60
+    plant_w = 120
+    plant_h = 100
+    door_w = 32
+    door_h = 40
+    surface.fill((200, 220, 255))
+    # Draw highway
+    pygame.draw.rect(surface, (80, 80, 80), (0, road_y, surface.get_width(), 40))
+    for lx in range(0, surface.get_width(), 40):
+        pygame.draw.rect(surface, (255, 255, 100), (lx+10, road_y+18, 20, 4))
+    # Draw scenery (simple trees)
+    for t in range(0, surface.get_width(), 120):
+        pygame.draw.rect(surface, (60, 120, 60), (t+20, road_y-30, 12, 30))
+        pygame.draw.circle(surface, (40, 180, 40), (t+26, road_y-30), 16)
+    # Draw manufacturing plant
+    pygame.draw.rect(surface, (180, 180, 200), (plant_x, plant_y, plant_w, plant_h), border_radius=8)
+    pygame.draw.rect(surface, (120, 120, 140), (plant_x, plant_y, plant_w, plant_h), 3, border_radius=8)
+    # Draw plant door
+    pygame.draw.rect(surface, (100, 100, 120), (plant_x+plant_w//2-door_w//2, plant_y+plant_h-door_h, door_w, door_h), border_radius=4)
+    # Draw plant sign
+    sign = small_font.render("Manufacturing Plant", True, (40, 40, 60))
+    pygame.draw.rect(surface, (255, 255, 210), (plant_x+plant_w//2-54, plant_y-22, 108, 22), border_radius=6)
+    surface.blit(sign, (plant_x+plant_w//2-sign.get_width()//2, plant_y-20))
+    label = font.render(caption, True, (40, 40, 40))
+    surface.blit(label, (surface.get_width()//2 - label.get_width()//2, 30))
 
 def scenario_people_load_truck():
     truck_x, truck_y = 120, 110
@@ -171,304 +358,358 @@ def scenario_people_load_truck():
     product_start_y = 180
     product_end_x = truck_x + 8
     product_end_y = truck_y + 6
+    background = render_cache.get_layer('load_truck', screen.get_size(), raw_count, draw_load_truck_scene)
+    renderer = new_renderer()
     loaded = 0
     for i in range(raw_count):
         for step in range(0, 41):
-            screen.fill((200, 220, 255))
-            label = font.render("People bring products to the truck (Customer Demand)", True, (40, 40, 40))
-            screen.blit(label, (screen.get_width()//2 - label.get_width()//2, 30))
-            # Draw people
-            for j in range(raw_count):
-                draw_person(screen, people_xs[j], product_start_y)
-            # Draw truck
-            draw_truck(screen, truck_x, truck_y, loaded)
             # Animate product being carried
             px = people_xs[i] + (product_end_x - people_xs[i]) * step // 40
             py = product_start_y + (product_end_y - product_start_y) * step // 40
-            draw_material(screen, px, py, 0)
-            pygame.display.flip()
+            present(screen, renderer, background, [
+                ('truck', truck_bounds(truck_x, truck_y, loaded), loaded, draw_truck, (truck_x, truck_y, loaded)),
+                ('carried', material_bounds(px, py), None, draw_material, (px, py, 0)),
+            ])
             pygame.time.wait(18)
         loaded += 1
     # Show final loaded truck for a moment
-    screen.fill((200, 220, 255))
-    label = font.render("People bring products to the truck (Customer Demand)", True, (40, 40, 40))
-    screen.blit(label, (screen.get_width()//2 - label.get_width()//2, 30))
-    for j in range(raw_count):
-        draw_person(screen, people_xs[j], product_start_y)
-    draw_truck(screen, truck_x, truck_y, loaded)
-    pygame.display.flip()
+    present(screen, renderer, background, [
+        ('truck', truck_bounds(truck_x, truck_y, loaded), loaded, draw_truck, (truck_x, truck_y, loaded)),
+    ])
     pygame.time.wait(900)
 
 def scenario_truck_moving_highway():
     road_y = 180
     truck_y = road_y - 40
     plant_x = 540
-    plant_y = road_y - 60
-    plant_w = 120
-    plant_h = 100
-    door_w = 32
-    door_h = 40
+    renderer = new_renderer()
+    background = highway_layer(screen, "Truck Delivering to Plant...")
     for tx in range(120, plant_x-40, 3):  # Move truck to plant
-        screen.fill((200, 220, 255))
-        # Draw highway
-        pygame.draw.rect(screen, (80, 80, 80), (0, road_y, screen.get_width(), 40))
-        for lx in range(0, screen.get_width(), 40):
-            pygame.draw.rect(screen, (255, 255, 100), (lx+10, road_y+18, 20, 4))
-        # Draw scenery (simple trees)
-        for t in range(0, screen.get_width(), 120):
-            pygame.draw.rect(screen, (60, 120, 60), (t+20, road_y-30, 12, 30))
-            pygame.draw.circle(screen, (40, 180, 40), (t+26, road_y-30), 16)
-        # Draw manufacturing plant
-        pygame.draw.rect(screen, (180, 180, 200), (plant_x, plant_y, plant_w, plant_h), border_radius=8)
-        pygame.draw.rect(screen, (120, 120, 140), (plant_x, plant_y, plant_w, plant_h), 3, border_radius=8)
-        # Draw plant door
-        pygame.draw.rect(screen, (100, 100, 120), (plant_x+plant_w//2-door_w//2, plant_y+plant_h-door_h, door_w, door_h), border_radius=4)
-        # Draw plant sign
-        sign = small_font.render("Manufacturing Plant", True, (40, 40, 60))
-        pygame.draw.rect(screen, (255, 255, 210), (plant_x+plant_w//2-54, plant_y-22, 108, 22), border_radius=6)
-        screen.blit(sign, (plant_x+plant_w//2-sign.get_width()//2, plant_y-20))
-        label = font.render("Truck Delivering to Plant...", True, (40, 40, 40))
-        screen.blit(label, (screen.get_width()//2 - label.get_width()//2, 30))
-        draw_truck(screen, tx, truck_y, raw_count)
-        pygame.display.flip()
+        present(screen, renderer, background, [
+            ('truck', truck_bounds(tx, truck_y, raw_count), None, draw_truck, (tx, truck_y, raw_count)),
+        ])
         pygame.time.wait(22)
     # Pause with truck at plant
+    background = highway_layer(screen, "Truck Arrived at Plant")
     for _ in range(30):
-        screen.fill((200, 220, 255))
-        pygame.draw.rect(screen, (80, 80, 80), (0, road_y, screen.get_width(), 40))
-        for lx in range(0, screen.get_width(), 40):
-            pygame.draw.rect(screen, (255, 255, 100), (lx+10, road_y+18, 20, 4))
-        for t in range(0, screen.get_width(), 120):
-            pygame.draw.rect(screen, (60, 120, 60), (t+20, road_y-30, 12, 30))
-            pygame.draw.circle(screen, (40, 180, 40), (t+26, road_y-30), 16)
-        pygame.draw.rect(screen, (180, 180, 200), (plant_x, plant_y, plant_w, plant_h), border_radius=8)
-        pygame.draw.rect(screen, (120, 120, 140), (plant_x, plant_y, plant_w, plant_h), 3, border_radius=8)
-        pygame.draw.rect(screen, (100, 100, 120), (plant_x+plant_w//2-door_w//2, plant_y+plant_h-door_h, door_w, door_h), border_radius=4)
-        pygame.draw.rect(screen, (255, 255, 210), (plant_x+plant_w//2-54, plant_y-22, 108, 22), border_radius=6)
-        screen.blit(sign, (plant_x+plant_w//2-sign.get_width()//2, plant_y-20))
-        label = font.render("Truck Arrived at Plant", True, (40, 40, 40))
-        screen.blit(label, (screen.get_width()//2 - label.get_width()//2, 30))
-        draw_truck(screen, plant_x-40, truck_y, raw_count)
-        pygame.display.flip()
+        present(screen, renderer, background, [
+            ('truck', truck_bounds(plant_x-40, truck_y, raw_count), None, draw_truck, (plant_x-40, truck_y, raw_count)),
+        ])
         pygame.time.wait(22)
     pygame.time.wait(800)
 
 def scenario_unload_truck_to_raw():
     # Use manufacturing simulation background and layout
     truck_x, truck_y = 540-40, 200  # Lower the truck
-    people_x = truck_x + 40
-    people_y = truck_y + 32
     raw_target_x = raw_start_x + (raw_area_width - raw_width)//2
     raw_target_ys = [raw_start_y + i * (raw_height + raw_gap) for i in range(raw_count)]
+    background = factory_layer(screen, with_machines=False)
+    renderer = new_renderer()
+
+    def stocked(count):
+        return [(('raw', j), material_bounds(raw_target_x, raw_target_ys[j]), None, blit_at,
+                 sprite_blit(material_sprite(0), raw_target_x, raw_target_ys[j])) for j in range(count)]
+
     for i in range(raw_count):
         for step in range(0, 41):
-            draw_gradient_background(screen, BG_TOP, BG_BOTTOM)
-            # Draw manufacturing layout
-            area_rect = pygame.Rect(raw_start_x - 10, raw_start_y - 30, raw_area_width, 160)
-            pygame.draw.rect(screen, (70, 60, 30), area_rect, border_radius=10)
-            pygame.draw.rect(screen, (120, 100, 60), area_rect, 1, border_radius=10)
-            raw_label = font.render("Raw Materials", True, TEXT_COLOR)
-            screen.blit(raw_label, (raw_start_x + (raw_area_width - raw_label.get_width()) // 2, raw_start_y - 25))
-            fg_area_rect = pygame.Rect(fg_start_x - 10, fg_start_y - 30, fg_area_width, 160)
-            pygame.draw.rect(screen, (40, 70, 30), fg_area_rect, border_radius=10)
-            pygame.draw.rect(screen, (80, 120, 60), fg_area_rect, 1, border_radius=10)
-            fg_label = font.render("Finished Goods", True, TEXT_COLOR)
-            screen.blit(fg_label, (fg_start_x + (fg_area_width - fg_label.get_width()) // 2, fg_start_y - 25))
-            for j in range(i):
-                draw_material(screen, raw_target_x, raw_target_ys[j], 0)
-            # Draw truck at plant (lowered)
-            draw_truck(screen, truck_x, truck_y, raw_count-i)
-            # Animate person and product moving to raw area
+            # Truck at plant (lowered), then person and product moving to raw area
             px = truck_x + 8 + i*15
             py = truck_y + 6
             person_start_x = px + 10
             person_start_y = py + 30
             carry_x = person_start_x + (raw_target_x - person_start_x) * step // 40
             carry_y = person_start_y + (raw_target_ys[i] - person_start_y) * step // 40
-            draw_person(screen, carry_x, carry_y)
-            draw_material(screen, carry_x-10, carry_y+10, 0)
-            pygame.display.flip()
+            present(screen, renderer, background, stocked(i) + [
+                ('truck', truck_bounds(truck_x, truck_y, raw_count-i), raw_count-i, draw_truck,
+                 (truck_x, truck_y, raw_count-i)),
+                ('person', person_bounds(carry_x, carry_y), None, draw_person, (carry_x, carry_y)),
+                ('carried', material_bounds(carry_x-10, carry_y+10), None, draw_material, (carry_x-10, carry_y+10, 0)),
+            ])
             pygame.time.wait(18)
     # Show final state for a moment
-    draw_gradient_background(screen, BG_TOP, BG_BOTTOM)
-    area_rect = pygame.Rect(raw_start_x - 10, raw_start_y - 30, raw_area_width, 160)
-    pygame.draw.rect(screen, (70, 60, 30), area_rect, border_radius=10)
-    pygame.draw.rect(screen, (120, 100, 60), area_rect, 1, border_radius=10)
-    raw_label = font.render("Raw Materials", True, TEXT_COLOR)
-    screen.blit(raw_label, (raw_start_x + (raw_area_width - raw_label.get_width()) // 2, raw_start_y - 25))
-    fg_area_rect = pygame.Rect(fg_start_x - 10, fg_start_y - 30, fg_area_width, 160)
-    pygame.draw.rect(screen, (40, 70, 30), fg_area_rect, border_radius=10)
-    pygame.draw.rect(screen, (80, 120, 60), fg_area_rect, 1, border_radius=10)
-    fg_label = font.render("Finished Goods", True, TEXT_COLOR)
-    screen.blit(fg_label, (fg_start_x + (fg_area_width - fg_label.get_width()) // 2, fg_start_y - 25))
-    for j in range(raw_count):
-        draw_material(screen, raw_target_x, raw_target_ys[j], 0)
-    draw_truck(screen, truck_x, truck_y, 0)
-    pygame.display.flip()
+    present(screen, renderer, background, stocked(raw_count) + [
+        ('truck', truck_bounds(truck_x, truck_y, 0), 0, draw_truck, (truck_x, truck_y, 0)),
+    ])
     pygame.time.wait(900)
 
 def show_metric_scene():
-    # Load CSV
-    WIDTH, HEIGHT = 600, 220
-    metric_font = pygame.font.SysFont('Segoe UI', 16, bold=True)
-    metric_cell_font = pygame.font.SysFont('Segoe UI', 12)
-    BG_COLOR = (245, 245, 245)
-    HEADER_COLOR = (200, 220, 255)
-    LINE_COLOR = (180, 180, 180)
-    TEXT_COLOR = (30, 30, 30)
-    csv_path = os.path.join(os.path.dirname(__file__), 'Sample Process Improvement Metric - Sheet1.csv')
-    rows = []
-    with open(csv_path, newline='', encoding='utf-8') as csvfile:
-        reader = csv.reader(csvfile)
-        for row in reader:
-            rows.append(row)
-    col_widths = [max(metric_cell_font.size(str(cell))[0] for cell in col) + 12 for col in zip(*rows)]
-    table_width = sum(col_widths)
-    start_x = (WIDTH - table_width) // 2 if table_width < WIDTH else 5
-    start_y = 40
-    row_height = 22
-    running_metric = True
-    metric_screen = pygame.display.set_mode((WIDTH, HEIGHT))
-    pygame.display.set_caption("Sample Process Improvement Metric")
-    while running_metric:
-        metric_screen.fill(BG_COLOR)
-        # Title
-        title = metric_font.render("Sample Process Improvement Metric", True, (40, 60, 120))
-        metric_screen.blit(title, (WIDTH//2 - title.get_width()//2, 8))
-        # Draw table
-        y = start_y
-        for i, row in enumerate(rows):
-            x = start_x
-            for j, cell in enumerate(row):
-                rect = pygame.Rect(x, y, col_widths[j], row_height)
-                color = HEADER_COLOR if i == 0 else BG_COLOR
-                pygame.draw.rect(metric_screen, color, rect)
-                pygame.draw.rect(metric_screen, LINE_COLOR, rect, 1)
-                text = metric_cell_font.render(str(cell), True, TEXT_COLOR)
-                metric_screen.blit(text, (x + 4, y + (row_height - text.get_height()) // 2))
-                x += col_widths[j]
-            y += row_height
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running_metric = False
-        pygame.display.flip()
-    pygame.quit()
-    exit()
-
-def main():
-    pygame.init()
-    screen = pygame.display.set_mode((700, 320))
-    pygame.display.set_caption("One-Piece-Flow Simulation")
+    """Show the process improvement metric table in this process"""
+    scenes.run(scenes.METRICS)
+
+def machine_target(idx):
+    mx, my = machines[idx]
+    return mx + (machine_width-raw_width)//2, my + (machine_height-raw_height)//2
+
+def make_engine(replay_path=None, live_address=None):
+    """Build the headless engine (or a trace replay or live feed) and mirror its events onto the view"""
+    if live_address is not None:
+        engine = live_feed.LiveFeed(live_address, num_machines, PROCESS_TIME, LINE.transfer_time).start()
+    elif replay_path is None:
+        engine = LINE.make_engine(raw_count)
+    else:
+        engine = event_trace.TraceReplay(replay_path)
+        if engine.num_machines != num_machines:
+            raise ValueError(f"{replay_path}: trace has {engine.num_machines} machines, the view shows {num_machines}")
+    attach_view(engine)
+    return engine
+
+def attach_view(engine):
+    """Mirror the engine's events onto materials and machine_slots"""
+    def on_event(now, kind, part, station):
+        if kind == flow_engine.TRANSFER:
+            # Free the machine the part comes from (stage 0 is the raw area)
+            came_from = materials.stage[materials.row_of(part)] - 1
+            if came_from >= 0 and machine_slots[came_from]['mat'] == part:
+                machine_slots[came_from]['mat'] = None
+            materials.set_stage(part, station + 1)
+            materials.move_to(part, *machine_target(station), now, engine.transfer_time)
+            machine_slots[station]['mat'] = part
+            machine_slots[station]['busy'] = False
+        elif kind == flow_engine.START:
+            machine_slots[station]['busy'] = True
+            row = materials.row_of(part)
+            materials.processing[row] = True
+            materials.timer[row] = engine.remaining(station)
+        elif kind == flow_engine.FINISH:
+            machine_slots[station]['busy'] = False
+            materials.processing[materials.row_of(part)] = False
+        elif kind == flow_engine.EXIT:
+            if machine_slots[station]['mat'] == part:
+                machine_slots[station]['mat'] = None
+            materials.finish(part)
+
+    engine.add_listener(on_event)
+
+def checkpoint(engine, stats, sim_time):
+    """In-memory snapshot of the engine, its statistics and the view"""
+    return snapshot.dumps(engine, [stats], (materials, machine_slots, sim_time))
+
+def restore_checkpoint(data, sim_clock):
+    """Go back to a checkpoint(); returns the restored engine, statistics and time"""
+    global materials, machine_slots
+    engine, (stats,), (materials, machine_slots, sim_time) = snapshot.loads(data)
+    attach_view(engine)
+    sim_clock.seek(sim_time)
+    return engine, stats, sim_time
+
+SPEED_KEYS = {pygame.K_1: TIME_SCALES[0], pygame.K_2: TIME_SCALES[1], pygame.K_3: TIME_SCALES[2]}
+
+def factory_items(speed_label=None, stats_lines=None, perf_overlay=None):
+    """Dynamic sprites of the factory floor as (key, rect, state, draw, args)"""
+    items = []
+    # Only the rows that fit in the window are drawn, however long the line runs:
+    # the next parts to release, and a count of the rest in the last row
+    waiting = len(materials.raw_parts())
+    shown = waiting if waiting <= STACK_ROWS else STACK_ROWS - 1
+    raw_look = stocked_material_sprite(MATERIAL_COLOR, MATERIAL_SHADOW, 0)
+    rect_x = raw_start_x + (raw_area_width - raw_width)//2
+    for i in range(shown):
+        rect_y = raw_start_y + i * (raw_height + raw_gap)
+        items.append((('raw', i), material_bounds(rect_x, rect_y), None, blit_at,
+                      sprite_blit(raw_look, rect_x, rect_y)))
+    if shown < waiting:
+        label = f"+{waiting - shown:,} waiting"
+        more_text = render_cache.text(label_font, label, TEXT_COLOR)
+        center = (rect_x + raw_width // 2, raw_start_y + shown * (raw_height + raw_gap) + raw_height // 2)
+        rect = more_text.get_rect(center=center)
+        items.append((('raw_more',), rect, label, blit_at, (more_text, rect.topleft)))
+
+    fg_look = stocked_material_sprite(FG_COLOR, FG_SHADOW, 4)
+    for i in range(min(materials.finished_count, STACK_ROWS)):
+        rect_x = fg_start_x + (fg_area_width - fg_width)//2
+        rect_y = fg_start_y + i * (fg_height + fg_gap)
+        # Final product: arms and legs
+        items.append((('fg', i), material_bounds(rect_x, rect_y), None, blit_at,
+                      sprite_blit(fg_look, rect_x, rect_y)))
+
+    for idx, (mx, my) in enumerate(machines):
+        if machine_slots[idx]['mat'] is not None and machine_slots[idx]['busy']:
+            label = f"{int(machine_slots[idx]['timer'])}s"
+            timer_text = render_cache.text(small_font, label, (255, 200, 100))
+        else:
+            label = f"{LINE.mean_process_time(idx):g} sec"
+            timer_text = render_cache.text(small_font, label, TEXT_COLOR)
+        pos = (mx + (machine_width - timer_text.get_width()) // 2, my + machine_height + 2)
+        items.append((('timer', idx), timer_text.get_rect(topleft=pos), label, blit_at, (timer_text, pos)))
+
+    # Parts look further along the further right their station is (parallel machines share a column)
+    looks = [material_sprite(stage) for stage in range(LINE.num_stations + 1)]
+    for part, row in materials.on_line():
+        x, y, stage = int(materials.x[row]), int(materials.y[row]), LINE.machine_column[materials.stage[row] - 1] + 1
+        sheet, area, (ox, oy) = looks[stage]
+        items.append((('mat', part), material_bounds(x, y), stage, blit_at, (sheet, (x - ox, y - oy), area)))
+
+    if speed_label is not None:
+        speed_text = render_cache.text(label_font, f"Speed: {speed_label}", TEXT_COLOR)
+        pos = (screen.get_width() - speed_text.get_width() - 10, screen.get_height() - speed_text.get_height() - 6)
+        items.append((('speed',), speed_text.get_rect(topleft=pos), speed_label, blit_at, (speed_text, pos)))
+
+    # Live statistics overlay in the empty bottom-left corner
+    for i, line in enumerate(reversed(stats_lines or [])):
+        line_text = render_cache.text(label_font, line, TEXT_COLOR)
+        pos = (10, screen.get_height() - (i + 1) * label_font.get_linesize() - 6)
+        items.append((('stats', i), line_text.get_rect(topleft=pos), line, blit_at, (line_text, pos)))
+
+    # Frame profiler overlay (F3), drawn last so it stays on top
+    if perf_overlay is not None:
+        pos = (screen.get_width() - perf_overlay.get_width() - 6, 6)
+        items.append((('perf',), perf_overlay.get_rect(topleft=pos), id(perf_overlay), blit_at, (perf_overlay, pos)))
+    return items
+
+def seek_replay(replay, sim_clock, sim_time, stats=None):
+    """Rebuild the view at `sim_time` from the trace without re-running anything"""
+    sim_time = min(max(0.0, sim_time), replay.duration)
+    reset_line()
+    if stats is not None:
+        stats.reset(sim_time)
+    released, finished = replay.seek(sim_time)
+    materials.next_raw = released
+    materials.finished_count = finished
+    materials.update(sim_time)
+    sim_clock.seek(sim_time)
+
+def handle_profiler_key(key, profiler):
+    """F3 shows the frame timing overlay, F4 writes a cProfile capture of the next frames"""
+    if key == pygame.K_F3:
+        profiler.toggle()
+    elif key == pygame.K_F4:
+        profiler.capture()
+
+def handle_seek_key(key, sim_clock, replay, stats=None):
+    """Home/End jump to the start/end of a trace, Page Up/Down step a tenth of it"""
+    step = replay.duration / 10
+    if key == pygame.K_HOME:
+        seek_replay(replay, sim_clock, 0.0, stats)
+    elif key == pygame.K_END:
+        seek_replay(replay, sim_clock, replay.duration, stats)
+    elif key == pygame.K_PAGEUP:
+        seek_replay(replay, sim_clock, sim_clock.sim_time - step, stats)
+    elif key == pygame.K_PAGEDOWN:
+        seek_replay(replay, sim_clock, sim_clock.sim_time + step, stats)
+
+def handle_speed_key(key, sim_clock, engine):
+    """Space pauses, 1/2/3 pick 1x/10x/100x, +/- step the speed, N jumps to the next event"""
+    if key == pygame.K_SPACE:
+        sim_clock.toggle_pause()
+    elif key in SPEED_KEYS:
+        sim_clock.set_scale(SPEED_KEYS[key])
+    elif key in (pygame.K_PLUS, pygame.K_EQUALS, pygame.K_KP_PLUS):
+        sim_clock.faster()
+    elif key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+        sim_clock.slower()
+    elif key in (pygame.K_n, pygame.K_RIGHT):
+        sim_clock.jump_to(engine.peek())
+
+def simulation_scene():
+    """Intro scenarios followed by the flow simulation on the shared display"""
+    global screen, raw_count
+    screen = scenes.set_mode(SCREEN_SIZE, CAPTION)
+    load_fonts()
     clock = pygame.time.Clock()
     running = True
-
-    # --- Initial scenario: loading and truck movement ---
-    scenario_people_load_truck()
-    scenario_truck_moving_highway()
-    scenario_unload_truck_to_raw()
+    leave_to = scenes.back(scenes.SIMULATION)
+    live = LIVE_ADDRESS is not None
+    engine = make_engine(REPLAY_PATH, LIVE_ADDRESS)
+    if REPLAY_PATH is not None or live:
+        raw_count = engine.raw_count
+    reset_line()
+
+    # --- Initial scenario: loading and truck movement (skipped for traces and live data) ---
+    if REPLAY_PATH is None and not live:
+        scenario_people_load_truck()
+        scenario_truck_moving_highway()
+        scenario_unload_truck_to_raw()
+
+    # Constant-memory running statistics, shown live (S toggles) and exported at the end.
+    # A live feed keeps its own at full event rate on the ingestion thread.
+    if live:
+        stats = engine
+    else:
+        stats = StreamingStats(num_machines)
+        engine.add_listener(stats)
+    show_stats = True
+    saved = None  # F5 checkpoint, restored with F9
+
+    sim_clock = SimClock()
+    sim_time = 0.0
+    profiler = FrameProfiler.from_env('simulation')
+
+    renderer = new_renderer()
+    clock.tick()  # don't count the intro scenes as simulated time
 
     while running:
-        draw_gradient_background(screen, BG_TOP, BG_BOTTOM)
-
-        area_rect = pygame.Rect(raw_start_x - 10, raw_start_y - 30, raw_area_width, 160)
-        pygame.draw.rect(screen, (70, 60, 30), area_rect, border_radius=10)
-        pygame.draw.rect(screen, (120, 100, 60), area_rect, 1, border_radius=10)
-        raw_label = font.render("Raw Materials", True, TEXT_COLOR)
-        screen.blit(raw_label, (raw_start_x + (raw_area_width - raw_label.get_width()) // 2, raw_start_y - 25))
-        for i, mat in enumerate(materials):
-            if mat.stage == 0:
-                rect_x = raw_start_x + (raw_area_width - raw_width)//2
-                rect_y = raw_start_y + i * (raw_height + raw_gap)
-                draw_shadowed_rect(screen, MATERIAL_COLOR, MATERIAL_SHADOW, pygame.Rect(rect_x, rect_y, raw_width, raw_height), border_radius=4)
-                draw_material(screen, rect_x, rect_y, mat.stage)
-
-        fg_area_rect = pygame.Rect(fg_start_x - 10, fg_start_y - 30, fg_area_width, 160)
-        pygame.draw.rect(screen, (40, 70, 30), fg_area_rect, border_radius=10)
-        pygame.draw.rect(screen, (80, 120, 60), fg_area_rect, 1, border_radius=10)
-        fg_label = font.render("Finished Goods", True, TEXT_COLOR)
-        screen.blit(fg_label, (fg_start_x + (fg_area_width - fg_label.get_width()) // 2, fg_start_y - 25))
-        for i, mat in enumerate(finished_materials):
-            rect_x = fg_start_x + (fg_area_width - fg_width)//2
-            rect_y = fg_start_y + i * (fg_height + fg_gap)
-            draw_shadowed_rect(screen, FG_COLOR, FG_SHADOW, pygame.Rect(rect_x, rect_y, fg_width, fg_height), border_radius=4)
-            draw_material(screen, rect_x, rect_y, 4)  # Final product: arms and legs
-
-        for idx, (mx, my) in enumerate(machines):
-            table_rect = pygame.Rect(mx, my, machine_width, machine_height)
-            draw_shadowed_rect(screen, MACHINE_COLOR, MACHINE_SHADOW, table_rect, border_radius=8)
-            pygame.draw.rect(screen, MACHINE_SHADOW, (mx+6, my+machine_height, 6, 10), border_radius=2)
-            pygame.draw.rect(screen, MACHINE_SHADOW, (mx+machine_width-12, my+machine_height, 6, 10), border_radius=2)
-            draw_machine_icon(screen, (mx + machine_width//2, my + machine_height//2))
-            label = font.render(f"Machine {idx+1}", True, TEXT_COLOR)
-            screen.blit(label, (mx + (machine_width - label.get_width()) // 2, my - 18))
-            if machine_slots[idx]['mat'] is not None and machine_slots[idx]['busy']:
-                timer_text = small_font.render(f"{int(machine_slots[idx]['timer'])}s", True, (255, 200, 100))
-            else:
-                timer_text = small_font.render("15 sec", True, TEXT_COLOR)
-            screen.blit(timer_text, (mx + (machine_width - timer_text.get_width()) // 2, my + machine_height + 2))
-
-        for mat in materials:
-            if mat.stage > 0 and mat.stage < 4:
-                draw_material(screen, int(mat.x), int(mat.y), mat.stage)
-
-        if machine_slots[0]['mat'] is None:
-            for mat in materials:
-                if mat.stage == 0:
-                    mx, my = machines[0]
-                    mat.move_to(mx + (machine_width-raw_width)//2, my + (machine_height-raw_height)//2)
-                    mat.stage = 1
-                    machine_slots[0]['mat'] = mat
-                    machine_slots[0]['timer'] = PROCESS_TIME
-                    machine_slots[0]['busy'] = False
-                    break
-        for idx in range(3):
-            slot = machine_slots[idx]
-            if slot['mat'] is not None and not slot['busy']:
-                mat = slot['mat']
-                if (mat.x, mat.y) == mat.target_pos:
-                    slot['busy'] = True
-                    mat.processing = True
-                    mat.timer = slot['timer']
-        for idx in range(3):
-            slot = machine_slots[idx]
-            if slot['mat'] is not None and slot['busy']:
-                mat = slot['mat']
-                done = mat.update()
-                slot['timer'] = mat.timer if mat.processing else 0
-                if done:
-                    slot['mat'] = None
-                    slot['busy'] = False
-                    if idx < 2:
-                        mat.stage += 1
-                        mx, my = machines[idx+1]
-                        mat.move_to(mx + (machine_width-raw_width)//2, my + (machine_height-raw_height)//2)
-                        machine_slots[idx+1]['mat'] = mat
-                        machine_slots[idx+1]['timer'] = PROCESS_TIME
-                        machine_slots[idx+1]['busy'] = False
-                    else:
-                        mat.stage = 4
-                        finished_materials.append(mat)
-        for mat in materials:
-            if not mat.processing and (mat.x, mat.y) != mat.target_pos:
-                mat.update()
+        profiler.start_frame()
+        stats_lines = stats.overlay_lines(sim_time) if show_stats else None
+        perf_overlay = profiler.overlay(label_font) if profiler.visible else None
+        items = factory_items("LIVE" if live else sim_clock.label(), stats_lines, perf_overlay)
+        profiler.mark('sprites')
+        # Panels, machines and labels come from the cached static layer
+        present(screen, renderer, factory_layer(screen), items, profiler)
+
+        # The engine owns the line logic; the view just follows its events
+        engine.run(until=sim_time)
+        for idx, slot in enumerate(machine_slots):
+            slot['timer'] = engine.remaining(idx)
+            if slot['mat'] is not None:
+                materials.timer[materials.row_of(slot['mat'])] = slot['timer']
+        if live:
+            # Arrivals and parts that came and went within one batch arrive as counts
+            materials.raw_count = engine.raw_count
+            materials.next_raw = max(materials.next_raw, engine.released)
+            materials.finished_count = engine.finished
+        materials.update(sim_time)
+        profiler.mark('update')
 
-        pygame.display.flip()
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
-        clock.tick(60)
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_ESCAPE:
+                    running = False
+                elif REPLAY_PATH is not None and event.key in (pygame.K_HOME, pygame.K_END, pygame.K_PAGEUP, pygame.K_PAGEDOWN):
+                    handle_seek_key(event.key, sim_clock, engine, stats)
+                elif event.key == pygame.K_s:
+                    show_stats = not show_stats
+                elif event.key in (pygame.K_F3, pygame.K_F4):
+                    handle_profiler_key(event.key, profiler)
+                elif event.key == pygame.K_F5 and REPLAY_PATH is None and not live:
+                    saved = checkpoint(engine, stats, sim_time)
+                elif event.key == pygame.K_F9 and saved is not None:
+                    engine, stats, sim_time = restore_checkpoint(saved, sim_clock)
+                elif not live:
+                    handle_speed_key(event.key, sim_clock, engine)
+        profiler.mark('events')
+        # Simulated time follows real time scaled by the chosen speed (live: the feed's clock)
+        sim_time = sim_clock.advance(clock.tick(60) / 1000)
+        if live:
+            sim_time = engine.clock()
+        profiler.mark('wait')
+    profiler.stop()
+    if live:
+        engine.stop()
+
+    if STATS_PATH is not None:
+        stats.export(STATS_PATH, sim_time)
+
+    # After all materials are in finished goods, go on to the metric table
+    if REPLAY_PATH is None and not live and materials.finished_count == raw_count:
+        return scenes.METRICS
+    return leave_to
 
-    # After all materials are in finished goods, launch process_metric_viewer.py as a separate process
-    if len(finished_materials) == raw_count:
-        pygame.quit()  # Quit pygame first
-        if is_running_as_exe():
-            subprocess.Popen([get_executable_path(), '--metrics'])
-        else:
-            subprocess.Popen([sys.executable, 'process_metric_viewer.py'])
-        sys.exit()
-
-    pygame.quit()
+def main():
+    scenes.run(scenes.SIMULATION)
 
 if __name__ == "__main__":
-    main() 
-
+    # scenes imports 'one_piece_flow'; let it find this module instead of loading a second copy
+    sys.modules.setdefault('one_piece_flow', sys.modules[__name__])
+    if '--dirty-rects' in sys.argv:
+        DIRTY_RECTS = True
+    if '--replay' in sys.argv:
+        REPLAY_PATH = sys.argv[sys.argv.index('--replay') + 1]
+    if '--live' in sys.argv:
+        LIVE_ADDRESS = sys.argv[sys.argv.index('--live') + 1]
+    if '--line' in sys.argv:
+        apply_layout(line_def.load(sys.argv[sys.argv.index('--line') + 1]))
+    if '--stats-out' in sys.argv:
+        STATS_PATH = sys.argv[sys.argv.index('--stats-out') + 1]
+    main()
@@ -0,0 +1,283 @@
+"""Plant-scale simulation: many lines and the hand-offs between them.
+
+A plant is a list of line dicts:
+
+    {'name': 'frame', 'machines': 3, 'process': ['12', 'lognormal:15,4', '14'],
+     'buffer': 1, 'arrival': 'exp:16'}
+    {'name': 'final', 'machines': 4, 'process': '11', 'inputs': ['frame', 'motor'],
+     'handoff': 120}
+
+Source lines draw raw material at `arrival` intervals. A line with
+`inputs` is fed by those lines instead: its k-th part arrives `handoff`
+seconds after the k-th unit of every input has left its line (repeat a
+name to consume several units per part). Each line feeds at most one
+other line.
+
+Nothing flows back upstream (raw areas are unbounded), so a line only
+depends on the exit times of its inputs. Lines are grouped into levels by
+their depth in the feed graph; the lines of a level run in parallel,
+sharded across worker processes by expected work, and the only
+synchronization is between levels, where the exit times of feeding lines
+are handed to the lines they feed. Workers write each line's results into
+one multiprocessing.shared_memory NumPy block, so only those hand-off
+times travel back through the pool:
+
+    python plant_sim.py --lines 100 --feeders 3 --days 7
+"""
+import argparse
+import json
+import os
+import random
+import time
+from array import array
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import flow_engine
+from distributions import mean_of, parse_distribution
+from line_metrics import LineMetrics
+from replications import replication_seeds
+
+FIELDS = ('arrived', 'completed', 'raw_waiting', 'throughput_per_hour', 'wip', 'lead_time',
+          'cycle_time', 'utilization', 'events', 'wall_time')
+
+DEFAULT_LINE = {
+    'machines': flow_engine.NUM_MACHINES,
+    'process': str(flow_engine.PROCESS_TIME),
+    'buffer': 0,
+    'arrival': None,
+    'inputs': [],
+    'handoff': 60.0,
+}
+
+
+def _distribution(spec):
+    return parse_distribution(spec) if isinstance(spec, str) else spec
+
+
+def make_line(name, **settings):
+    """Line dict with defaults filled in"""
+    line = dict(DEFAULT_LINE, **settings)
+    line['name'] = name
+    return line
+
+
+def plant_levels(lines):
+    """Line indices grouped by depth in the feed graph (sources first).
+
+    Raises ValueError for unknown inputs, lines feeding more than one line,
+    sources without an arrival interval and feed cycles.
+    """
+    index = {line['name']: i for i, line in enumerate(lines)}
+    if len(index) != len(lines):
+        raise ValueError("line names must be unique")
+    consumer = {}
+    for line in lines:
+        if not line['inputs'] and line['arrival'] is None:
+            raise ValueError(f"{line['name']}: a source line needs an 'arrival' interval")
+        for name in set(line['inputs']):
+            if name not in index:
+                raise ValueError(f"{line['name']}: unknown input line {name!r}")
+            if name in consumer:
+                raise ValueError(f"{name}: feeds both {consumer[name]} and {line['name']}")
+            consumer[name] = line['name']
+
+    depth = {}
+    for _ in range(len(lines)):
+        for line in lines:
+            inputs = [depth.get(name) for name in line['inputs']]
+            if line['name'] not in depth and None not in inputs:
+                depth[line['name']] = 1 + max(inputs, default=-1)
+    if len(depth) != len(lines):
+        raise ValueError("the feed graph has a cycle")
+    levels = [[] for _ in range(max(depth.values(), default=-1) + 1)]
+    for i, line in enumerate(lines):
+        levels[depth[line['name']]].append(i)
+    return levels
+
+
+def handoff_arrivals(line, exits, horizon):
+    """Arrival times at a fed line from the exit times of its inputs"""
+    ready = []
+    for name, per_part in Counter(line['inputs']).items():
+        # The k-th part needs the (k+1)*per_part-th unit of this input
+        ready.append(exits[name][per_part - 1::per_part])
+    kits = min(len(r) for r in ready)
+    times = np.maximum.reduce([r[:kits] for r in ready]) + line['handoff']
+    return times[times <= horizon].tolist()
+
+
+def _engine(line, seed, arrival_times):
+    process = line['process']
+    times = [_distribution(p) for p in process] if isinstance(process, list) else _distribution(process)
+    settings = {'buffer_sizes': line['buffer'], 'seed': seed}
+    if arrival_times is None:
+        return flow_engine.FlowEngine(line['machines'], times, None,
+                                      arrival_interval=_distribution(line['arrival']), **settings)
+    return flow_engine.FlowEngine(line['machines'], times, arrival_times=arrival_times, **settings)
+
+
+def _run_line(line, seed, arrival_times, horizon, keep_exits, row):
+    """Simulate one line up to `horizon`, fill its results row; exit times if kept"""
+    started = time.perf_counter()
+    engine = _engine(line, seed, arrival_times)
+    metrics = LineMetrics(engine.num_machines)
+    engine.add_listener(metrics)
+    exits = array('d')
+    if keep_exits:
+        def on_exit(now, kind, part, station):
+            if kind == flow_engine.EXIT:
+                exits.append(now)
+        engine.add_listener(on_exit)
+    engine.run(horizon)
+    summary = metrics.summary(horizon)
+    summary.update(arrived=engine.arrived, raw_waiting=engine.raw_waiting(), events=engine.event_count,
+                   wall_time=time.perf_counter() - started)
+    row[:] = [summary[field] for field in FIELDS]
+    return np.frombuffer(exits, dtype=np.float64) if keep_exits else None
+
+
+def _run_shard(shm_name, shape, tasks, horizon):
+    """Worker: run a shard of lines, writing results into the shared block"""
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        table = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        exits = {}
+        for index, line, seed, arrival_times, keep_exits in tasks:
+            result = _run_line(line, seed, arrival_times, horizon, keep_exits, table[index])
+            if result is not None:
+                exits[line['name']] = result
+        del table  # release the buffer before closing
+        return exits
+    finally:
+        shm.close()
+
+
+def _shards(tasks, count, horizon):
+    """Split tasks into `count` shards of similar expected work (largest first)"""
+    def cost(task):
+        _, line, _, arrival_times, _ = task
+        parts = len(arrival_times) if arrival_times is not None else horizon / mean_of(_distribution(line['arrival']))
+        return parts * line['machines']
+
+    shards = [[] for _ in range(count)]
+    loads = [0.0] * count
+    for task in sorted(tasks, key=cost, reverse=True):
+        i = loads.index(min(loads))
+        shards[i].append(task)
+        loads[i] += cost(task)
+    return [shard for shard in shards if shard]
+
+
+def run_plant(lines, horizon, workers=None, seed=0):
+    """Simulate every line up to `horizon` seconds.
+
+    Returns {'names', 'fields', 'table' (lines x FIELDS array), 'levels',
+    'horizon', 'wall_time'}. Each line gets its own seed spawned from
+    `seed`, so the results do not depend on the number of workers.
+    """
+    lines = [make_line(**line) for line in lines]
+    levels = plant_levels(lines)
+    feeders = {name for line in lines for name in line['inputs']}
+    seeds = replication_seeds(seed, len(lines))
+    workers = workers or os.cpu_count() or 1
+    shape = (len(lines), len(FIELDS))
+    started = time.perf_counter()
+
+    shm = shared_memory.SharedMemory(create=True, size=max(1, len(lines) * len(FIELDS) * 8))
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        table = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+        table[:] = np.nan
+        exits = {}
+        for level in levels:
+            tasks = []
+            for i in level:
+                line = lines[i]
+                arrival_times = handoff_arrivals(line, exits, horizon) if line['inputs'] else None
+                tasks.append((i, line, seeds[i], arrival_times, line['name'] in feeders))
+            shards = _shards(tasks, workers, horizon)
+            if pool is None:
+                results = [_run_shard(shm.name, shape, shard, horizon) for shard in shards]
+            else:
+                results = pool.map(_run_shard, [shm.name] * len(shards), [shape] * len(shards),
+                                   shards, [horizon] * len(shards))
+            for result in results:
+                exits.update(result)
+        result_table = table.copy()
+        del table
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        shm.close()
+        shm.unlink()
+    return {
+        'names': [line['name'] for line in lines],
+        'fields': FIELDS,
+        'table': result_table,
+        'levels': len(levels),
+        'horizon': horizon,
+        'wall_time': time.perf_counter() - started,
+    }
+
+
+def example_plant(count=100, feeders=3, seed=0):
+    """Sub-assembly lines feeding final assembly lines, `feeders` per final line"""
+    rng = random.Random(seed)
+    lines = []
+    groups, singles = divmod(count, feeders + 1)
+    for g in range(groups):
+        names = []
+        for j in range(feeders):
+            times = [rng.uniform(10, 20) for _ in range(rng.randint(2, 5))]
+            names.append(f"sub-{g}-{j}")
+            lines.append(make_line(names[-1], machines=len(times),
+                                   process=[f"lognormal:{t:.1f},{t * 0.25:.1f}" for t in times],
+                                   buffer=1, arrival=f"exp:{max(times) * 1.15:.1f}"))
+        times = [rng.uniform(8, 14) for _ in range(rng.randint(3, 6))]
+        lines.append(make_line(f"final-{g}", machines=len(times), process=[f"{t:.1f}" for t in times],
+                               inputs=names, handoff=120.0))
+    for s in range(singles):
+        lines.append(make_line(f"line-{s}", arrival="exp:18", process="lognormal:15,4"))
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate a plant of one-piece-flow lines in parallel")
+    parser.add_argument('--plant', help="JSON file with a list of line dicts (default: generated plant)")
+    parser.add_argument('--lines', type=int, default=100, help="size of the generated plant")
+    parser.add_argument('--feeders', type=int, default=3, help="sub-assembly lines per final assembly line")
+    parser.add_argument('--days', type=float, default=7.0)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--top', type=int, default=5, help="lines with the largest raw backlog to list")
+    args = parser.parse_args()
+
+    if args.plant:
+        with open(args.plant, encoding='utf-8') as f:
+            lines = json.load(f)
+    else:
+        lines = example_plant(args.lines, args.feeders, args.seed)
+    result = run_plant(lines, args.days * 86400, args.workers, args.seed)
+    table = result['table']
+    col = {field: i for i, field in enumerate(FIELDS)}
+    fed = {name for line in lines for name in line.get('inputs', [])}
+    finals = [i for i, name in enumerate(result['names']) if name not in fed]
+
+    compute = table[:, col['wall_time']].sum()
+    print(f"{len(lines)} lines in {result['levels']} levels, {args.days:g} days simulated "
+          f"in {result['wall_time']:.1f} s ({compute:.1f} s of line simulation)")
+    print(f"{int(table[:, col['events']].sum()):,} events, "
+          f"{int(table[finals, col['completed']].sum()):,} finished goods from {len(finals)} end lines")
+    print("Largest raw backlogs:")
+    for i in np.argsort(-table[:, col['raw_waiting']])[:args.top]:
+        row = table[i]
+        print(f"  {result['names'][i]:12s} waiting {int(row[col['raw_waiting']]):6d}  "
+              f"{row[col['throughput_per_hour']]:7.1f}/h  utilization {row[col['utilization']] * 100:5.1f}%")
+
+
+if __name__ == "__main__":
+    main()
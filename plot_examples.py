@@ -1,54 +1,69 @@
+import json
+
 import seaborn as sns
 import pandas as pd
+import matplotlib
 import matplotlib.pyplot as plt
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from metrics_pipeline import metric_records
+
+FIGSIZE = (15, 8)
+RENDER_DPI = 64  # 960x512 pixels, fits next to the launcher
 
-def show_all_plots():
+_rendered = {}
+
+def show_all_plots(records=None):
+    """Open the plots in a matplotlib window (blocks until it is closed)"""
     # Create a figure with 2x3 subplots with reduced size
-    fig, axes = plt.subplots(2, 3, figsize=(15, 8))
-    
+    fig, axes = plt.subplots(2, 3, figsize=FIGSIZE)
+    draw_plots(axes, records)
+    plt.show()
+
+def render_plots(records=None, dpi=RENDER_DPI):
+    """Render the plots off-screen with Agg; returns (key, (width, height), RGBA bytes).
+
+    The image is memoized by the metric data, so asking again for unchanged
+    metrics returns the same buffer without touching seaborn. Only the
+    object-oriented Figure API is used, so this is safe off the main thread.
+    """
+    if records is None:
+        records = metric_records()
+    key = json.dumps([records, dpi], sort_keys=True)
+    if key not in _rendered:
+        fig = Figure(figsize=FIGSIZE, dpi=dpi)
+        canvas = FigureCanvasAgg(fig)
+        axes = fig.subplots(2, 3, squeeze=False)
+        with matplotlib.rc_context():
+            draw_plots(axes, records)
+        canvas.draw()
+        _rendered[key] = (key, canvas.get_width_height(), bytes(canvas.buffer_rgba()))
+    return _rendered[key]
+
+def draw_plots(axes, records=None):
+    """Draw the improvement bar charts onto a 2x3 grid of axes"""
+    # Metrics come from the simulated before/after lines (cached on disk)
+    if records is None:
+        records = metric_records()
+    by_name = {rec['Metric']: rec for rec in records}
+
+    def metric_frame(*names):
+        return pd.DataFrame([{key: by_name[name][key] for key in ('Metric', 'Before', 'After', 'Unit')}
+                             for name in names])
+
     # Time-based metrics (Cycle Time and Lead Time)
-    cycle_time_data = {
-        'Metric': ['Cycle Time'],
-        'Before': [45],
-        'After': [15],
-        'Unit': ['seconds']
-    }
-    cycle_time_df = pd.DataFrame(cycle_time_data)
-    
-    lead_time_data = {
-        'Metric': ['Lead Time'],
-        'Before': [11.25],
-        'After': [1.45],
-        'Unit': ['minutes']
-    }
-    lead_time_df = pd.DataFrame(lead_time_data)
-    
+    cycle_time_df = metric_frame('Cycle Time')
+    lead_time_df = metric_frame('Lead Time')
+
     # WIP Inventory metrics
-    inventory_data = {
-        'Metric': ['WIP Inventory'],
-        'Before': [15],
-        'After': [5],
-        'Unit': ['units']
-    }
-    inventory_df = pd.DataFrame(inventory_data)
-    
+    inventory_df = metric_frame('WIP Inventory')
+
     # Percentage-based metrics
-    percentage_data = {
-        'Metric': ['Quality Rate', 'Machine Utilization'],
-        'Before': [92, 65],
-        'After': [98, 85],
-        'Unit': ['%', '%']
-    }
-    percentage_df = pd.DataFrame(percentage_data)
-    
+    percentage_df = metric_frame('Quality Rate', 'Machine Utilization')
+
     # Space Utilization metrics
-    space_data = {
-        'Metric': ['Space Utilization'],
-        'Before': [1000],
-        'After': [400],
-        'Unit': ['sq ft']
-    }
-    space_df = pd.DataFrame(space_data)
+    space_df = metric_frame('Space Utilization')
     
     # Set style for all plots
     sns.set_style("whitegrid")
@@ -110,9 +125,8 @@ def show_all_plots():
     # Hide the last subplot (bottom right)
     axes[1,2].set_visible(False)
     
-    # Adjust layout and show
-    plt.tight_layout()
-    plt.show()
+    # Adjust layout
+    axes[0,0].figure.tight_layout()
 
 if __name__ == "__main__":
     show_all_plots()
@@ -0,0 +1,260 @@
+"""Cached static layers and sprites for the pygame scenes.
+
+Static parts of a scene (gradient background, panels, machine tables,
+labels) are drawn once to an off-screen Surface and blitted every frame.
+A layer is redrawn only when its window size or layout key changes.
+
+Small sprites that repeat (parts, people, trucks, machine icons) are drawn
+once per variant into a SpriteAtlas and blitted from it. draw_items()
+sends runs of such blits to the screen in one Surface.blits call.
+"""
+import pygame
+
+_layers = {}
+_text_cache = {}
+_TEXT_CACHE_LIMIT = 512
+
+
+def _new_surface(size):
+    surface = pygame.Surface(size)
+    if pygame.display.get_surface() is not None:
+        surface = surface.convert()
+    return surface
+
+
+def get_layer(name, size, key, draw):
+    """Cached Surface for `name`, redrawn with draw(surface) if size or key changed"""
+    size = tuple(size)
+    entry = _layers.get(name)
+    if entry is None or entry[0] != (size, key):
+        surface = _new_surface(size)
+        draw(surface)
+        entry = ((size, key), surface)
+        _layers[name] = entry
+    return entry[1]
+
+
+def blit_layer(target, name, key, draw):
+    """Blit the cached layer for the target's size onto it"""
+    target.blit(get_layer(name, target.get_size(), key, draw), (0, 0))
+
+
+def invalidate(name=None):
+    """Drop one cached layer, or all of them"""
+    if name is None:
+        _layers.clear()
+        _text_cache.clear()
+        _atlas.clear()
+    else:
+        _layers.pop(name, None)
+
+
+def draw_gradient(surface, top, bottom):
+    for y in range(surface.get_height()):
+        ratio = y / surface.get_height()
+        r = int(top[0] * (1 - ratio) + bottom[0] * ratio)
+        g = int(top[1] * (1 - ratio) + bottom[1] * ratio)
+        b = int(top[2] * (1 - ratio) + bottom[2] * ratio)
+        pygame.draw.line(surface, (r, g, b), (0, y), (surface.get_width(), y))
+
+
+def gradient(size, top, bottom):
+    """Vertical gradient Surface, shared by every scene using the same colors"""
+    return get_layer(('gradient', top, bottom), size, None,
+                     lambda surface: draw_gradient(surface, top, bottom))
+
+
+def text(font, string, color, antialias=True):
+    """font.render with a bounded cache for labels that repeat frame to frame"""
+    key = (font, string, color, antialias)
+    surface = _text_cache.get(key)
+    if surface is None:
+        if len(_text_cache) >= _TEXT_CACHE_LIMIT:
+            _text_cache.clear()
+        surface = font.render(string, antialias, color)
+        _text_cache[key] = surface
+    return surface
+
+
+class SpriteAtlas:
+    """Sprites drawn once into shared transparent sheets, packed in shelves.
+
+    sprite() returns (sheet, area, origin): blit `area` of `sheet` at
+    (x - origin[0], y - origin[1]) to show the sprite anchored at (x, y).
+    """
+
+    SHEET_SIZE = 512
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.sheets = []
+        self._sprites = {}
+        self._x = self._y = self._shelf = 0
+
+    def sprite(self, key, size, origin, draw, *args):
+        """Cached sprite for `key`, drawn on first use with draw(surface, *origin, *args)"""
+        entry = self._sprites.get(key)
+        if entry is None:
+            sheet, area = self._place(size)
+            draw(sheet.subsurface(area), *origin, *args)
+            entry = (sheet, area, origin)
+            self._sprites[key] = entry
+        return entry
+
+    def _place(self, size):
+        width, height = size
+        if width > self.SHEET_SIZE or height > self.SHEET_SIZE:
+            raise ValueError(f"sprite of {width}x{height} does not fit a {self.SHEET_SIZE}px atlas sheet")
+        if self._x + width > self.SHEET_SIZE:  # next shelf
+            self._x, self._y, self._shelf = 0, self._y + self._shelf, 0
+        if not self.sheets or self._y + height > self.SHEET_SIZE:  # next sheet
+            sheet = pygame.Surface((self.SHEET_SIZE, self.SHEET_SIZE), pygame.SRCALPHA)
+            if pygame.display.get_surface() is not None:
+                sheet = sheet.convert_alpha()
+            sheet.fill((0, 0, 0, 0))
+            self.sheets.append(sheet)
+            self._x = self._y = self._shelf = 0
+        area = pygame.Rect(self._x, self._y, width, height)
+        self._x += width
+        self._shelf = max(self._shelf, height)
+        return self.sheets[-1], area
+
+
+_atlas = SpriteAtlas()
+
+
+def sprite(key, size, origin, draw, *args):
+    """(sheet, area, origin) of a sprite in the shared atlas, see SpriteAtlas"""
+    return _atlas.sprite(key, size, origin, draw, *args)
+
+
+def blit(surface, image, pos, area=None):
+    """Item draw function for a plain blit; draw_items() batches these"""
+    surface.blit(image, pos, area)
+
+
+def draw_items(surface, items):
+    """Draw (key, rect, state, draw, args) items in order.
+
+    Consecutive blit items go out in one Surface.blits call, so thousands
+    of atlas sprites cost one call instead of one per sprite.
+    """
+    batch = []
+    for _, _, _, draw, args in items:
+        if draw is blit:
+            batch.append(args)
+            continue
+        if batch:
+            surface.blits(batch, doreturn=False)
+            batch = []
+        draw(surface, *args)
+    if batch:
+        surface.blits(batch, doreturn=False)
+
+
+class DirtyRenderer:
+    """Redraws and pushes only the parts of the screen whose sprites changed.
+
+    Each frame the caller passes the cached static background and a list of
+    dynamic items as (key, rect, state, draw, args). An item is dirty when
+    its rect or state differs from the previous frame; its old and new
+    rects (grown to cover any item they touch) are restored from the
+    background and every item inside them is redrawn with draw(surface, *args). render() returns the rects to
+    hand to pygame.display.update().
+    """
+
+    def __init__(self):
+        self._last = {}
+        self._size = None
+        self._background = None
+
+    def invalidate(self):
+        """Force a full redraw next frame (scene or window change)"""
+        self._size = None
+
+    def render(self, surface, background, items):
+        current = {key: (pygame.Rect(rect), state) for key, rect, state, _, _ in items}
+        if self._size != surface.get_size() or background is not self._background:
+            self._size = surface.get_size()
+            self._background = background
+            self._last = current
+            surface.blit(background, (0, 0))
+            draw_items(surface, items)
+            return [surface.get_rect()]
+
+        dirty = []
+        for key, entry in current.items():
+            previous = self._last.get(key)
+            if previous != entry:
+                dirty.append(entry[0])
+                if previous is not None:
+                    dirty.append(previous[0])
+        for key, previous in self._last.items():
+            if key not in current:
+                dirty.append(previous[0])
+        self._last = current
+        if not dirty:
+            return []
+
+        # Grow the dirty areas until they fully contain every item they touch.
+        # Items can then be redrawn unclipped (clipping changes how pygame
+        # rasterizes thick lines) without spilling outside the restored area.
+        rects = [entry[0] for entry in current.values()]
+        dirty = _merge_rects(dirty)
+        grown = True
+        while grown:
+            grown = False
+            for area in dirty:
+                for rect in rects:
+                    if area.colliderect(rect) and not area.contains(rect):
+                        area.union_ip(rect)
+                        grown = True
+            if grown:
+                dirty = _merge_rects(dirty)
+
+        for area in dirty:
+            surface.blit(background, area, area)
+            draw_items(surface, [item for item in items if current[item[0]][0].colliderect(area)])
+        bounds = surface.get_rect()
+        return [area.clip(bounds) for area in dirty]
+
+
+def _merge_rects(rects):
+    """Union overlapping rects so no area is restored and redrawn twice"""
+    merged = []
+    for rect in rects:
+        rect = pygame.Rect(rect)
+        i = 0
+        while i < len(merged):
+            if merged[i].colliderect(rect):
+                rect.union_ip(merged.pop(i))
+                i = 0
+            else:
+                i += 1
+        merged.append(rect)
+    return merged
+
+
+_fonts = {}
+
+
+def font(name, size, bold=False, italic=False):
+    """pygame.font.SysFont, created once per process and shared by every scene"""
+    key = (name, size, bold, italic)
+    cached = _fonts.get(key)
+    if cached is None:
+        if not pygame.font.get_init():
+            pygame.font.init()
+        cached = pygame.font.SysFont(name, size, bold=bold, italic=italic)
+        _fonts[key] = cached
+    return cached
+
+
+def reset():
+    """Forget every cached layer, label and font (call before pygame.quit())"""
+    _layers.clear()
+    _text_cache.clear()
+    _atlas.clear()
+    _fonts.clear()
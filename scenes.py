@@ -0,0 +1,66 @@
+"""Single-process scene manager.
+
+The launcher, the one-piece-flow simulation, the metric viewer and the
+improvement plots run as scenes on one pygame display, sharing one font
+cache (render_cache.font) and one set of loaded modules. Switching scenes is a function call instead
+of a new interpreter.
+
+A scene is a function that draws on the current display until the user
+leaves it, then returns the name of the next scene (or None to quit).
+"""
+import pygame
+
+import render_cache
+
+LAUNCHER = 'launcher'
+SIMULATION = 'simulation'
+METRICS = 'metrics'
+PLOTS = 'plots'
+
+_home = None
+
+
+def _scene_function(name):
+    # Scene modules are imported on first use and then stay loaded
+    if name == LAUNCHER:
+        import gui
+        return gui.launcher_scene
+    if name == SIMULATION:
+        import one_piece_flow
+        return one_piece_flow.simulation_scene
+    if name == METRICS:
+        import process_metric_viewer
+        return process_metric_viewer.metrics_scene
+    if name == PLOTS:
+        import gui
+        return gui.plots_scene
+    raise ValueError(f"unknown scene: {name}")
+
+
+def set_mode(size, caption):
+    """Reuse the open window, resizing it only when the scene needs another size"""
+    screen = pygame.display.get_surface()
+    if screen is None or screen.get_size() != tuple(size):
+        screen = pygame.display.set_mode(size)
+    pygame.display.set_caption(caption)
+    return screen
+
+
+def back(current):
+    """Scene to return to when the user closes `current`: home, or quit when already there"""
+    return None if current == _home else _home
+
+
+def run(start=LAUNCHER):
+    """Play scenes starting at `start` until one of them returns None"""
+    global _home
+    pygame.init()
+    _home = start
+    scene = start
+    try:
+        while scene is not None:
+            scene = _scene_function(scene)()
+    finally:
+        _home = None
+        render_cache.reset()
+        pygame.quit()
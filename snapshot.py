@@ -0,0 +1,222 @@
+"""Snapshots and what-if branches of a running simulation.
+
+A snapshot holds an engine's full state (event heap, RNG state, machine
+slots, queues and counters), the statistics listeners riding on it, and
+optionally view state such as the MaterialStore. It is a zlib-compressed
+pickle, so it can be kept in memory or written to disk and restored in
+milliseconds.
+
+run_branches() answers "what if station 2 goes down at minute 40" without
+re-simulating the warm-up for every scenario. The warmed-up engine is
+forked once per branch. On Linux each branch is an os.fork() child that
+shares the parent's memory copy-on-write; elsewhere each branch gets an
+in-memory clone.
+
+    python snapshot.py --warmup 2400 --until 14400 --branch base down:1:600 down:1:1800 process:2:lognormal:20,5
+"""
+import argparse
+import os
+import pickle
+import time
+import traceback
+import zlib
+
+import flow_engine
+from distributions import parse_distribution
+from line_metrics import LineMetrics
+
+COMPRESS_LEVEL = 1  # fast; the state is mostly small ints and floats
+
+
+def dumps(engine, listeners=(), extra=None):
+    """Compact bytes of an engine, the listeners to reattach to it and any picklable extra state"""
+    return zlib.compress(pickle.dumps((engine, list(listeners), extra), pickle.HIGHEST_PROTOCOL),
+                         COMPRESS_LEVEL)
+
+
+def loads(data):
+    """(engine, listeners, extra) from dumps(); the listeners are attached again"""
+    engine, listeners, extra = pickle.loads(zlib.decompress(data))
+    for listener in listeners:
+        engine.add_listener(listener)
+    return engine, listeners, extra
+
+
+def save(path, engine, listeners=(), extra=None):
+    data = dumps(engine, listeners, extra)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return len(data)
+
+
+def load(path):
+    with open(path, 'rb') as f:
+        return loads(f.read())
+
+
+def clone(engine, listeners=()):
+    """Independent in-memory copy of an engine and its listeners (no compression)"""
+    copy, copied, _ = pickle.loads(pickle.dumps((engine, list(listeners), None), pickle.HIGHEST_PROTOCOL))
+    for listener in copied:
+        copy.add_listener(listener)
+    return copy, copied
+
+
+def parse_branch(spec):
+    """A what-if change from a short spec: "base", "down:STATION:SECONDS" or "process:STATION:DIST".
+
+    Stations are 0-based machine indexes. Returns a function applied to a
+    forked engine at the checkpoint.
+    """
+    kind, _, args = spec.partition(':')
+    if kind == 'base':
+        return lambda engine: None
+    station, _, value = args.partition(':')
+    if not station.isdigit() or not value:
+        raise ValueError(f"bad branch: {spec}")
+    station = int(station)
+    if kind == 'down':
+        duration = float(value)
+        return lambda engine: engine.break_down(station, duration)
+    if kind == 'process':
+        dist = parse_distribution(value)
+
+        def change(engine):
+            engine.process_times[station] = dist
+        return change
+    raise ValueError(f"unknown branch kind: {spec}")
+
+
+def _run_branch(engine, listeners, change, until, measure):
+    change(engine)
+    engine.run(until)
+    return measure(engine, listeners)
+
+
+def run_branches(engine, listeners, branches, until, measure, workers=None):
+    """Run every (name, change) branch from the engine's current state up to `until`.
+
+    `change(engine)` applies the what-if to the branch's own copy, and
+    `measure(engine, listeners)` returns its (picklable) result. The
+    original engine is not advanced. Returns [(name, result)] in order.
+    """
+    workers = workers or os.cpu_count() or 1
+    if not hasattr(os, 'fork') or workers == 1:
+        results = []
+        for name, change in branches:
+            copy, copied = clone(engine, listeners)
+            results.append((name, _run_branch(copy, copied, change, until, measure)))
+        return results
+
+    results = [None] * len(branches)
+    running = []  # (index, pid, read fd), oldest first
+    for index, (name, change) in enumerate(branches):
+        if len(running) == workers:
+            _collect(running.pop(0), branches, results)
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            # Child: the warmed-up state is already here (copy-on-write)
+            os.close(read_fd)
+            try:
+                payload = ('ok', _run_branch(engine, listeners, change, until, measure))
+            except BaseException:
+                payload = ('error', traceback.format_exc())
+            with os.fdopen(write_fd, 'wb') as out:
+                pickle.dump(payload, out, pickle.HIGHEST_PROTOCOL)
+            os._exit(0)
+        os.close(write_fd)
+        running.append((index, pid, read_fd))
+    while running:
+        _collect(running.pop(0), branches, results)
+    return results
+
+
+def _collect(child, branches, results):
+    index, pid, read_fd = child
+    with os.fdopen(read_fd, 'rb') as pipe:
+        data = pipe.read()
+    os.waitpid(pid, 0)
+    name = branches[index][0]
+    if not data:
+        raise RuntimeError(f"branch {name!r} exited without a result")
+    status, value = pickle.loads(data)
+    if status == 'error':
+        raise RuntimeError(f"branch {name!r} failed:\n{value}")
+    results[index] = (name, value)
+
+
+def since_checkpoint(metrics, checkpoint_time):
+    """measure() reporting a LineMetrics listener over the window after the checkpoint.
+
+    LineMetrics keeps running sums, so the window's figures are the
+    difference between its totals at the end and at the checkpoint.
+    """
+    before = metrics.summary(checkpoint_time)
+
+    def totals(summary):
+        elapsed = summary['elapsed']
+        return (summary['completed'], summary['lead_time'] * summary['completed'],
+                summary['wip'] * elapsed, summary['utilization'] * elapsed)
+
+    def measure(engine, listeners):
+        after = listeners[0].summary(engine.now)
+        done, lead, wip, busy = (b - a for a, b in zip(totals(before), totals(after)))
+        window = engine.now - checkpoint_time
+        return {
+            'completed': done,
+            'throughput_per_hour': done / window * 3600 if window > 0 else 0.0,
+            'lead_time': lead / done if done else 0.0,
+            'wip': wip / window if window > 0 else 0.0,
+            'utilization': busy / window if window > 0 else 0.0,
+        }
+    return measure
+
+
+def main():
+    parser = argparse.ArgumentParser(description="What-if branches from one warmed-up simulation state")
+    parser.add_argument('--line', help="line definition file (see line_def.py) instead of a serial line")
+    parser.add_argument('--machines', type=int, default=flow_engine.NUM_MACHINES)
+    parser.add_argument('--process', default='lognormal:15,4')
+    parser.add_argument('--arrival', default='exp:17', help="interval between raw material arrivals")
+    parser.add_argument('--buffer', type=int, default=1)
+    parser.add_argument('--warmup', type=float, default=2400.0, help="seconds simulated before branching")
+    parser.add_argument('--until', type=float, default=14400.0, help="end of every branch (seconds)")
+    parser.add_argument('--branch', nargs='+', default=['base', 'down:1:600', 'down:1:1800'])
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--save', help="also write the checkpoint to this file")
+    parser.add_argument('--restore', help="start from a saved checkpoint instead of warming up")
+    args = parser.parse_args()
+
+    branches = [(spec, parse_branch(spec)) for spec in args.branch]
+    started = time.perf_counter()
+    if args.restore:
+        engine, listeners, _ = load(args.restore)
+    else:
+        arrival = parse_distribution(args.arrival)
+        if args.line:
+            import line_def
+            engine = line_def.load(args.line).make_engine(None, seed=args.seed, arrival_interval=arrival)
+        else:
+            engine = flow_engine.FlowEngine(args.machines, parse_distribution(args.process), None,
+                                            arrival_interval=arrival, buffer_sizes=args.buffer, seed=args.seed)
+        listeners = [LineMetrics(engine.num_machines)]
+        engine.add_listener(listeners[0])
+        engine.run(args.warmup)
+    warmed = time.perf_counter()
+    size = save(args.save, engine, listeners) if args.save else len(dumps(engine, listeners))
+    print(f"Checkpoint at {engine.now:.0f} s after {warmed - started:.3f} s: {size:,} bytes")
+
+    measure = since_checkpoint(listeners[0], engine.now)
+    results = run_branches(engine, listeners, branches, args.until, measure, args.workers)
+    elapsed = time.perf_counter() - warmed
+    print(f"{len(branches)} branches to {args.until:.0f} s in {elapsed:.2f} s")
+    for name, result in results:
+        print(f"  {name:28s} {result['completed']:6d} done  {result['throughput_per_hour']:7.1f}/h  "
+              f"WIP {result['wip']:5.2f}  lead {result['lead_time']:7.1f} s  "
+              f"utilization {result['utilization'] * 100:5.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""Headless video / GIF export of the one-piece-flow simulation.
+
+Renders the intro scenarios and the flow simulation off-screen (SDL dummy
+driver) and encodes them without opening a window:
+
+    python video_export.py shift.mp4 --parts 120 --speed 60
+    python video_export.py demo.gif --fps 20
+
+Simulation frames are a pure function of sim time (frame i shows
+i * speed / fps simulated seconds), so frame ranges are rendered in
+parallel by a process pool. Each worker writes its range as raw frames
+to a temporary file and the main process streams the chunks to the
+encoder in order. MP4 frames are raw RGB piped to ffmpeg (needed on
+PATH); GIF frames are palette-quantized in the workers and assembled by
+Pillow, since quantizing is most of the cost of a GIF.
+"""
+import os
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import argparse
+import math
+import shutil
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pygame
+
+import flow_engine
+import one_piece_flow as opf
+import scenes
+from line_metrics import StreamingStats
+
+HOLD_SECONDS = 2.0  # final state shown after the last part is finished
+INTRO_PARTS = opf.raw_count  # the truck intro is drawn for the default line
+PALETTE_BYTES = 768
+
+
+def _screen():
+    """Off-screen display for this worker process, opened once"""
+    if pygame.display.get_surface() is None:
+        pygame.init()
+        opf.screen = scenes.set_mode(opf.SCREEN_SIZE, opf.CAPTION)
+        opf.load_fonts()
+    return opf.screen
+
+
+def frame_size(mode):
+    """Bytes per frame in a chunk file: RGB, or a 256-color palette plus indexes"""
+    width, height = opf.SCREEN_SIZE
+    if mode == 'P':
+        return PALETTE_BYTES + width * height
+    return width * height * 3
+
+
+def _frame_data(screen, mode):
+    data = pygame.image.tobytes(screen, 'RGB')
+    if mode != 'P':
+        return data
+    from PIL import Image
+    image = Image.frombytes('RGB', screen.get_size(), data)
+    image = image.quantize(method=Image.Quantize.FASTOCTREE, dither=Image.Dither.NONE)
+    palette = bytes(image.getpalette()[:PALETTE_BYTES]).ljust(PALETTE_BYTES, b'\0')
+    return palette + image.tobytes()
+
+
+def _render_intro(path, fps, mode):
+    """Play the intro scenarios on a virtual clock and write one frame per 1/fps seconds"""
+    screen = _screen()
+    present, wait = opf.present, pygame.time.wait
+    frame_ms = 1000 / fps
+    state = {'clock': 0.0, 'next': 0.0, 'last': None, 'count': 0}
+
+    with open(path, 'wb') as out:
+        def capture(*args):
+            present(*args)
+            state['last'] = _frame_data(screen, mode)
+
+        def advance(ms):
+            # The scenarios pace themselves with pygame.time.wait(); turn that into video time
+            state['clock'] += ms
+            while state['next'] <= state['clock'] and state['last'] is not None:
+                out.write(state['last'])
+                state['next'] += frame_ms
+                state['count'] += 1
+            return ms
+
+        opf.present, pygame.time.wait = capture, advance
+        try:
+            opf.raw_count = INTRO_PARTS
+            opf.reset_line()
+            opf.scenario_people_load_truck()
+            opf.scenario_truck_moving_highway()
+            opf.scenario_unload_truck_to_raw()
+        finally:
+            opf.present, pygame.time.wait = present, wait
+    return path, state['count']
+
+
+def _render_simulation(path, parts, first, last, fps, speed, mode):
+    """Render simulation frames first..last-1 to `path`"""
+    screen = _screen()
+    opf.raw_count = parts
+    opf.reset_line()
+    engine = opf.make_engine()
+    stats = StreamingStats(opf.num_machines)
+    engine.add_listener(stats)
+    label = f"{speed:g}x"
+    background = opf.factory_layer(screen)
+    with open(path, 'wb') as out:
+        for frame in range(first, last):
+            sim_time = frame * speed / fps
+            engine.run(until=sim_time)
+            for idx, slot in enumerate(opf.machine_slots):
+                slot['timer'] = engine.remaining(idx)
+            opf.materials.update(sim_time)
+            opf.present(screen, None, background, opf.factory_items(label, stats.overlay_lines(sim_time)))
+            out.write(_frame_data(screen, mode))
+    return path, last - first
+
+
+def _run_job(job):
+    kind, args = job
+    if kind == 'intro':
+        return _render_intro(*args)
+    return _render_simulation(*args)
+
+
+def simulation_length(parts):
+    """Simulated seconds until the last part is finished"""
+    engine = flow_engine.FlowEngine(opf.num_machines, opf.PROCESS_TIME, parts, transfer_time=opf.TRANSFER_TIME)
+    return engine.run()
+
+
+def _frames(chunk_paths, frame_bytes):
+    """Frames of the chunk files in order; each file is removed once read"""
+    for path in chunk_paths:
+        with open(path, 'rb') as f:
+            while True:
+                data = f.read(frame_bytes)
+                if len(data) < frame_bytes:
+                    break
+                yield data
+        os.remove(path)
+
+
+def _encode_gif(frames, path, size, fps):
+    from PIL import Image
+
+    def image(data):
+        frame = Image.frombytes('P', size, data[PALETTE_BYTES:])
+        frame.putpalette(data[:PALETTE_BYTES])
+        return frame
+    images = (image(data) for data in frames)
+    first = next(images)
+    first.save(path, save_all=True, append_images=images, duration=round(1000 / fps), loop=0)
+
+
+def _encode_mp4(frames, path, size, fps):
+    command = [shutil.which('ffmpeg'), '-y', '-loglevel', 'error', '-f', 'rawvideo', '-pix_fmt', 'rgb24',
+               '-s', f'{size[0]}x{size[1]}', '-r', str(fps), '-i', '-',
+               '-c:v', 'libx264', '-pix_fmt', 'yuv420p', '-movflags', '+faststart', path]
+    process = subprocess.Popen(command, stdin=subprocess.PIPE)
+    try:
+        for data in frames:
+            process.stdin.write(data)
+    finally:
+        process.stdin.close()
+    if process.wait() != 0:
+        raise RuntimeError(f"ffmpeg failed with exit code {process.returncode}")
+
+
+def export(path, parts=flow_engine.RAW_COUNT, speed=10, fps=30, duration=None,
+           intro=True, workers=None, chunk=120):
+    """Render and encode a run to `path` (.gif or .mp4); returns the number of frames"""
+    gif = path.lower().endswith('.gif')
+    encode = _encode_gif if gif else _encode_mp4
+    mode = 'P' if gif else 'RGB'
+    if not gif and shutil.which('ffmpeg') is None:
+        raise RuntimeError("MP4 export needs ffmpeg on PATH (or export a .gif)")
+    if duration is None:
+        duration = simulation_length(parts) + HOLD_SECONDS * speed
+    total = int(math.ceil(duration * fps / speed)) + 1
+
+    with tempfile.TemporaryDirectory(prefix='opf-frames-') as tmp:
+        jobs = []
+        if intro:
+            jobs.append(('intro', (os.path.join(tmp, 'intro.frames'), fps, mode)))
+        for first in range(0, total, chunk):
+            last = min(total, first + chunk)
+            jobs.append(('sim', (os.path.join(tmp, f'sim-{first:08d}.frames'), parts, first, last, fps, speed, mode)))
+
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # map() keeps job order, so chunks reach the encoder in sequence
+            results = list(pool.map(_run_job, jobs))
+        encode(_frames([p for p, _ in results], frame_size(mode)), path, opf.SCREEN_SIZE, fps)
+    return sum(count for _, count in results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the one-piece-flow simulation to MP4 or GIF")
+    parser.add_argument('path', help="output file (.mp4 or .gif)")
+    parser.add_argument('--parts', type=int, default=flow_engine.RAW_COUNT)
+    parser.add_argument('--speed', type=float, default=10, help="simulated seconds per video second")
+    parser.add_argument('--fps', type=int, default=30)
+    parser.add_argument('--duration', type=float, default=None,
+                        help="simulated seconds to export (default: until the last part is done)")
+    parser.add_argument('--no-intro', action='store_true', help="skip the truck and unloading intro")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunk', type=int, default=120, help="frames per worker job")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    frames = export(args.path, args.parts, args.speed, args.fps, args.duration,
+                    not args.no_intro, args.workers, args.chunk)
+    elapsed = time.perf_counter() - started
+    print(f"{frames} frames ({frames / args.fps:.1f} s of video) -> {args.path} in {elapsed:.1f} s")
+
+
+if __name__ == "__main__":
+    main()